@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django.contrib.sites',
     'django.contrib.sitemaps',
+    'django.contrib.postgres',
     'django_filters',
 
     # Front-end
@@ -134,6 +135,19 @@ DATABASES = {
 AUTH_USER_MODEL = 'users.CustomUser'
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Use a shared backend (Redis / Memcached) with several workers: cache invalidations only reach the
+# process that made them with LocMemCache (the meal plan template pages fall back to a query then).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fitcore',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -356,4 +370,12 @@ STRIPE_WEBHOOK_SECRET = 'whs_key'
 FITCORE_PLAN_IDS = {
     'MONTHLY': 'price_xxxxxxxxxxxxxx',
     'LIFETIME': 'price_yyyyyyyyyyyyyy',
-}
\ No newline at end of file
+}
+
+# MEAL PLANS
+
+# Serialized meal plan template pages are cached for this long (seconds); edits invalidate them earlier
+MEAL_TEMPLATE_CACHE_TIMEOUT = 60 * 60
+
+# Deep copies (?deep=true) of plans longer than this many days run as a background job
+MEAL_PLAN_ASYNC_COPY_DAYS = 60
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Meal, MealPlan, Food, MealItem, ScheduledMeal
+from django.contrib.admin.views.main import ChangeList
+from .models import Meal, MealPlan, Food, MealItem, ScheduledMeal, DailyNutritionSummary
+from .nutrition import nutrient_matrix
 
 
 class MealItemInline(admin.TabularInline):
@@ -26,34 +28,58 @@ class FoodAdmin(admin.ModelAdmin):
 
 @admin.register(Meal)
 class MealAdmin(admin.ModelAdmin):
-    list_display = ('name', 'user', 'meal_time_category', 'total_calories_display','total_protein_display','total_carbohydrates_display','total_fat_display', 'is_template', 'created_at')
-    list_filter = ('meal_time_category', 'user', 'is_template')
+    list_display = ('name', 'user', 'meal_time_category', 'item_count_display', 'total_calories_display','total_protein_display','total_carbohydrates_display','total_fat_display', 'is_template', 'created_at')
+    list_filter = ('meal_time_category', 'user', 'is_template', 'is_planned')
     search_fields = ('name', 'user__username', 'description')
     inlines = [MealItemInline]
     readonly_fields = ('total_calories', 'total_protein', 'total_carbohydrates', 'total_fat')
+
+    def get_queryset(self, request):
+        # Totals are summed from the items in SQL (one grouped query per page) and can be sorted on
+        return super().get_queryset(request).with_totals()
+
+    def item_count_display(self, obj):
+        return obj.item_count
+    item_count_display.short_description = "Items"
+    item_count_display.admin_order_field = 'item_count'
+
     def total_calories_display(self, obj):
-        return obj.total_calories
+        return obj.items_total_calories
     total_calories_display.short_description = "Total Calories"
+    total_calories_display.admin_order_field = 'items_total_calories'
+
     def total_protein_display(self, obj):
-        return obj.total_protein
+        return obj.items_total_protein
     total_protein_display.short_description = "Total Protein"
+    total_protein_display.admin_order_field = 'items_total_protein'
 
     def total_carbohydrates_display(self, obj):
-        return obj.total_carbohydrates
+        return obj.items_total_carbohydrates
     total_carbohydrates_display.short_description = "Total Carbohydrates"
+    total_carbohydrates_display.admin_order_field = 'items_total_carbohydrates'
 
     def total_fat_display(self, obj):
-        return obj.total_fat
+        return obj.items_total_fat
     total_fat_display.short_description = "Total Fat"
+    total_fat_display.admin_order_field = 'items_total_fat'
 
 class ScheduledMealInline(admin.TabularInline):
     model = ScheduledMeal
     extra = 1
     autocomplete_fields = ['meal'] # For easier searching if you have many Meal items
 
+class MealPlanChangeList(ChangeList):
+
+    def get_results(self, request):
+        super().get_results(request)
+        # Whole-plan totals of the page from the nutrient matrix: two queries, whatever the plan lengths
+        totals = nutrient_matrix.plan_totals([plan.pk for plan in self.result_list])
+        for plan in self.result_list:
+            plan.plan_totals = totals.get(plan.pk, {})
+
 @admin.register(MealPlan)
 class MealPlanAdmin(admin.ModelAdmin):
-    list_display = ('name', 'user', 'goal', 'duration_days', 'is_active', 'start_date', 'is_template')
+    list_display = ('name', 'user', 'goal', 'duration_days', 'is_active', 'start_date', 'is_template', 'plan_calories_display', 'plan_protein_display', 'plan_carbohydrates_display', 'plan_fat_display')
     list_filter = ('goal', 'user', 'is_active')
     search_fields = ('name', 'user__username', 'description')
     inlines = [ScheduledMealInline]
@@ -69,4 +95,32 @@ class MealPlanAdmin(admin.ModelAdmin):
              # Add other target nutrients here
              'fields': ('target_daily_calories', 'target_daily_protein', 'target_daily_carbohydrates', 'target_daily_fat')
         }),
-    )
\ No newline at end of file
+    )
+
+    def get_changelist(self, request, **kwargs):
+        return MealPlanChangeList
+
+    def plan_calories_display(self, obj):
+        return round(obj.plan_totals.get('calories', 0), 1)
+    plan_calories_display.short_description = "Plan Calories"
+
+    def plan_protein_display(self, obj):
+        return round(obj.plan_totals.get('protein', 0), 1)
+    plan_protein_display.short_description = "Plan Protein"
+
+    def plan_carbohydrates_display(self, obj):
+        return round(obj.plan_totals.get('carbohydrates', 0), 1)
+    plan_carbohydrates_display.short_description = "Plan Carbohydrates"
+
+    def plan_fat_display(self, obj):
+        return round(obj.plan_totals.get('fat', 0), 1)
+    plan_fat_display.short_description = "Plan Fat"
+
+@admin.register(DailyNutritionSummary)
+class DailyNutritionSummaryAdmin(admin.ModelAdmin):
+    # Maintained from the meals (meal.summaries); repair with `manage.py rebuild_daily_summaries`
+    list_display = ('user', 'date', 'meal_count', 'total_calories', 'total_protein', 'total_carbohydrates', 'total_fat')
+    list_filter = ('date',)
+    search_fields = ('user__email',)
+    date_hierarchy = 'date'
+    readonly_fields = [field.name for field in DailyNutritionSummary._meta.fields]
@@ -0,0 +1,90 @@
+import threading
+import time
+from bisect import bisect_left
+
+from .models import Food
+
+
+class FoodPrefixIndex:
+    """
+    In-process prefix index of the public Food catalog for autocomplete.
+
+    Two sorted arrays are searched with bisect:
+    - full names, so "chick" finds "Chicken breast" first
+    - every word suffix of a name, so "chick" also finds "Grilled chicken"
+    Each worker builds it lazily on the first lookup. Food signals mark it stale in this process and it
+    is also rebuilt after `max_age` seconds, which picks up catalog changes made by other workers.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._stale = True
+        self._built_at = 0.0
+        # (names, words, foods):
+        # names - sorted [(normalized name, food id)]
+        # words - sorted [(normalized word suffix, food id)]
+        # foods - food id -> {'id', 'name', 'calories'}
+        self._snapshot = ([], [], {})
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(text.lower().split())
+
+    def invalidate(self):
+        self._stale = True
+
+    def build(self):
+        # Cleared before loading so an invalidation that arrives mid-build triggers another rebuild
+        self._stale = False
+        names, words, foods = [], [], {}
+        rows = Food.objects.filter(is_public=True).values_list('id', 'name', 'calories').iterator(chunk_size=5000)
+        for food_id, name, calories in rows:
+            normalized = self.normalize(name)
+            foods[food_id] = {'id': food_id, 'name': name, 'calories': calories}
+            names.append((normalized, food_id))
+            position = normalized.find(' ')
+            while position != -1:
+                words.append((normalized[position + 1:], food_id))
+                position = normalized.find(' ', position + 1)
+        names.sort()
+        words.sort()
+        # Swap the new arrays in with one assignment; readers keep using the old snapshot until then
+        self._snapshot = (names, words, foods)
+        self._built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if self._stale or time.monotonic() - self._built_at > self.max_age:
+            with self._lock:
+                if self._stale or time.monotonic() - self._built_at > self.max_age:
+                    self.build()
+
+    @staticmethod
+    def _scan(entries, prefix, limit, seen, results):
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and len(results) < limit:
+            key, food_id = entries[position]
+            if not key.startswith(prefix):
+                break
+            if food_id not in seen:
+                seen.add(food_id)
+                results.append(food_id)
+            position += 1
+
+    def lookup(self, prefix, limit=10):
+        """
+        Return up to `limit` public foods ({'id', 'name', 'calories'}) whose name or one of its words
+        starts with `prefix`. Full-name matches come first, each group in alphabetical order.
+        """
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+        self.ensure_fresh()
+        names, words, foods = self._snapshot
+        seen, food_ids = set(), []
+        self._scan(names, prefix, limit, seen, food_ids)
+        self._scan(words, prefix, limit, seen, food_ids)
+        return [foods[food_id] for food_id in food_ids]
+
+
+food_prefix_index = FoodPrefixIndex()
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .models import Food
+
+
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+
+def normalize_gtin(code):
+    """
+    The GTIN-14 form of a scanned barcode (GTIN-8, UPC-A, EAN-13 or GTIN-14, spaces and dashes
+    ignored): zero-padded to 14 digits, so every encoding of the same item has one key.
+    Raises ValueError when it is not a GTIN or its check digit is wrong.
+    """
+    digits = ''.join(str(code).replace('-', '').split())
+    if not digits.isdigit() or len(digits) not in GTIN_LENGTHS:
+        raise ValueError("A barcode is 8, 12, 13 or 14 digits.")
+    digits = digits.zfill(14)
+    # GS1 check digit: weights 3, 1, 3, ... from the digit left of the check digit
+    total = sum(int(digit) * (3 if position % 2 == 0 else 1) for position, digit in enumerate(reversed(digits[:-1])))
+    if (10 - total % 10) % 10 != int(digits[-1]):
+        raise ValueError("Invalid barcode check digit.")
+    return digits
+
+
+class FoodBarcodeCache:
+    """
+    In-process LRU cache of normalized barcode -> public Food in front of the barcode index.
+    Private foods are per user and not cached.
+
+    A miss costs one indexed query; foods are kept for `max_age` seconds and unknown barcodes (None)
+    for `negative_max_age`, so repeated scans of an unlisted product do not hit the database either.
+    Food signals drop the entries of a changed food in this process; the age limits bound how long
+    other workers keep serving the old row.
+    """
+
+    def __init__(self, maxsize=10000, max_age=300, negative_max_age=30):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.negative_max_age = negative_max_age
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # barcode -> (Food or None, expires at), least recently used first
+        self._barcodes = {}  # food id -> cached barcode, to find the entry of a changed food
+
+    def get(self, barcode):
+        """The public Food with this normalized barcode (user_added loaded), or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(barcode)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(barcode)
+                return entry[0]
+
+        try:
+            food = Food.objects.select_related('user_added').get(barcode=barcode, is_public=True)
+        except Food.DoesNotExist:
+            food = None
+
+        with self._lock:
+            self._pop(barcode)
+            self._entries[barcode] = (food, now + (self.max_age if food else self.negative_max_age))
+            if food is not None:
+                self._barcodes[food.pk] = barcode
+            while len(self._entries) > self.maxsize:
+                self._pop(next(iter(self._entries)))
+        return food
+
+    def _pop(self, barcode):
+        food, _ = self._entries.pop(barcode, (None, 0))
+        if food is not None and self._barcodes.get(food.pk) == barcode:
+            del self._barcodes[food.pk]
+
+    def invalidate(self, food_id, barcode=None):
+        """Drop the entry of this food and the (possibly negative) entry of its current barcode."""
+        with self._lock:
+            cached = self._barcodes.get(food_id)
+            if cached is not None:
+                self._pop(cached)
+            if barcode:
+                self._pop(barcode)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._barcodes.clear()
+
+
+food_barcode_cache = FoodBarcodeCache()
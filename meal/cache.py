@@ -0,0 +1,72 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import MealPlan
+
+
+# Serialized /meal-plans/templates/ pages (and their ETags) are keyed by a version number that
+# meal.signals bumps whenever template content (plan, schedule, meal, item or food) changes; old
+# versions just expire. The bump only reaches other workers through a shared cache backend (Redis,
+# Memcached, database): with a per-process one (LocMemCache) the version is derived from the template
+# rows themselves instead, at the cost of one aggregate query per request.
+TEMPLATE_CACHE_VERSION_KEY = 'meal:templates:version'
+
+
+def template_cache_timeout():
+    return getattr(settings, 'MEAL_TEMPLATE_CACHE_TIMEOUT', 60 * 60)
+
+
+def get_template_content_version():
+    """
+    Digest of the row counts and latest updated_at of the template plans, their scheduled meals and the
+    meals' foods (item edits bump the meal's updated_at through its stored totals).
+    """
+    values = MealPlan.objects.filter(is_template=True, is_active=True).order_by().aggregate(
+        plans=Count('pk', distinct=True),
+        plans_updated=Max('updated_at'),
+        scheduled_meals=Count('scheduledmeal', distinct=True),
+        meals_updated=Max('scheduledmeal__meal__updated_at'),
+        foods_updated=Max('scheduledmeal__meal__mealitem__food__updated_at'),
+    )
+    return hashlib.md5(repr(sorted(values.items())).encode()).hexdigest()
+
+
+def get_template_cache_version():
+    if isinstance(caches['default'], LocMemCache):
+        # A bump in another worker never reaches this process' cache
+        return get_template_content_version()
+    version = cache.get(TEMPLATE_CACHE_VERSION_KEY)
+    if version is None:
+        # Time based, so a version lost to eviction or a restart never reuses an older number
+        version = int(time.time() * 1000)
+        cache.add(TEMPLATE_CACHE_VERSION_KEY, version, timeout=None)
+        version = cache.get(TEMPLATE_CACHE_VERSION_KEY, version)
+    return version
+
+
+def bump_template_cache_version():
+    """
+    Invalidate every cached template page, once the current transaction commits
+    (so a concurrent request cannot cache the old content under the new version).
+    """
+    def bump():
+        try:
+            cache.incr(TEMPLATE_CACHE_VERSION_KEY)
+        except ValueError: # Not set yet
+            get_template_cache_version()
+    transaction.on_commit(bump)
+
+
+def get_template_page_cache_key(request, version):
+    """
+    (cache key, ETag) of a templates page. The URL covers page / cursor / fields / expand parameters;
+    the content is the same for every user.
+    """
+    digest = hashlib.md5(f'{version}:{request.build_absolute_uri()}'.encode()).hexdigest()
+    return f'meal:templates:page:{digest}', f'"{digest}"'
@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import json
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .managers import NUTRIENT_FIELDS
+from .models import Food
+
+
+# Prebuilt download of the whole public food catalog for offline search (GET /foods/snapshot/).
+#
+# build_food_snapshot() (manage.py build_food_snapshot, run periodically) streams the public foods
+# from a server-side cursor into a gzip-compressed NDJSON file (one food object per line) named after
+# the hash of its content, then points the manifest at it. An unchanged catalog gives the same hash,
+# so no new file is written and clients keep the one they have.
+
+SNAPSHOT_FIELDS = [
+    'id', 'name', 'description', 'serving_quantity', 'serving_unit', *NUTRIENT_FIELDS,
+    'food_category', 'barcode', 'updated_at',
+]
+MANIFEST_CACHE_KEY = 'meal:food-snapshot:manifest'
+
+
+def snapshot_dir():
+    return getattr(settings, 'FOOD_SNAPSHOT_DIR', 'food-snapshots')
+
+
+def manifest_name():
+    return f'{snapshot_dir()}/latest.json'
+
+
+def read_manifest(storage=default_storage):
+    """The manifest of the current snapshot, or None when none was built yet."""
+    if not storage.exists(manifest_name()):
+        return None
+    with storage.open(manifest_name()) as file:
+        return json.load(file)
+
+
+def get_manifest():
+    """read_manifest(), cached for a minute (a build in another process shows up within that time)."""
+    manifest = cache.get(MANIFEST_CACHE_KEY)
+    if manifest is None:
+        manifest = read_manifest()
+        if manifest is None:
+            return None
+        cache.set(MANIFEST_CACHE_KEY, manifest, timeout=getattr(settings, 'FOOD_SNAPSHOT_MANIFEST_TIMEOUT', 60))
+    return manifest
+
+
+def write_snapshot(file, chunk_size=2000):
+    """
+    Write the public foods as gzip NDJSON into `file` (binary) in id order.
+    Returns (sha256 of the uncompressed content, number of foods).
+    """
+    digest = hashlib.sha256()
+    count = 0
+    foods = Food.objects.filter(is_public=True).order_by('id').values(*SNAPSHOT_FIELDS)
+    # mtime=0: the same catalog always compresses to the same bytes
+    with gzip.GzipFile(filename='', mode='wb', fileobj=file, mtime=0) as compressed:
+        for food in foods.iterator(chunk_size=chunk_size):
+            line = json.dumps(food, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+            digest.update(line)
+            compressed.write(line)
+            count += 1
+    return digest.hexdigest(), count
+
+
+def build_food_snapshot(storage=default_storage, keep=2):
+    """
+    Build the catalog snapshot and make it current. The previous `keep` - 1 snapshot files are kept
+    for clients still downloading them. Returns (manifest, whether a new snapshot was written).
+    """
+    previous = read_manifest(storage)
+    with tempfile.TemporaryFile() as file:
+        sha256, count = write_snapshot(file)
+        version = sha256[:16]
+        if previous is not None and previous['version'] == version and storage.exists(previous['name']):
+            return previous, False
+
+        name = f'{snapshot_dir()}/foods-{version}.ndjson.gz'
+        if not storage.exists(name):
+            file.seek(0)
+            name = storage.save(name, File(file))
+        size = storage.size(name)
+
+    manifest = {
+        'version': version,
+        'name': name,
+        'sha256': sha256, # Of the uncompressed NDJSON
+        'count': count,
+        'size': size,
+        'built_at': timezone.now().isoformat(),
+        'history': list(dict.fromkeys([name, *(previous or {}).get('history', [])]))[:keep],
+    }
+    # The storage does not overwrite: replace the manifest (readers briefly see the old one cached)
+    storage.delete(manifest_name())
+    storage.save(manifest_name(), ContentFile(json.dumps(manifest, indent=2).encode()))
+    cache.delete(MANIFEST_CACHE_KEY)
+
+    for old_name in (previous or {}).get('history', []):
+        if old_name not in manifest['history']:
+            storage.delete(old_name)
+    return manifest, True
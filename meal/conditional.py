@@ -0,0 +1,92 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for `list` and `retrieve`.
+
+    The validators come from one aggregate over the filtered queryset: COUNT of `conditional_count_fields`
+    and MAX of `conditional_timestamp_fields` (the rows' updated_at, plus related rows the representation
+    includes), so a deleted or edited row changes them and an
+    If-None-Match / If-Modified-Since hit returns 304 before any page is loaded or serialized.
+    Stored totals (Meal.total_*) bump `updated_at` when they are refreshed, so they are covered too.
+    """
+    conditional_count_fields = ('pk',)
+    conditional_timestamp_fields = ('updated_at',)
+
+    def get_conditional_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def get_conditional_timestamp_fields(self):
+        # Override to add related rows that only some representations (?expand=) embed
+        return self.conditional_timestamp_fields
+
+    def get_conditional_validators(self, queryset):
+        """
+        Return (etag, last_modified timestamp), or None when the queryset is empty.
+        """
+        timestamp_fields = self.get_conditional_timestamp_fields()
+        aggregates = {}
+        for index, field in enumerate(self.conditional_count_fields):
+            aggregates[f'count_{index}'] = Count(field, distinct=True)
+        for index, field in enumerate(timestamp_fields):
+            aggregates[f'timestamp_{index}'] = Max(field)
+        values = queryset.order_by().prefetch_related(None).aggregate(**aggregates)
+        if not values['count_0']:
+            return None
+        counts = [values[f'count_{index}'] for index in range(len(self.conditional_count_fields))]
+        timestamps = [values[f'timestamp_{index}'] for index in range(len(timestamp_fields))]
+        last_modified = max((ts for ts in timestamps if ts is not None), default=None)
+
+        # The same data renders differently per user, URL (?page= / ?fields= / ?expand=) and format
+        request = self.request
+        key = ':'.join(str(part) for part in (
+            request.user.pk, request.get_full_path(), request.accepted_renderer.format,
+            *counts, *[ts.isoformat() if ts else '' for ts in timestamps],
+        ))
+        etag = f'"{hashlib.md5(key.encode()).hexdigest()}"'
+        return etag, last_modified and int(last_modified.timestamp())
+
+    def conditional_get(self, queryset):
+        """
+        Return (304/412 response or None, validator headers for the full response).
+        """
+        validators = self.get_conditional_validators(queryset)
+        if validators is None:
+            return None, {}
+        etag, last_modified = validators
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if last_modified:
+            headers['Last-Modified'] = http_date(last_modified)
+        conditional = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if conditional is not None:
+            return Response(status=conditional.status_code, headers=headers), headers
+        return None, headers
+
+    def with_headers(self, response, headers):
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    def list(self, request, *args, **kwargs):
+        not_modified, headers = self.conditional_get(self.get_conditional_queryset())
+        if not_modified is not None:
+            return not_modified
+        return self.with_headers(self.list_response(request, *args, **kwargs), headers)
+
+    def list_response(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_conditional_queryset().filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        # An unknown id gets no validators and falls through to the normal 404
+        not_modified, headers = self.conditional_get(queryset)
+        if not_modified is not None:
+            return not_modified
+        return self.with_headers(super().retrieve(request, *args, **kwargs), headers)
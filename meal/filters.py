@@ -0,0 +1,59 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, GeneratedField, Q
+from django_filters import rest_framework as django_filters
+from rest_framework import filters
+
+from .models import DENSITY_FIELDS, Food, FoodCategory
+
+
+class FoodSearchFilter(filters.SearchFilter):
+    """
+    Ranked Food search.
+    On PostgreSQL: full-text match on the trigger-maintained `search_vector` OR pg_trgm similarity on
+    `name` (typo tolerance), both served by GIN indexes, ordered by relevance.
+    Other databases (SQLite test runs) fall back to the plain SearchFilter over `search_fields`.
+    """
+    search_config = 'english'
+
+    def get_category_codes(self, term):
+        # Match a FoodCategory by code ("FR") or label ("fruit") instead of scanning the column
+        term = term.lower()
+        return [value for value, label in FoodCategory.choices if term in (value.lower(), label.lower())]
+
+    def filter_queryset(self, request, queryset, view):
+        if connection.vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+
+        term = ' '.join(self.get_search_terms(request))
+        if not term:
+            return queryset
+
+        query = SearchQuery(term, config=self.search_config, search_type='websearch')
+        condition = Q(search_vector=query) | Q(name__trigram_similar=term)
+        category_codes = self.get_category_codes(term)
+        if category_codes:
+            condition |= Q(food_category__in=category_codes)
+
+        queryset = queryset.annotate(
+            rank=SearchRank(F('search_vector'), query),
+            similarity=TrigramSimilarity('name', term),
+        ).filter(condition)
+
+        # An explicit ?ordering= (OrderingFilter) wins over relevance
+        if request.query_params.get(filters.OrderingFilter.ordering_param):
+            return queryset
+        return queryset.order_by('-rank', '-similarity', 'name', 'id')
+
+
+class FoodDensityFilterSet(django_filters.FilterSet):
+    """
+    Range filters on the Food nutrient densities, e.g.
+    ?protein_per_100kcal__gte=20&sugar_per_100g__lte=5 (each served by the column's B-tree index).
+    Foods without a value (no calories / serving not in grams) never match a range.
+    """
+
+    class Meta:
+        model = Food
+        fields = {field: ['gte', 'lte'] for field in DENSITY_FIELDS}
+        filter_overrides = {GeneratedField: {'filter_class': django_filters.NumberFilter}}
@@ -0,0 +1,249 @@
+import numpy as np
+from django.db import transaction
+
+from .managers import NUTRIENT_FIELDS, DAILY_TARGET_FIELDS
+from .models import Food, FoodCategory, Meal, MealItem, MealPlan, MealPlanGoal, MealTimeCategory, ScheduledMeal, SyncModel
+from .nutrition import nutrient_matrix
+from .plan_calendar import sync_plan_calendar
+from .sync import batched_changes, track_changes
+
+
+# Share of the daily calories per meal slot (normalised over the slots of the plan)
+SLOT_CALORIE_SHARES = {
+    MealTimeCategory.BREAKFAST: 0.25,
+    MealTimeCategory.LUNCH: 0.35,
+    MealTimeCategory.DINNER: 0.30,
+    MealTimeCategory.SNACK: 0.10,
+    MealTimeCategory.PRE_WORKOUT: 0.10,
+    MealTimeCategory.POST_WORKOUT: 0.15,
+}
+
+# Food categories of each food in a slot's meal, e.g. lunch = a protein food + a grain + a vegetable
+SLOT_COMPOSITION = {
+    MealTimeCategory.BREAKFAST: ((FoodCategory.GRAIN,), (FoodCategory.DAIRY, FoodCategory.PROTEIN), (FoodCategory.FRUIT,)),
+    MealTimeCategory.LUNCH: ((FoodCategory.PROTEIN,), (FoodCategory.GRAIN,), (FoodCategory.VEGETABLE,)),
+    MealTimeCategory.DINNER: ((FoodCategory.PROTEIN,), (FoodCategory.VEGETABLE,), (FoodCategory.GRAIN, FoodCategory.FAT_OIL)),
+    MealTimeCategory.SNACK: ((FoodCategory.FRUIT, FoodCategory.DAIRY, FoodCategory.OTHER),),
+    MealTimeCategory.PRE_WORKOUT: ((FoodCategory.GRAIN, FoodCategory.FRUIT),),
+    MealTimeCategory.POST_WORKOUT: ((FoodCategory.PROTEIN, FoodCategory.DAIRY), (FoodCategory.FRUIT, FoodCategory.GRAIN)),
+}
+
+DEFAULT_SLOTS = (MealTimeCategory.BREAKFAST, MealTimeCategory.LUNCH, MealTimeCategory.DINNER, MealTimeCategory.SNACK)
+
+# Share of the calories from protein / carbohydrates / fat when a macro target is not given
+GOAL_MACRO_SPLIT = {
+    MealPlanGoal.WEIGHT_LOSS: (0.30, 0.40, 0.30),
+    MealPlanGoal.WEIGHT_GAIN: (0.25, 0.50, 0.25),
+    MealPlanGoal.MAINTENANCE: (0.20, 0.50, 0.30),
+    MealPlanGoal.MUSCLE_GAIN: (0.30, 0.45, 0.25),
+    MealPlanGoal.GENERAL_HEALTH: (0.20, 0.50, 0.30),
+}
+KCAL_PER_GRAM = {'protein': 4, 'carbohydrates': 4, 'fat': 9}
+
+SERVING_STEP = 0.25
+MIN_SERVINGS = 0.25
+MAX_SERVINGS = 5.0
+RECENT_DAYS = 2  # A food is not reused in the same slot within this many days when the pool allows it
+
+
+class MealPlanGenerationError(Exception):
+    pass
+
+
+def default_targets(calories, goal):
+    """Daily macro targets (g) from the calorie target and the goal's macro split."""
+    split = GOAL_MACRO_SPLIT.get(goal, GOAL_MACRO_SPLIT[MealPlanGoal.GENERAL_HEALTH])
+    return {
+        'calories': calories,
+        **{nutrient: calories * share / KCAL_PER_GRAM[nutrient] for nutrient, share in zip(('protein', 'carbohydrates', 'fat'), split)},
+    }
+
+
+class DayOptimizer:
+    """
+    Picks the foods and servings of one day.
+    The servings solve a weighted least-squares problem over the day's macro targets plus each slot's
+    share of the calories (relative errors), projected onto [MIN_SERVINGS, MAX_SERVINGS] and rounded to
+    SERVING_STEP; a local search then swaps single foods while that lowers the error.
+    """
+
+    def __init__(self, matrix, pools, slots, targets, tolerance, rng, max_swaps=150):
+        self.matrix = matrix
+        self.pools = pools  # slot -> [candidate rows per component]
+        self.slots = slots
+        self.tolerance = tolerance
+        self.rng = rng
+        self.max_swaps = max_swaps
+
+        self.macro_columns = [NUTRIENT_FIELDS.index(nutrient) for nutrient in DAILY_TARGET_FIELDS if targets.get(nutrient)]
+        self.macro_targets = np.array([targets[nutrient] for nutrient in DAILY_TARGET_FIELDS if targets.get(nutrient)])
+        shares = np.array([SLOT_CALORIE_SHARES[slot] for slot in slots])
+        self.slot_targets = targets['calories'] * shares / shares.sum()
+        # The components of every slot, flattened: item position -> slot position
+        self.item_slots = np.array([position for position, slot in enumerate(slots) for _ in SLOT_COMPOSITION[slot]])
+
+    def pick(self, pool, exclude):
+        allowed = pool[~np.isin(pool, exclude)] if exclude else pool
+        if not len(allowed):
+            allowed = pool
+        return int(self.rng.choice(allowed))
+
+    def initial_rows(self, recent):
+        rows = []
+        for slot in self.slots:
+            used = list(recent.get(slot, ()))
+            for pool in self.pools[slot]:
+                row = self.pick(pool, used)
+                used.append(row)
+                rows.append(row)
+        return np.array(rows)
+
+    def system(self, rows):
+        nutrients = self.matrix[rows]
+        day = nutrients[:, self.macro_columns].T / self.macro_targets[:, None]
+        slot_calories = np.zeros((len(self.slots), len(rows)))
+        slot_calories[self.item_slots, np.arange(len(rows))] = nutrients[:, 0]
+        slot = 0.5 * slot_calories / self.slot_targets[:, None]  # Softer than the day targets
+        return np.vstack([day, slot]), np.concatenate([np.ones(len(day)), 0.5 * np.ones(len(slot))])
+
+    def fit(self, rows):
+        """Servings of `rows` and the (squared relative) error of the result."""
+        a, b = self.system(rows)
+        servings = np.full(len(rows), MIN_SERVINGS)
+        free = np.ones(len(rows), dtype=bool)
+        for _ in range(3):  # Projected least squares: solve for the free items, clamp, repeat
+            fixed = a[:, ~free] @ servings[~free]
+            solution = np.linalg.lstsq(a[:, free], b - fixed, rcond=None)[0]
+            servings[free] = solution
+            clamped = free & ((servings < MIN_SERVINGS) | (servings > MAX_SERVINGS))
+            servings = np.clip(servings, MIN_SERVINGS, MAX_SERVINGS)
+            if not clamped.any():
+                break
+            free &= ~clamped
+            if not free.any():
+                break
+        servings = np.maximum(np.round(servings / SERVING_STEP) * SERVING_STEP, MIN_SERVINGS)
+        residual = a @ servings - b
+        return servings, float(residual @ residual)
+
+    def within_tolerance(self, rows, servings):
+        totals = servings @ self.matrix[rows][:, self.macro_columns]
+        return bool(np.all(np.abs(totals / self.macro_targets - 1) <= self.tolerance))
+
+    def optimize(self, recent):
+        rows = self.initial_rows(recent)
+        servings, error = self.fit(rows)
+        pools = [pool for slot in self.slots for pool in self.pools[slot]]
+        for _ in range(self.max_swaps):
+            if self.within_tolerance(rows, servings):
+                break
+            position = int(self.rng.integers(len(rows)))
+            candidate = rows.copy()
+            candidate[position] = self.pick(pools[position], [*rows[self.item_slots == self.item_slots[position]]])
+            candidate_servings, candidate_error = self.fit(candidate)
+            if candidate_error < error:
+                rows, servings, error = candidate, candidate_servings, candidate_error
+        return rows, servings
+
+
+def build_pools(slots, categories, public, calories):
+    """Candidate matrix rows of every component of every slot (public foods with calories)."""
+    usable = public & (calories > 0)
+    if not usable.any():
+        raise MealPlanGenerationError("The public food catalog has no foods with calories.")
+    everything = np.flatnonzero(usable)
+    pools = {}
+    for slot in slots:
+        pools[slot] = []
+        for component in SLOT_COMPOSITION[slot]:
+            pool = np.flatnonzero(usable & np.isin(categories, component))
+            pools[slot].append(pool if len(pool) else everything)
+    return pools
+
+
+def generate_days(duration_days, slots, targets, tolerance=0.1, seed=None):
+    """
+    Foods and servings of every day: [[(slot, [(food id, servings)])]] per day.
+    """
+    snapshot = nutrient_matrix.snapshot()
+    matrix, food_ids = snapshot.matrix, snapshot.food_ids
+    pools = build_pools(slots, snapshot.categories, snapshot.public, matrix[:, 0])
+    optimizer = DayOptimizer(matrix, pools, slots, targets, tolerance, np.random.default_rng(seed))
+
+    days, history = [], []
+    for _ in range(duration_days):
+        # Variety: the foods of each slot in the last RECENT_DAYS days are avoided
+        recent = {slot: [row for day in history[-RECENT_DAYS:] for row in day.get(slot, ())] for slot in slots}
+        rows, servings = optimizer.optimize(recent)
+        day, meals, position = {}, [], 0
+        for slot_position, slot in enumerate(slots):
+            count = len(SLOT_COMPOSITION[slot])
+            slot_rows = rows[position:position + count]
+            day[slot] = list(slot_rows)
+            items = {}
+            for row, amount in zip(slot_rows, servings[position:position + count]):
+                # Same food twice in one meal (tiny pools): one item with the summed servings
+                food_id = int(food_ids[row])
+                items[food_id] = items.get(food_id, 0.0) + float(amount)
+            meals.append((slot, list(items.items())))
+            position += count
+        history.append(day)
+        days.append(meals)
+    return days
+
+
+def generate_meal_plan(user, name, duration_days, targets, goal=MealPlanGoal.GENERAL_HEALTH, slots=DEFAULT_SLOTS,
+                       tolerance=0.1, seed=None, start_date=None, description=None):
+    """
+    Build and save an `is_ai_generated` MealPlan of `duration_days` days for `user` from the public food
+    catalog: one Meal per day and slot, meeting the daily `targets` ({nutrient: value}, calories
+    required, missing macros derived from `goal`) within `tolerance` where the catalog allows it.
+    Saved with one bulk insert per table.
+    """
+    targets = {**default_targets(targets['calories'], goal), **{key: value for key, value in targets.items() if value}}
+    slots = list(dict.fromkeys(slots))
+
+    days = generate_days(duration_days, slots, targets, tolerance, seed)
+    food_ids = {food_id for meals in days for _, items in meals for food_id, _ in items}
+    if Food.objects.filter(pk__in=food_ids, is_public=True).count() != len(food_ids):
+        # A food was deleted or made private since the matrix was loaded
+        nutrient_matrix.reset()
+        days = generate_days(duration_days, slots, targets, tolerance, seed)
+
+    slot_labels = dict(MealTimeCategory.choices)
+    with transaction.atomic(), batched_changes():
+        meal_plan = MealPlan.objects.create(
+            user=user,
+            name=name,
+            description=description,
+            goal=goal,
+            duration_days=duration_days,
+            start_date=start_date,
+            is_ai_generated=True,
+            **{f'target_daily_{nutrient}': targets[nutrient] for nutrient in DAILY_TARGET_FIELDS},
+        )
+        new_meals, meal_items = [], []
+        for day_number, meals in enumerate(days, start=1):
+            for slot, items in meals:
+                new_meals.append(Meal(user=user, name=f"Day {day_number} {slot_labels[slot]}", meal_time_category=slot, is_planned=True))
+                meal_items.append(items)
+        new_meals = Meal.objects.bulk_create(new_meals)
+        new_items = MealItem.objects.bulk_create([
+            MealItem(meal=meal, food_id=food_id, number_of_servings=servings)
+            for meal, items in zip(new_meals, meal_items)
+            for food_id, servings in items
+        ])
+        # bulk_create sends no signals. The totals come from the food rows in one UPDATE, not from the
+        # in-process matrix, which may lag behind a food committed after its watermark. This also logs
+        # the meals for delta sync.
+        Meal.objects.filter(pk__in=[meal.pk for meal in new_meals]).refresh_totals()
+        meals_per_day = len(slots)
+        new_scheduled_meals = ScheduledMeal.objects.bulk_create([
+            ScheduledMeal(meal_plan=meal_plan, meal=meal, day_of_plan=position // meals_per_day + 1)
+            for position, meal in enumerate(new_meals)
+        ])
+        track_changes(SyncModel.MEAL_ITEM, [(item.pk, item.meal_id) for item in new_items])
+        track_changes(SyncModel.SCHEDULED_MEAL, [(scheduled.pk, meal_plan.pk) for scheduled in new_scheduled_meals])
+        if start_date:
+            sync_plan_calendar([meal_plan.pk])
+    return meal_plan
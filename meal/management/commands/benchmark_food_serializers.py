@@ -0,0 +1,75 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from meal.models import Food, FoodCategory
+from meal.serializers import FoodSerializer, ValuesSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time FoodSerializer against the .values() fast path (ValuesSerializer) on generated foods. "
+        "Nothing is kept in the database; identical output is checked by meal.tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000], help="Row counts to benchmark.")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per row count (the best one is reported).")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['rows'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def make_foods(self, count):
+        user = get_user_model().objects.create_user(email='benchmark-food-serializers@example.com', password=None, first_name='Bench', last_name='Mark')
+        categories = [value for value, _ in FoodCategory.choices]
+        Food.objects.bulk_create([
+            Food(
+                name=f"Benchmark food {i}", description="Generated" if i % 2 else None,
+                calories=100 + i, protein=10.5, carbohydrates=20, fat=5, fiber=None if i % 3 else 1.5,
+                food_category=categories[i % len(categories)], user_added=user if i % 2 else None, is_public=True,
+            )
+            for i in range(count)
+        ], batch_size=1000)
+
+    def best_of(self, repeat, render):
+        best, output = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = render()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
+
+    def run(self, row_counts, repeat):
+        self.make_foods(max(row_counts))
+        renderer = JSONRenderer()
+        base = Food.objects.filter(name__startswith="Benchmark food ").order_by('id')
+
+        for count in row_counts:
+            def serializer_path():
+                queryset = base.select_related('user_added')[:count]
+                return renderer.render(FoodSerializer(queryset, many=True).data)
+
+            def values_path():
+                values_serializer = ValuesSerializer(FoodSerializer())
+                rows = base.values(*values_serializer.columns)[:count]
+                return renderer.render(values_serializer.to_representation(rows))
+
+            serializer_time, _ = self.best_of(repeat, serializer_path)
+            values_time, _ = self.best_of(repeat, values_path)
+            self.stdout.write(
+                f"{count:>6} rows  FoodSerializer {serializer_time * 1000:8.2f} ms"
+                f"  values {values_time * 1000:8.2f} ms  ({serializer_time / values_time:4.1f}x)"
+            )
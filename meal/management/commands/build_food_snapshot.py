@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from meal.catalog_snapshot import build_food_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the gzip NDJSON snapshot of the public food catalog served by GET /foods/snapshot/. "
+        "Run it periodically (e.g. hourly from cron) and after import_foods."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=2, help="Snapshot files to keep, the current one included (default 2).")
+
+    def handle(self, *args, **options):
+        manifest, created = build_food_snapshot(keep=max(options['keep'], 1))
+        if not created:
+            self.stdout.write(f"The catalog did not change: snapshot {manifest['version']} is still current.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Built snapshot {manifest['version']}: {manifest['count']} foods, {manifest['size']} bytes ({manifest['name']})."
+        ))
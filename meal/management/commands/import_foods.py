@@ -0,0 +1,252 @@
+import csv
+import hashlib
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from meal.autocomplete import food_prefix_index
+from meal.barcodes import food_barcode_cache
+from meal.cache import bump_template_cache_version
+from meal.models import Food, FoodCategory, Meal
+
+
+# USDA FoodData Central nutrient numbers -> Food field (values are per 100 g)
+USDA_NUTRIENTS = {
+    '208': 'calories',  # Energy (kcal)
+    '957': 'calories',  # Energy (Atwater General Factors), used when 208 is missing
+    '203': 'protein',
+    '205': 'carbohydrates',  # Carbohydrate, by difference
+    '204': 'fat',  # Total lipid (fat)
+    '291': 'fiber',
+    '269': 'sugar',
+    '2000': 'sugar',
+    '307': 'sodium',  # mg
+}
+
+# Keywords of USDA food category descriptions -> FoodCategory
+USDA_CATEGORIES = (
+    ('fruit', FoodCategory.FRUIT),
+    ('vegetable', FoodCategory.VEGETABLE),
+    ('cereal', FoodCategory.GRAIN),
+    ('grain', FoodCategory.GRAIN),
+    ('baked', FoodCategory.GRAIN),
+    ('pasta', FoodCategory.GRAIN),
+    ('dairy', FoodCategory.DAIRY),
+    ('fats and oils', FoodCategory.FAT_OIL),
+    ('beverage', FoodCategory.BEVERAGE),
+    ('poultry', FoodCategory.PROTEIN),
+    ('beef', FoodCategory.PROTEIN),
+    ('pork', FoodCategory.PROTEIN),
+    ('lamb', FoodCategory.PROTEIN),
+    ('sausage', FoodCategory.PROTEIN),
+    ('fish', FoodCategory.PROTEIN),
+    ('egg', FoodCategory.PROTEIN),
+    ('legume', FoodCategory.PROTEIN),
+    ('nut', FoodCategory.PROTEIN),
+)
+
+REQUIRED_NUTRIENTS = ('calories', 'protein', 'carbohydrates', 'fat')
+OPTIONAL_NUTRIENTS = ('fiber', 'sugar', 'sodium')
+
+# Columns refreshed when an imported food already exists (matched on external_id)
+UPDATE_FIELDS = [
+    'name', 'description', 'serving_quantity', 'serving_unit', *REQUIRED_NUTRIENTS, *OPTIONAL_NUTRIENTS,
+    'food_category', 'is_public', 'updated_at',
+]
+
+
+def iter_json_array(file, chunk_size=1024 * 1024):
+    """
+    Yield the objects of the first JSON array in `file` one at a time, reading it in chunks, so a
+    USDA dump ({"FoundationFoods": [...]}) or a plain [...] file never has to fit in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+
+    def read_more():
+        nonlocal buffer, eof
+        chunk = file.read(chunk_size)
+        if chunk:
+            buffer += chunk
+        else:
+            eof = True
+
+    while '[' not in buffer:
+        if eof:
+            return
+        read_more()
+    buffer = buffer[buffer.index('[') + 1:]
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if not buffer:
+            if eof:
+                raise CommandError("Unexpected end of JSON input.")
+            read_more()
+            continue
+        if buffer[0] == ']':
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError("Invalid JSON input.")
+            read_more()  # The object is cut at the chunk boundary
+            continue
+        yield obj
+        buffer = buffer[end:]
+
+
+def parse_number(value):
+    if value is None or value == '':
+        return None
+    number = float(value)
+    if number < 0:
+        raise ValueError(f"negative value {value!r}")
+    return number
+
+
+def parse_category(value):
+    value = (value or '').strip().lower()
+    for code, label in FoodCategory.choices:
+        if value in (code.lower(), label.lower()):
+            return code
+    return FoodCategory.OTHER
+
+
+def check_lengths(row):
+    """Reject values longer than their column (PostgreSQL would abort the whole batch with a DataError)."""
+    for field in ('external_id', 'name', 'serving_unit'):
+        max_length = Food._meta.get_field(field).max_length
+        if len(row[field]) > max_length:
+            raise ValueError(f"{field} is longer than {max_length} characters")
+    return row
+
+
+def row_from_csv(record):
+    """
+    CSV columns: name, description, serving_quantity, serving_unit, calories, protein, carbohydrates,
+    fat, fiber, sugar, sodium, food_category (code or label) and optionally external_id.
+    """
+    name = (record.get('name') or '').strip()
+    serving_quantity = parse_number(record.get('serving_quantity')) or 1.0
+    serving_unit = (record.get('serving_unit') or 'g').strip()
+    external_id = (record.get('external_id') or '').strip()
+    if not external_id:
+        # No id in the file: the food is identified by its name and serving
+        external_id = f"csv:{' '.join(name.lower().split())}|{serving_quantity:g}|{serving_unit.lower()}"
+        if len(external_id) > Food._meta.get_field('external_id').max_length:
+            external_id = f"csv:{hashlib.sha256(external_id.encode()).hexdigest()}"
+    row = {
+        'external_id': external_id,
+        'name': name,
+        'description': (record.get('description') or '').strip() or None,
+        'serving_quantity': serving_quantity,
+        'serving_unit': serving_unit,
+        'food_category': parse_category(record.get('food_category')),
+    }
+    for field in REQUIRED_NUTRIENTS + OPTIONAL_NUTRIENTS:
+        row[field] = parse_number(record.get(field))
+    return check_lengths(row)
+
+
+def row_from_usda(record):
+    """
+    USDA FoodData Central food (Foundation / SR Legacy / Branded JSON); nutrients are per 100 g.
+    """
+    row = {
+        'external_id': f"usda:{record['fdcId']}",
+        'name': (record.get('description') or '').strip(),
+        'description': None,
+        'serving_quantity': 100.0,
+        'serving_unit': 'g',
+        'food_category': FoodCategory.OTHER,
+    }
+    category = record.get('foodCategory') or record.get('brandedFoodCategory') or ''
+    if isinstance(category, dict):
+        category = category.get('description', '')
+    category = category.lower()
+    for keyword, code in USDA_CATEGORIES:
+        if keyword in category:
+            row['food_category'] = code
+            break
+
+    for field in REQUIRED_NUTRIENTS + OPTIONAL_NUTRIENTS:
+        row[field] = None
+    for food_nutrient in record.get('foodNutrients', []):
+        nutrient = food_nutrient.get('nutrient') or {}
+        field = USDA_NUTRIENTS.get(str(nutrient.get('number', '')))
+        # The first value wins, e.g. Energy 208 before the Atwater 957 fallback
+        if field and row[field] is None and food_nutrient.get('amount') is not None:
+            row[field] = parse_number(food_nutrient['amount'])
+    return check_lengths(row)
+
+
+class Command(BaseCommand):
+    help = "Stream public Food rows from a CSV or USDA FoodData JSON dump, upserting on external_id in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON file to import.")
+        parser.add_argument('--format', choices=['csv', 'usda'], help="Input format (default: from the file extension).")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows per bulk insert.")
+
+    def read_rows(self, path, file_format):
+        if file_format == 'csv':
+            with open(path, newline='', encoding='utf-8-sig') as file:
+                for record in csv.DictReader(file):
+                    yield record, row_from_csv
+        else:
+            with open(path, encoding='utf-8') as file:
+                for record in iter_json_array(file):
+                    yield record, row_from_usda
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f"File not found: {path}")
+        file_format = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'usda')
+        batch_size = options['batch_size']
+
+        read = imported = skipped = 0
+        batch = {}
+        for record, to_row in self.read_rows(path, file_format):
+            read += 1
+            try:
+                row = to_row(record)
+                if not row['name'] or any(row[field] is None for field in REQUIRED_NUTRIENTS):
+                    raise ValueError("name, calories, protein, carbohydrates and fat are required")
+            except (KeyError, TypeError, ValueError) as e:
+                skipped += 1
+                if skipped <= 10:
+                    self.stderr.write(f"Row {read} skipped: {e}")
+                continue
+
+            # Same key twice in one batch would hit the same row twice in one upsert; the last one wins
+            batch[row['external_id']] = Food(is_public=True, user_added=None, **row)
+            if len(batch) >= batch_size:
+                imported += self.flush(batch)
+                self.stdout.write(f"{read} rows read, {imported} imported, {skipped} skipped")
+
+        if batch:
+            imported += self.flush(batch)
+        food_prefix_index.invalidate()
+        food_barcode_cache.clear()
+        bump_template_cache_version()
+        self.stdout.write(self.style.SUCCESS(f"Done: {read} rows read, {imported} imported, {skipped} skipped."))
+
+    def flush(self, batch):
+        foods = list(batch.values())
+        with transaction.atomic():
+            Food.objects.bulk_create(
+                foods,
+                update_conflicts=True,
+                unique_fields=['external_id'],
+                update_fields=UPDATE_FIELDS,
+            )
+            # bulk_create sends no signals: refresh the stored totals of meals using re-imported foods
+            Meal.objects.filter(mealitem__food__external_id__in=list(batch)).refresh_totals()
+        batch.clear()
+        return len(foods)
@@ -0,0 +1,18 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from meal.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete the delta sync tombstones (SyncChange rows of deleted objects) older than --days."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Keep the tombstones of the last N days (default 90).")
+
+    def handle(self, *args, **options):
+        # Clients with an older sync token get 410 and sync from scratch
+        deleted = prune_tombstones(timezone.now() - datetime.timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} sync tombstones."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from meal.models import DailyNutritionSummary, Meal
+from meal.summaries import rebuild_daily_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild / repair the daily nutrition summaries (DailyNutritionSummary) from the stored meal totals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only rebuild the summaries of this user id.")
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user_ids = [options['user']]
+        else:
+            # Users with meals, and users left with summaries but no meals
+            user_ids = sorted(
+                set(Meal.objects.order_by().values_list('user_id', flat=True).distinct())
+                | set(DailyNutritionSummary.objects.order_by().values_list('user_id', flat=True).distinct())
+            )
+
+        # One user per transaction so a long run does not hold one huge transaction
+        for position, user_id in enumerate(user_ids, start=1):
+            rebuild_daily_summaries([user_id])
+            if position % 100 == 0:
+                self.stdout.write(f"{position}/{len(user_ids)} users rebuilt")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the daily summaries of {len(user_ids)} users."))
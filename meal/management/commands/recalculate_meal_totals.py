@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from meal.models import Meal
+
+
+class Command(BaseCommand):
+    help = "Backfill / repair the stored nutrition totals (Meal.total_*) from the meal items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only recalculate the meals of this user id.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of meals updated per statement.")
+
+    def handle(self, *args, **options):
+        queryset = Meal.objects.all()
+        if options['user']:
+            queryset = queryset.filter(user_id=options['user'])
+
+        batch_size = options['batch_size']
+        meal_ids = queryset.order_by('pk').values_list('pk', flat=True)
+        total = meal_ids.count()
+        updated = 0
+
+        # Walk the meals in primary key ranges so each UPDATE stays small
+        last_pk = 0
+        while True:
+            batch = list(meal_ids.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            updated += Meal.objects.filter(pk__in=batch).refresh_totals()
+            last_pk = batch[-1]
+            self.stdout.write(f"{updated}/{total} meals recalculated")
+
+        self.stdout.write(self.style.SUCCESS(f"Recalculated totals for {updated} meals."))
@@ -0,0 +1,185 @@
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+
+# Nutrients stored on Food (per serving) and summed onto Meal as `total_<nutrient>`
+NUTRIENT_FIELDS = ('calories', 'protein', 'carbohydrates', 'fat', 'fiber', 'sugar', 'sodium')
+
+
+def meal_item_total(nutrient, meal_ref='pk'):
+    """
+    Correlated subquery: SUM(food.<nutrient> * number_of_servings) of the meal referenced by `meal_ref`.
+    Items whose food has no value for the nutrient are ignored, same as the old Python properties.
+    """
+    from .models import MealItem
+
+    item_sum = (
+        MealItem.objects.filter(meal=OuterRef(meal_ref))
+        .order_by()
+        .values('meal')
+        .annotate(total=Sum(F(f'food__{nutrient}') * F('number_of_servings'), output_field=FloatField()))
+        .values('total')
+    )
+    return Coalesce(Subquery(item_sum, output_field=FloatField()), Value(0.0))
+
+
+class MealQuerySet(models.QuerySet):
+
+    def refresh_totals(self):
+        """
+        Recompute the stored `total_*` columns of every meal in this queryset with a single UPDATE.
+        Also bumps `updated_at` (conditional GET validators), refreshes the users' daily summaries
+        of the days involved and logs the meals for delta sync. Returns the number of meals updated.
+        """
+        from .models import SyncModel # meal.summaries and meal.sync import the models
+        from .summaries import refresh_daily_summaries
+        from .sync import track_changes
+
+        meals = list(self.values_list('pk', 'user_id', 'created_at'))
+        updated = self.update(updated_at=timezone.now(), **{
+            f'total_{nutrient}': meal_item_total(nutrient) for nutrient in NUTRIENT_FIELDS
+        })
+        refresh_daily_summaries({(user_id, created_at) for _, user_id, created_at in meals})
+        track_changes(SyncModel.MEAL, [(pk, user_id) for pk, user_id, _ in meals])
+        return updated
+
+    def with_totals(self):
+        """
+        Annotate each meal with `item_count` and `items_total_<nutrient>` computed in SQL
+        (SUM(food.<nutrient> * number_of_servings) over a join + GROUP BY), straight from the items.
+        """
+        return self.annotate(
+            item_count=Count('mealitem'),
+            **{
+                f'items_total_{nutrient}': Coalesce(
+                    Sum(F(f'mealitem__food__{nutrient}') * F('mealitem__number_of_servings'), output_field=FloatField()),
+                    Value(0.0),
+                )
+                for nutrient in NUTRIENT_FIELDS
+            }
+        )
+
+
+# Macros that MealPlan has a `target_daily_<nutrient>` for
+DAILY_TARGET_FIELDS = ('calories', 'protein', 'carbohydrates', 'fat')
+
+
+class MealPlanQuerySet(models.QuerySet):
+
+    def with_daily_totals(self):
+        """
+        Annotate each plan with `daily_<nutrient>`: the scheduled meals' stored totals summed in SQL
+        and averaged over `duration_days`, so no meal / item / food rows are loaded.
+        """
+        queryset = self.annotate(**{
+            f'daily_{nutrient}': ExpressionWrapper(
+                Coalesce(Sum(f'scheduledmeal__meal__total_{nutrient}'), Value(0.0)) / Greatest(F('duration_days'), 1),
+                output_field=FloatField(),
+            )
+            for nutrient in DAILY_TARGET_FIELDS
+        })
+        if not self.query.order_by:
+            # Meta.ordering is not applied to GROUP BY queries: keep list pages in a stable order
+            queryset = queryset.order_by(*self.model._meta.ordering)
+        return queryset
+
+
+class ScheduledMealQuerySet(models.QuerySet):
+
+    def daily_totals(self):
+        """
+        One row per day_of_plan with the day's meal count and summed macros, from the meals' stored totals
+        (a single GROUP BY day_of_plan query).
+        """
+        return (
+            self.order_by('day_of_plan')
+            .values('day_of_plan')
+            .annotate(
+                meal_count=Count('id'),
+                **{nutrient: Coalesce(Sum(f'meal__total_{nutrient}'), Value(0.0)) for nutrient in DAILY_TARGET_FIELDS}
+            )
+        )
+
+
+class MealItemQuerySet(models.QuerySet):
+
+    def add_servings(self, meal_id, food_id, number_of_servings):
+        """
+        Add `number_of_servings` of a food to a meal in a single statement: insert the item, or
+        increase the servings of the existing (meal, food) item. Concurrent adds of the same food all
+        count, with no read-modify-write in Python. Returns (item id, its number_of_servings).
+        """
+        connection = connections[self.db]
+        if connection.vendor in ('postgresql', 'sqlite'):
+            quote = connection.ops.quote_name
+            table = quote(self.model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} ({quote('meal_id')}, {quote('food_id')}, {quote('number_of_servings')}) "
+                    f"VALUES (%s, %s, %s) "
+                    f"ON CONFLICT ({quote('meal_id')}, {quote('food_id')}) DO UPDATE "
+                    f"SET {quote('number_of_servings')} = {table}.{quote('number_of_servings')} + EXCLUDED.{quote('number_of_servings')} "
+                    f"RETURNING {quote('id')}, {quote('number_of_servings')}",
+                    [meal_id, food_id, number_of_servings],
+                )
+                return cursor.fetchone()
+
+        # Other backends: UPDATE ... SET n = n + x, else INSERT; an insert lost to a concurrent one updates instead
+        items = self.filter(meal_id=meal_id, food_id=food_id)
+        with transaction.atomic(using=self.db):
+            if not items.update(number_of_servings=F('number_of_servings') + number_of_servings):
+                try:
+                    with transaction.atomic(using=self.db):
+                        self.create(meal_id=meal_id, food_id=food_id, number_of_servings=number_of_servings)
+                except IntegrityError:
+                    items.update(number_of_servings=F('number_of_servings') + number_of_servings)
+            return items.values_list('id', 'number_of_servings').get()
+
+
+class SyncVersionQuerySet(models.QuerySet):
+
+    def allocate(self, counts):
+        """
+        Reserve counts[user_id] new sync versions for each user in a single statement and return
+        {user id: last version} (the reserved versions are last - count + 1 .. last). The counter rows
+        are locked in user id order and stay locked until the transaction commits, so a user's versions
+        become visible in increasing order.
+        """
+        user_ids = sorted(counts)
+        connection = connections[self.db]
+        if connection.vendor in ('postgresql', 'sqlite'):
+            quote = connection.ops.quote_name
+            table = quote(self.model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} ({quote('user_id')}, {quote('version')}, {quote('pruned_version')}) "
+                    f"VALUES {', '.join(['(%s, %s, 0)'] * len(user_ids))} "
+                    f"ON CONFLICT ({quote('user_id')}) DO UPDATE "
+                    f"SET {quote('version')} = {table}.{quote('version')} + EXCLUDED.{quote('version')} "
+                    f"RETURNING {quote('user_id')}, {quote('version')}",
+                    [value for user_id in user_ids for value in (user_id, counts[user_id])],
+                )
+                return dict(cursor.fetchall())
+
+        # Other backends: UPDATE ... SET version = version + n, else INSERT (see MealItemQuerySet.add_servings)
+        versions = {}
+        with transaction.atomic(using=self.db):
+            for user_id in user_ids:
+                counters = self.filter(user_id=user_id)
+                if not counters.update(version=F('version') + counts[user_id]):
+                    try:
+                        with transaction.atomic(using=self.db):
+                            self.create(user_id=user_id, version=counts[user_id])
+                    except IntegrityError:
+                        counters.update(version=F('version') + counts[user_id])
+                versions[user_id] = counters.values_list('version', flat=True).get()
+        return versions
+
+
+MealManager = models.Manager.from_queryset(MealQuerySet)
+MealItemManager = models.Manager.from_queryset(MealItemQuerySet)
+SyncVersionManager = models.Manager.from_queryset(SyncVersionQuerySet)
+MealPlanManager = models.Manager.from_queryset(MealPlanQuerySet)
+ScheduledMealManager = models.Manager.from_queryset(ScheduledMealQuerySet)
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:00
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_meal_totals(apps, schema_editor):
+    Meal = apps.get_model('meal', 'Meal')
+    MealItem = apps.get_model('meal', 'MealItem')
+
+    def item_total(nutrient):
+        item_sum = (
+            MealItem.objects.filter(meal=OuterRef('pk'))
+            .order_by()
+            .values('meal')
+            .annotate(total=Sum(F(f'food__{nutrient}') * F('number_of_servings'), output_field=FloatField()))
+            .values('total')
+        )
+        return Coalesce(Subquery(item_sum, output_field=FloatField()), Value(0.0))
+
+    nutrients = ('calories', 'protein', 'carbohydrates', 'fat', 'fiber', 'sugar', 'sodium')
+    Meal.objects.update(**{f'total_{nutrient}': item_total(nutrient) for nutrient in nutrients})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0002_mealplan_is_template'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meal',
+            name='total_calories',
+            field=models.FloatField(default=0, editable=False, verbose_name='Total Calories'),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_carbohydrates',
+            field=models.FloatField(default=0, editable=False, verbose_name='Total Carbohydrates (g)'),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_fat',
+            field=models.FloatField(default=0, editable=False, verbose_name='Total Fat (g)'),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_fiber',
+            field=models.FloatField(default=0, editable=False, verbose_name='Total Fiber (g)'),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_protein',
+            field=models.FloatField(default=0, editable=False, verbose_name='Total Protein (g)'),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_sodium',
+            field=models.FloatField(default=0, editable=False, verbose_name='Total Sodium (mg)'),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_sugar',
+            field=models.FloatField(default=0, editable=False, verbose_name='Total Sugar (g)'),
+        ),
+        migrations.RunPython(backfill_meal_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:03
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# PostgreSQL only: the tsvector trigger and the GIN indexes. Other backends (SQLite test runs)
+# keep an empty search_vector column and FoodSearchFilter falls back to DRF's SearchFilter.
+SEARCH_SQL = """
+CREATE OR REPLACE FUNCTION meal_food_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER meal_food_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON meal_food
+    FOR EACH ROW EXECUTE FUNCTION meal_food_search_vector_update();
+
+UPDATE meal_food SET search_vector =
+    setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'B');
+
+CREATE INDEX meal_food_search_vector_gin ON meal_food USING gin (search_vector);
+CREATE INDEX meal_food_name_trgm_gin ON meal_food USING gin (name gin_trgm_ops);
+"""
+
+REVERSE_SEARCH_SQL = """
+DROP INDEX IF EXISTS meal_food_name_trgm_gin;
+DROP INDEX IF EXISTS meal_food_search_vector_gin;
+DROP TRIGGER IF EXISTS meal_food_search_vector_trigger ON meal_food;
+DROP FUNCTION IF EXISTS meal_food_search_vector_update();
+"""
+
+
+def create_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_SQL, params=None)
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(REVERSE_SEARCH_SQL, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0003_meal_stored_totals'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='food',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0004_food_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True, verbose_name='External ID'),
+        ),
+    ]
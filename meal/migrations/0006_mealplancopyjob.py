@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0005_food_external_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MealPlanCopyJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('deep', models.BooleanField(default=False, verbose_name='Deep Copy (clone meals)')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('SUCCEEDED', 'Succeeded'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('result_plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='meal.mealplan', verbose_name='Copied Plan')),
+                ('source_plan', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='copy_jobs', to='meal.mealplan', verbose_name='Source Plan')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meal_plan_copy_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Meal Plan Copy Job',
+                'verbose_name_plural': 'Meal Plan Copy Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0006_mealplancopyjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['name', 'id'], name='meal_food_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meal',
+            index=models.Index(fields=['user', '-created_at', 'id'], name='meal_meal_user_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mealplan',
+            index=models.Index(fields=['user', '-created_at', 'id'], name='meal_plan_user_created_id_idx'),
+        ),
+    ]
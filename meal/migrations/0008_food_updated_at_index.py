@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0007_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['updated_at'], name='meal_food_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:28
+
+import zoneinfo
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_summaries(apps, schema_editor):
+    # No profile has a time zone yet: every user's days are bucketed in TIME_ZONE
+    Meal = apps.get_model('meal', 'Meal')
+    DailyNutritionSummary = apps.get_model('meal', 'DailyNutritionSummary')
+    fields = [f'total_{nutrient}' for nutrient in ('calories', 'protein', 'carbohydrates', 'fat', 'fiber', 'sugar', 'sodium')]
+    rows = (
+        Meal.objects.filter(is_template=False)
+        .annotate(day=TruncDate('created_at', tzinfo=zoneinfo.ZoneInfo(settings.TIME_ZONE)))
+        .order_by()
+        .values('user_id', 'day')
+        .annotate(meal_count=Count('pk'), **{field: Sum(field) for field in fields})
+    )
+    DailyNutritionSummary.objects.bulk_create(
+        (DailyNutritionSummary(date=row.pop('day'), **row) for row in rows.iterator()),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0008_food_updated_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyNutritionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Local Date')),
+                ('meal_count', models.PositiveIntegerField(default=0)),
+                ('total_calories', models.FloatField(default=0, verbose_name='Total Calories')),
+                ('total_protein', models.FloatField(default=0, verbose_name='Total Protein (g)')),
+                ('total_carbohydrates', models.FloatField(default=0, verbose_name='Total Carbohydrates (g)')),
+                ('total_fat', models.FloatField(default=0, verbose_name='Total Fat (g)')),
+                ('total_fiber', models.FloatField(default=0, verbose_name='Total Fiber (g)')),
+                ('total_sugar', models.FloatField(default=0, verbose_name='Total Sugar (g)')),
+                ('total_sodium', models.FloatField(default=0, verbose_name='Total Sodium (mg)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_nutrition_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Nutrition Summary',
+                'verbose_name_plural': 'Daily Nutrition Summaries',
+                'ordering': ['-date'],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:34
+
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_plan_calendar(apps, schema_editor):
+    MealPlan = apps.get_model('meal', 'MealPlan')
+    ScheduledMeal = apps.get_model('meal', 'ScheduledMeal')
+    PlanCalendarEntry = apps.get_model('meal', 'PlanCalendarEntry')
+    plans = {
+        plan_id: (user_id, start_date)
+        for plan_id, user_id, start_date in MealPlan.objects.filter(
+            is_active=True, is_template=False, start_date__isnull=False,
+        ).values_list('id', 'user_id', 'start_date')
+    }
+    schedule = ScheduledMeal.objects.filter(meal_plan__in=list(plans)).order_by().values_list('id', 'meal_plan_id', 'day_of_plan')
+    PlanCalendarEntry.objects.bulk_create(
+        (
+            PlanCalendarEntry(
+                user_id=plans[meal_plan_id][0],
+                date=plans[meal_plan_id][1] + datetime.timedelta(days=day_of_plan - 1),
+                meal_plan_id=meal_plan_id,
+                scheduled_meal_id=scheduled_meal_id,
+            )
+            for scheduled_meal_id, meal_plan_id, day_of_plan in schedule.iterator()
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0009_dailynutritionsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanCalendarEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('meal_plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_entries', to='meal.mealplan', verbose_name='Meal Plan')),
+                ('scheduled_meal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_entry', to='meal.scheduledmeal', verbose_name='Scheduled Meal')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plan_calendar_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Plan Calendar Entry',
+                'verbose_name_plural': 'Plan Calendar Entries',
+                'indexes': [models.Index(fields=['user', 'date'], name='meal_calendar_user_date_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_plan_calendar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,136 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:36
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+import django.db.models.lookups
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0010_plan_calendar_entry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='calories_per_100g',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.In(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('serving_unit')), ('g', 'gram', 'grams')), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('calories'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('serving_quantity'), 0.0))), default=None, output_field=models.FloatField()), output_field=models.FloatField(), verbose_name='Calories per 100 g'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='carbohydrates_per_100g',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.In(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('serving_unit')), ('g', 'gram', 'grams')), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('carbohydrates'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('serving_quantity'), 0.0))), default=None, output_field=models.FloatField()), output_field=models.FloatField(), verbose_name='Carbohydrates per 100 g (g)'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='carbohydrates_per_100kcal',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('carbohydrates'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('calories'), 0.0)), output_field=models.FloatField(), verbose_name='Carbohydrates per 100 kcal (g)'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='fat_per_100g',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.In(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('serving_unit')), ('g', 'gram', 'grams')), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('fat'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('serving_quantity'), 0.0))), default=None, output_field=models.FloatField()), output_field=models.FloatField(), verbose_name='Fat per 100 g (g)'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='fat_per_100kcal',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('fat'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('calories'), 0.0)), output_field=models.FloatField(), verbose_name='Fat per 100 kcal (g)'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='fiber_per_100g',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.In(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('serving_unit')), ('g', 'gram', 'grams')), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('fiber'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('serving_quantity'), 0.0))), default=None, output_field=models.FloatField()), output_field=models.FloatField(), verbose_name='Fiber per 100 g (g)'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='fiber_per_100kcal',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('fiber'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('calories'), 0.0)), output_field=models.FloatField(), verbose_name='Fiber per 100 kcal (g)'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='protein_per_100g',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.In(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('serving_unit')), ('g', 'gram', 'grams')), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('protein'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('serving_quantity'), 0.0))), default=None, output_field=models.FloatField()), output_field=models.FloatField(), verbose_name='Protein per 100 g (g)'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='protein_per_100kcal',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('protein'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('calories'), 0.0)), output_field=models.FloatField(), verbose_name='Protein per 100 kcal (g)'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='sodium_per_100g',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.In(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('serving_unit')), ('g', 'gram', 'grams')), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('sodium'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('serving_quantity'), 0.0))), default=None, output_field=models.FloatField()), output_field=models.FloatField(), verbose_name='Sodium per 100 g (mg)'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='sodium_per_100kcal',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('sodium'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('calories'), 0.0)), output_field=models.FloatField(), verbose_name='Sodium per 100 kcal (mg)'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='sugar_per_100g',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.In(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('serving_unit')), ('g', 'gram', 'grams')), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('sugar'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('serving_quantity'), 0.0))), default=None, output_field=models.FloatField()), output_field=models.FloatField(), verbose_name='Sugar per 100 g (g)'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='sugar_per_100kcal',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('sugar'), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.NullIf(models.F('calories'), 0.0)), output_field=models.FloatField(), verbose_name='Sugar per 100 kcal (g)'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['calories_per_100g'], name='meal_food_kcal_100g_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['protein_per_100g'], name='meal_food_protein_100g_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['carbohydrates_per_100g'], name='meal_food_carbs_100g_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['fat_per_100g'], name='meal_food_fat_100g_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['fiber_per_100g'], name='meal_food_fiber_100g_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['sugar_per_100g'], name='meal_food_sugar_100g_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['sodium_per_100g'], name='meal_food_sodium_100g_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['protein_per_100kcal'], name='meal_food_protein_100kcal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['carbohydrates_per_100kcal'], name='meal_food_carbs_100kcal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['fat_per_100kcal'], name='meal_food_fat_100kcal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['fiber_per_100kcal'], name='meal_food_fiber_100kcal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['sugar_per_100kcal'], name='meal_food_sugar_100kcal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['sodium_per_100kcal'], name='meal_food_sodium_100kcal_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0011_food_density_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='barcode',
+            field=models.CharField(blank=True, max_length=14, null=True, unique=True, verbose_name='Barcode (GTIN-14)'),
+        ),
+    ]
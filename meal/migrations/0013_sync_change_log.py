@@ -0,0 +1,68 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_sync_changes(apps, schema_editor):
+    # Every existing row is one change, numbered per user: a first sync returns them all
+    SyncChange = apps.get_model('meal', 'SyncChange')
+    SyncVersion = apps.get_model('meal', 'SyncVersion')
+    sources = [
+        ('meal', apps.get_model('meal', 'Meal').objects.values_list('id', 'user_id')),
+        ('meal_item', apps.get_model('meal', 'MealItem').objects.values_list('id', 'meal__user_id')),
+        ('meal_plan', apps.get_model('meal', 'MealPlan').objects.values_list('id', 'user_id')),
+        ('scheduled_meal', apps.get_model('meal', 'ScheduledMeal').objects.values_list('id', 'meal_plan__user_id')),
+    ]
+    versions = {}
+
+    def changes():
+        for label, rows in sources:
+            for object_id, user_id in rows.order_by('id').iterator():
+                versions[user_id] = versions.get(user_id, 0) + 1
+                yield SyncChange(user_id=user_id, model=label, object_id=object_id, version=versions[user_id])
+
+    SyncChange.objects.bulk_create(changes(), batch_size=2000)
+    SyncVersion.objects.bulk_create(
+        [SyncVersion(user_id=user_id, version=version) for user_id, version in versions.items()], batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0012_food_barcode'),
+        ('users', '0002_usersprofile_timezone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sync_version', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.BigIntegerField(default=0)),
+                ('pruned_version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('meal', 'Meal'), ('meal_item', 'Meal Item'), ('meal_plan', 'Meal Plan'), ('scheduled_meal', 'Scheduled Meal')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('version', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sync Change',
+                'verbose_name_plural': 'Sync Changes',
+                'indexes': [models.Index(fields=['user', 'version'], name='meal_sync_user_version_idx')],
+                'unique_together': {('user', 'model', 'object_id')},
+            },
+        ),
+        migrations.RunPython(backfill_sync_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0013_sync_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealplancopyjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
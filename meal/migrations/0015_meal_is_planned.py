@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-17 11:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def flag_planned_meals(apps, schema_editor):
+    # Only meals the generator made for the user's own is_ai_generated plans, and scheduled nowhere else,
+    # are known to be planned. Everything else (including deep copies, which have no recorded origin)
+    # stays logged intake. Run `manage.py rebuild_daily_summaries` afterwards to take the flagged meals
+    # out of the history.
+    Meal = apps.get_model('meal', 'Meal')
+    Meal.objects.filter(
+        scheduledmeal__meal_plan__is_ai_generated=True,
+        scheduledmeal__meal_plan__user=F('user'),
+    ).exclude(
+        scheduledmeal__meal_plan__is_ai_generated=False,
+    ).update(is_planned=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0014_mealplancopyjob_started_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meal',
+            name='is_planned',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Planned Meal?'),
+        ),
+        migrations.RunPython(flag_planned_meals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-17 11:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0015_meal_is_planned'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='food',
+            name='barcode',
+            field=models.CharField(blank=True, db_index=True, max_length=14, null=True, verbose_name='Barcode (GTIN-14)'),
+        ),
+        migrations.AddConstraint(
+            model_name='food',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_public', True)), fields=('barcode',), name='meal_food_public_barcode_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='food',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_public', False)), fields=('user_added', 'barcode'), name='meal_food_user_barcode_uniq'),
+        ),
+    ]
@@ -1,8 +1,14 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Lower, NullIf, Trim
+from django.db.models.lookups import In
 from django.utils import timezone
 
+from .managers import MealManager, MealItemManager, MealPlanManager, ScheduledMealManager, SyncVersionManager, NUTRIENT_FIELDS, DAILY_TARGET_FIELDS
+
 
 # Helper Constants (Choices)
 class FoodCategory(models.TextChoices):
@@ -31,6 +37,33 @@ class MealPlanGoal(models.TextChoices):
     GENERAL_HEALTH = 'GH', 'General Health'
 
 
+# Serving units whose serving_quantity is a mass in grams
+GRAM_UNITS = ('g', 'gram', 'grams')
+
+# Normalised nutrient densities stored on Food (database-generated columns, see per_100g / per_100kcal)
+PER_100G_FIELDS = tuple(f'{nutrient}_per_100g' for nutrient in NUTRIENT_FIELDS)
+PER_100KCAL_FIELDS = tuple(f'{nutrient}_per_100kcal' for nutrient in NUTRIENT_FIELDS if nutrient != 'calories')
+DENSITY_FIELDS = PER_100G_FIELDS + PER_100KCAL_FIELDS
+
+
+def per_100g(nutrient):
+    # NULL when the serving is not measured in grams (pieces, cups...) or the nutrient is missing
+    return Case(
+        When(In(Lower(Trim('serving_unit')), GRAM_UNITS), then=F(nutrient) * 100.0 / NullIf(F('serving_quantity'), 0.0)),
+        default=None,
+        output_field=models.FloatField(),
+    )
+
+
+def per_100kcal(nutrient):
+    # NULL for foods without calories
+    return F(nutrient) * 100.0 / NullIf(F('calories'), 0.0)
+
+
+def density_field(expression, verbose_name):
+    return models.GeneratedField(expression=expression, output_field=models.FloatField(), db_persist=True, verbose_name=verbose_name)
+
+
 class Food(models.Model):
     name = models.CharField(max_length=200, verbose_name="Food Name")
     description = models.TextField(blank=True, null=True, verbose_name="Description")
@@ -52,6 +85,30 @@ class Food(models.Model):
      # If the user added this custom food
     user_added = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='added_foods', verbose_name="Added by User")
     is_public = models.BooleanField(default=True, verbose_name="Publicly Available") # True if admin adds a general food item
+    # Natural key of catalog imports (manage.py import_foods), e.g. "usda:171688"
+    external_id = models.CharField(max_length=255, unique=True, null=True, blank=True, verbose_name="External ID")
+    # GTIN zero-padded to 14 digits (meal.barcodes.normalize_gtin), so UPC-A / EAN-13 / GTIN-14 scans match.
+    # Unique among public foods and among each user's private foods (see Meta.constraints): a private
+    # food cannot claim a product's code for everyone else.
+    barcode = models.CharField(max_length=14, db_index=True, null=True, blank=True, verbose_name="Barcode (GTIN-14)")
+    # Full-text document (name weighted A, description B). On PostgreSQL it is filled by a database
+    # trigger and backed by a GIN index, plus a pg_trgm GIN index on name (see migration 0004).
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    # Nutrient densities computed by the database from the columns above on every insert / update
+    # (bulk ones included), so range filters and sorting use plain B-tree indexes
+    calories_per_100g = density_field(per_100g('calories'), "Calories per 100 g")
+    protein_per_100g = density_field(per_100g('protein'), "Protein per 100 g (g)")
+    carbohydrates_per_100g = density_field(per_100g('carbohydrates'), "Carbohydrates per 100 g (g)")
+    fat_per_100g = density_field(per_100g('fat'), "Fat per 100 g (g)")
+    fiber_per_100g = density_field(per_100g('fiber'), "Fiber per 100 g (g)")
+    sugar_per_100g = density_field(per_100g('sugar'), "Sugar per 100 g (g)")
+    sodium_per_100g = density_field(per_100g('sodium'), "Sodium per 100 g (mg)")
+    protein_per_100kcal = density_field(per_100kcal('protein'), "Protein per 100 kcal (g)")
+    carbohydrates_per_100kcal = density_field(per_100kcal('carbohydrates'), "Carbohydrates per 100 kcal (g)")
+    fat_per_100kcal = density_field(per_100kcal('fat'), "Fat per 100 kcal (g)")
+    fiber_per_100kcal = density_field(per_100kcal('fiber'), "Fiber per 100 kcal (g)")
+    sugar_per_100kcal = density_field(per_100kcal('sugar'), "Sugar per 100 kcal (g)")
+    sodium_per_100kcal = density_field(per_100kcal('sodium'), "Sodium per 100 kcal (mg)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -62,6 +119,28 @@ class Food(models.Model):
         verbose_name = "Food"
         verbose_name_plural = "Foods"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='meal_food_name_id_idx'), # Keyset pagination
+            models.Index(fields=['updated_at'], name='meal_food_updated_at_idx'), # Incremental NutrientMatrix reloads
+            # Density range filters / ordering (FoodViewSet)
+            models.Index(fields=['calories_per_100g'], name='meal_food_kcal_100g_idx'),
+            models.Index(fields=['protein_per_100g'], name='meal_food_protein_100g_idx'),
+            models.Index(fields=['carbohydrates_per_100g'], name='meal_food_carbs_100g_idx'),
+            models.Index(fields=['fat_per_100g'], name='meal_food_fat_100g_idx'),
+            models.Index(fields=['fiber_per_100g'], name='meal_food_fiber_100g_idx'),
+            models.Index(fields=['sugar_per_100g'], name='meal_food_sugar_100g_idx'),
+            models.Index(fields=['sodium_per_100g'], name='meal_food_sodium_100g_idx'),
+            models.Index(fields=['protein_per_100kcal'], name='meal_food_protein_100kcal_idx'),
+            models.Index(fields=['carbohydrates_per_100kcal'], name='meal_food_carbs_100kcal_idx'),
+            models.Index(fields=['fat_per_100kcal'], name='meal_food_fat_100kcal_idx'),
+            models.Index(fields=['fiber_per_100kcal'], name='meal_food_fiber_100kcal_idx'),
+            models.Index(fields=['sugar_per_100kcal'], name='meal_food_sugar_100kcal_idx'),
+            models.Index(fields=['sodium_per_100kcal'], name='meal_food_sodium_100kcal_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['barcode'], condition=Q(is_public=True), name='meal_food_public_barcode_uniq'),
+            models.UniqueConstraint(fields=['user_added', 'barcode'], condition=Q(is_public=False), name='meal_food_user_barcode_uniq'),
+        ]
 
 
 class Meal(models.Model):
@@ -79,45 +158,44 @@ class Meal(models.Model):
     foods = models.ManyToManyField(Food, through='MealItem', related_name='meals_containing', verbose_name="Foods")
     
     is_template = models.BooleanField(default=False, verbose_name="Is Template Meal?") # Reusable template
+    # Created for a generated or deep-copied meal plan: planned, not eaten, so not part of the intake history
+    is_planned = models.BooleanField(default=False, editable=False, verbose_name="Planned Meal?")
+
+    # Stored nutrition totals, kept in sync by meal.signals (MealItem / Food changes)
+    # Repair with: python manage.py recalculate_meal_totals
+    total_calories = models.FloatField(default=0, editable=False, verbose_name="Total Calories")
+    total_protein = models.FloatField(default=0, editable=False, verbose_name="Total Protein (g)")
+    total_carbohydrates = models.FloatField(default=0, editable=False, verbose_name="Total Carbohydrates (g)")
+    total_fat = models.FloatField(default=0, editable=False, verbose_name="Total Fat (g)")
+    total_fiber = models.FloatField(default=0, editable=False, verbose_name="Total Fiber (g)")
+    total_sugar = models.FloatField(default=0, editable=False, verbose_name="Total Sugar (g)")
+    total_sodium = models.FloatField(default=0, editable=False, verbose_name="Total Sodium (mg)")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def __str__(self):
-        return f"{self.user.username} - {self.name} ({self.get_meal_time_category_display()})"
-    
-    # Properties for total nutrition calculation
-    @property
-    def total_calories(self):
-        return sum(item.calculated_calories for item in self.mealitem_set.all() if item.calculated_calories is not None)
-    @property
-    def total_protein(self):
-        return sum(item.calculated_protein for item in self.mealitem_set.all() if item.calculated_protein is not None)
-
-    @property
-    def total_carbohydrates(self):
-        return sum(item.calculated_carbohydrates for item in self.mealitem_set.all() if item.calculated_carbohydrates is not None)
-
-    @property
-    def total_fat(self):
-        return sum(item.calculated_fat for item in self.mealitem_set.all() if item.calculated_fat is not None)
+    objects = MealManager()
 
-    @property
-    def total_fiber(self):
-        return sum(item.calculated_fiber for item in self.mealitem_set.all() if item.calculated_fiber is not None)
+    TOTAL_FIELDS = tuple(f'total_{nutrient}' for nutrient in NUTRIENT_FIELDS)
 
-    @property
-    def total_sugar(self):
-        return sum(item.calculated_sugar for item in self.mealitem_set.all() if item.calculated_sugar is not None)
+    def __str__(self):
+        return f"{self.user.username} - {self.name} ({self.get_meal_time_category_display()})"
 
-    @property
-    def total_sodium(self):
-        return sum(item.calculated_sodium for item in self.mealitem_set.all() if item.calculated_sodium is not None)
+    def refresh_totals(self):
+        """
+        Recompute the stored totals from the meal items and reload them on this instance.
+        """
+        Meal.objects.filter(pk=self.pk).refresh_totals()
+        self.refresh_from_db(fields=[*self.TOTAL_FIELDS, 'updated_at'])
 
+    
     class Meta:
         verbose_name = 'Meal'
         verbose_name_plural = 'Meals'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', 'id'], name='meal_meal_user_created_id_idx'), # Keyset pagination
+        ]
 
 # Junction table for Many-to-Many relationship between Meal and Food, storing quantity
 class MealItem(models.Model):
@@ -134,6 +212,8 @@ class MealItem(models.Model):
         verbose_name="Number of Servings" # e.g., 0.5, 1, 2 servingsj
     )
 
+    objects = MealItemManager()
+
     @property
     def calculated_calories(self):
         if self.food.calories is not None:
@@ -210,19 +290,60 @@ class MealPlan(models.Model):
     is_ai_generated = models.BooleanField(default=False)
     is_template = models.BooleanField(default=False, verbose_name="Is Template Meal?") # Reusable template
 
+    objects = MealPlanManager()
+
     def __str__(self):
         return f"{self.user.username} - {self.name} ({self.duration_days} days)"
+
+    def get_daily_totals(self):
+        """
+        Average daily macros of the plan. Uses the `with_daily_totals()` annotations when the
+        instance came from that queryset, otherwise runs the same aggregate for this plan only.
+        """
+        fields = [f'daily_{nutrient}' for nutrient in DAILY_TARGET_FIELDS]
+        if not all(hasattr(self, field) for field in fields):
+            self.refresh_daily_totals()
+        return {field: getattr(self, field) for field in fields}
+
+    def get_daily_summary(self):
+        """
+        Per-day totals of the plan next to its daily targets. Days without scheduled meals are included
+        with zeros so the list always covers 1..duration_days.
+        """
+        rows = {row['day_of_plan']: row for row in ScheduledMeal.objects.filter(meal_plan=self).daily_totals()}
+        last_day = max([self.duration_days, *rows]) if rows else self.duration_days
+        empty_day = {'meal_count': 0, **{nutrient: 0.0 for nutrient in DAILY_TARGET_FIELDS}}
+        return {
+            'meal_plan': self.pk,
+            'duration_days': self.duration_days,
+            'targets': {nutrient: getattr(self, f'target_daily_{nutrient}') for nutrient in DAILY_TARGET_FIELDS},
+            'days': [rows.get(day, {'day_of_plan': day, **empty_day}) for day in range(1, last_day + 1)],
+        }
+
+    def refresh_daily_totals(self):
+        """
+        Re-run the daily totals aggregate for this plan (e.g. after its scheduled meals changed).
+        """
+        fields = [f'daily_{nutrient}' for nutrient in DAILY_TARGET_FIELDS]
+        totals = MealPlan.objects.filter(pk=self.pk).with_daily_totals().values(*fields).get()
+        for field, value in totals.items():
+            setattr(self, field, value)
     
     class Meta:
         verbose_name = "Meal Plan"
         verbose_name_plural = "Meal Plans"
         ordering = ['user', '-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', 'id'], name='meal_plan_user_created_id_idx'), # Keyset pagination
+        ]
 
 class ScheduledMeal(models.Model):
     meal_plan = models.ForeignKey(MealPlan, on_delete=models.CASCADE, verbose_name="Meal Plan")
     meal = models.ForeignKey(Meal, on_delete=models.CASCADE, verbose_name="Meal") # This can be a template meal or a user-created meal
     day_of_plan = models.PositiveIntegerField(verbose_name="Day of Plan") # e.g., 1, 2, ..., meal_plan.duration_days
 
+    objects = ScheduledMealManager()
+
     def __str__(self):
         return f"Plan: {self.meal_plan.name} - Day {self.day_of_plan}: {self.meal.name}"
 
@@ -230,4 +351,131 @@ class ScheduledMeal(models.Model):
         verbose_name = "Scheduled Meal"
         verbose_name_plural = "Scheduled Meals"
         unique_together = ('meal_plan', 'meal', 'day_of_plan')
-        ordering = ['meal_plan', 'day_of_plan', 'meal__meal_time_category']
\ No newline at end of file
+        ordering = ['meal_plan', 'day_of_plan', 'meal__meal_time_category']
+
+class CopyJobStatus(models.TextChoices):
+    PENDING = 'PENDING', 'Pending'
+    RUNNING = 'RUNNING', 'Running'
+    SUCCEEDED = 'SUCCEEDED', 'Succeeded'
+    FAILED = 'FAILED', 'Failed'
+
+class MealPlanCopyJob(models.Model):
+    """
+    Background copy of a large meal plan (see meal.services.start_meal_plan_copy_job).
+    The client polls it until `result_plan` is set.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='meal_plan_copy_jobs')
+    source_plan = models.ForeignKey(MealPlan, on_delete=models.SET_NULL, null=True, related_name='copy_jobs', verbose_name="Source Plan")
+    result_plan = models.ForeignKey(MealPlan, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Copied Plan")
+    deep = models.BooleanField(default=False, verbose_name="Deep Copy (clone meals)")
+    status = models.CharField(max_length=10, choices=CopyJobStatus.choices, default=CopyJobStatus.PENDING)
+    error = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Copy job {self.pk} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Meal Plan Copy Job"
+        verbose_name_plural = "Meal Plan Copy Jobs"
+        ordering = ['-created_at']
+
+
+class DailyNutritionSummary(models.Model):
+    """
+    One row per user per local day (the user's profile time zone, else TIME_ZONE): the summed stored
+    totals of the meals logged that day. Maintained by meal.summaries whenever meal totals change;
+    weekly / monthly history is aggregated from these rows.
+    Rebuild with: python manage.py rebuild_daily_summaries
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_nutrition_summaries')
+    date = models.DateField(verbose_name="Local Date")
+    meal_count = models.PositiveIntegerField(default=0)
+    total_calories = models.FloatField(default=0, verbose_name="Total Calories")
+    total_protein = models.FloatField(default=0, verbose_name="Total Protein (g)")
+    total_carbohydrates = models.FloatField(default=0, verbose_name="Total Carbohydrates (g)")
+    total_fat = models.FloatField(default=0, verbose_name="Total Fat (g)")
+    total_fiber = models.FloatField(default=0, verbose_name="Total Fiber (g)")
+    total_sugar = models.FloatField(default=0, verbose_name="Total Sugar (g)")
+    total_sodium = models.FloatField(default=0, verbose_name="Total Sodium (mg)")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user} - {self.date}: {self.total_calories} kcal"
+
+    class Meta:
+        verbose_name = "Daily Nutrition Summary"
+        verbose_name_plural = "Daily Nutrition Summaries"
+        unique_together = ('user', 'date') # Also the (user, date) range index of the history endpoints
+        ordering = ['-date']
+
+
+class PlanCalendarEntry(models.Model):
+    """
+    The dated schedule of the active plans: one row per ScheduledMeal of an active, started
+    (start_date set), non-template MealPlan, on start_date + day_of_plan - 1.
+    Maintained by meal.plan_calendar when plans or their scheduled meals change.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='plan_calendar_entries')
+    date = models.DateField(verbose_name="Date")
+    meal_plan = models.ForeignKey(MealPlan, on_delete=models.CASCADE, related_name='calendar_entries', verbose_name="Meal Plan")
+    scheduled_meal = models.OneToOneField(ScheduledMeal, on_delete=models.CASCADE, related_name='calendar_entry', verbose_name="Scheduled Meal")
+
+    def __str__(self):
+        return f"{self.user} - {self.date}: {self.scheduled_meal_id}"
+
+    class Meta:
+        verbose_name = "Plan Calendar Entry"
+        verbose_name_plural = "Plan Calendar Entries"
+        indexes = [
+            models.Index(fields=['user', 'date'], name='meal_calendar_user_date_idx'), # /meal-plans/today/
+        ]
+
+
+class SyncModel(models.TextChoices):
+    MEAL = 'meal', 'Meal'
+    MEAL_ITEM = 'meal_item', 'Meal Item'
+    MEAL_PLAN = 'meal_plan', 'Meal Plan'
+    SCHEDULED_MEAL = 'scheduled_meal', 'Scheduled Meal'
+
+
+class SyncVersion(models.Model):
+    """
+    Per-user counter of the delta sync versions (see meal.sync). `pruned_version` is the newest
+    version whose tombstone was pruned: older sync tokens can no longer be served.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='sync_version')
+    version = models.BigIntegerField(default=0)
+    pruned_version = models.BigIntegerField(default=0)
+
+    objects = SyncVersionManager()
+
+    def __str__(self):
+        return f"{self.user} - v{self.version}"
+
+
+class SyncChange(models.Model):
+    """
+    The latest change of one synced row of a user (a Meal, MealItem, MealPlan or ScheduledMeal),
+    stamped with the user's next sync version; `deleted` rows are the tombstones of hard deletes.
+    Written by meal.sync inside the transaction of the change.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sync_changes')
+    model = models.CharField(max_length=16, choices=SyncModel.choices)
+    object_id = models.BigIntegerField()
+    version = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user} - v{self.version}: {self.model} {self.object_id}{' (deleted)' if self.deleted else ''}"
+
+    class Meta:
+        verbose_name = "Sync Change"
+        verbose_name_plural = "Sync Changes"
+        unique_together = ('user', 'model', 'object_id')
+        indexes = [
+            models.Index(fields=['user', 'version'], name='meal_sync_user_version_idx'), # GET /sync/?since=
+        ]
@@ -0,0 +1,213 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from .managers import NUTRIENT_FIELDS
+from .models import GRAM_UNITS, Food, MealItem, ScheduledMeal
+
+
+# The loaded catalog; replaced as a whole on every refresh, so readers never see a half-applied one.
+# index: food id -> row; matrix: foods x NUTRIENT_FIELDS; then one array entry per row: food id,
+# food_category, is_public, serving mass in grams (NaN when the serving unit is not grams) and the
+# refresh generation that last loaded the row (what changed since a given generation).
+CatalogSnapshot = namedtuple('CatalogSnapshot', ['index', 'matrix', 'food_ids', 'categories', 'public', 'grams', 'versions', 'generation'])
+
+
+class NutrientMatrix:
+    """
+    In-process nutrient matrix of the food catalog for bulk totals.
+
+    `matrix` is foods x NUTRIENT_FIELDS (missing values count as 0, like the stored Meal.total_*).
+    Meal totals are the sparse product (meals x foods servings) @ matrix, computed from flat
+    (meal, food, servings) arrays with np.bincount instead of one Python object per item; day and plan
+    totals are a second product over the scheduled meals. Each call first reloads the foods whose
+    `updated_at` moved since the last load (one query on the updated_at index; nothing is copied when it
+    only returns the rows already loaded at the watermark).
+    """
+
+    COLUMNS = ('id', 'updated_at', 'food_category', 'is_public', 'serving_quantity', 'serving_unit', *NUTRIENT_FIELDS)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watermark = None  # Latest Food.updated_at loaded
+        self._watermark_ids = set()  # Foods loaded with exactly that updated_at
+        self._snapshot = self.empty_snapshot()
+
+    @staticmethod
+    def empty_snapshot():
+        return CatalogSnapshot(
+            {}, np.zeros((0, len(NUTRIENT_FIELDS))), np.zeros(0, dtype=np.int64), np.zeros(0, dtype='<U2'),
+            np.zeros(0, dtype=bool), np.zeros(0), np.zeros(0, dtype=np.int64), 0,
+        )
+
+    def refresh(self):
+        """
+        Load new and changed foods into the matrix. Deleted foods keep their row: no meal item can
+        reference them any more (CASCADE), and callers picking foods from `snapshot()` re-check them.
+        """
+        with self._lock:
+            watermark = self._watermark
+            foods = Food.objects.order_by()
+            if watermark is not None:
+                # >= : a food saved in the same instant as the last load is loaded again, never missed
+                foods = foods.filter(updated_at__gte=watermark)
+            rows = list(foods.values_list(*self.COLUMNS))
+            if not rows or all(row[1] == watermark and row[0] in self._watermark_ids for row in rows):
+                return  # Nothing changed since the last load
+            self._apply(rows)
+            latest = max(row[1] for row in rows)
+            if watermark is None or latest > watermark:
+                self._watermark, self._watermark_ids = latest, set()
+            self._watermark_ids.update(row[0] for row in rows if row[1] == self._watermark)
+
+    def load(self, food_ids):
+        """
+        Load these foods whatever their updated_at: a food whose transaction committed after a later
+        `updated_at` was loaded is behind the watermark and never picked up by refresh().
+        """
+        with self._lock:
+            rows = list(Food.objects.filter(pk__in=list(food_ids)).order_by().values_list(*self.COLUMNS))
+            if rows:
+                self._apply(rows)
+
+    def _apply(self, rows):
+        # Copy-on-write update of the snapshot with these rows (call with the lock held)
+        snapshot = self._snapshot
+        index = dict(snapshot.index)
+        new_ids = [row[0] for row in rows if row[0] not in index]
+        arrays = [snapshot.matrix, snapshot.categories, snapshot.public, snapshot.grams, snapshot.versions]
+        if new_ids:
+            first_row = len(index)
+            index.update((food_id, first_row + position) for position, food_id in enumerate(new_ids))
+            arrays = [np.concatenate([array, np.zeros((len(new_ids), *array.shape[1:]), dtype=array.dtype)]) for array in arrays]
+            food_ids = np.concatenate([snapshot.food_ids, np.array(new_ids, dtype=np.int64)])
+        else:
+            arrays = [array.copy() for array in arrays]
+            food_ids = snapshot.food_ids
+        matrix, categories, public, grams, versions = arrays
+
+        generation = snapshot.generation + 1
+        positions = np.fromiter((index[row[0]] for row in rows), dtype=np.intp, count=len(rows))
+        matrix[positions] = np.array([row[6:] for row in rows], dtype=float)
+        np.nan_to_num(matrix, copy=False)  # NULL nutrients
+        categories[positions] = [row[2] for row in rows]
+        public[positions] = [row[3] for row in rows]
+        grams[positions] = [row[4] if (row[5] or '').strip().lower() in GRAM_UNITS else np.nan for row in rows]
+        versions[positions] = generation
+
+        self._snapshot = CatalogSnapshot(index, matrix, food_ids, categories, public, grams, versions, generation)
+
+    def discard(self, food_id):
+        """
+        Stop offering a deleted food (deletes leave no updated_at to pick up) in this process.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            row = snapshot.index.get(food_id)
+            if row is None or not snapshot.public[row]:
+                return
+            public, versions = snapshot.public.copy(), snapshot.versions.copy()
+            generation = snapshot.generation + 1
+            public[row], versions[row] = False, generation
+            self._snapshot = snapshot._replace(public=public, versions=versions, generation=generation)
+
+    def snapshot(self):
+        """
+        Refresh, then return the current CatalogSnapshot.
+        """
+        self.refresh()
+        return self._snapshot
+
+    def reset(self):
+        with self._lock:
+            self._watermark, self._watermark_ids = None, set()
+            self._snapshot = self.empty_snapshot()
+
+    def food_rows(self, food_ids):
+        """(matrix row of each food id, matrix); foods that no longer exist point at a row of zeros."""
+        snapshot = self._snapshot
+        if any(food_id not in snapshot.index for food_id in set(food_ids)):
+            # Created after the last load within the same timestamp window; load them now
+            self.refresh()
+            snapshot = self._snapshot
+            missing = {food_id for food_id in food_ids if food_id not in snapshot.index}
+            if missing:
+                # Committed behind the watermark: load them by id
+                self.load(missing)
+                snapshot = self._snapshot
+        matrix = snapshot.matrix
+        if any(food_id not in snapshot.index for food_id in food_ids):
+            # Deleted meanwhile (their items are deleted with them)
+            matrix = np.vstack([matrix, np.zeros((1, len(NUTRIENT_FIELDS)))])
+        zeros = len(snapshot.index)
+        rows = np.fromiter((snapshot.index.get(food_id, zeros) for food_id in food_ids), dtype=np.intp, count=len(food_ids))
+        return rows, matrix
+
+    def item_totals(self, food_ids, servings):
+        """
+        Nutrients of each (food_id, number_of_servings) pair: an (items x nutrients) array.
+        """
+        rows, matrix = self.food_rows(list(food_ids))
+        return matrix[rows] * np.asarray(servings, dtype=float)[:, None]
+
+    @staticmethod
+    def group_totals_of(groups, values):
+        """
+        Sum the rows of `values` (items x nutrients) into their group: (sorted group ids, groups x nutrients).
+        """
+        group_ids, positions = np.unique(np.asarray(groups, dtype=np.int64), return_inverse=True)
+        if not len(group_ids):
+            return group_ids, np.zeros((0, len(NUTRIENT_FIELDS)))
+        return group_ids, np.column_stack([
+            np.bincount(positions, weights=values[:, column], minlength=len(group_ids))
+            for column in range(len(NUTRIENT_FIELDS))
+        ])
+
+    def group_totals(self, groups, food_ids, servings):
+        """
+        Sum the items into their group (e.g. meal id): returns (sorted group ids, groups x nutrients).
+        """
+        return self.group_totals_of(groups, self.item_totals(food_ids, servings))
+
+    def meal_totals_array(self, meals):
+        """
+        Totals of every meal in the `meals` queryset (or id list): (meal ids, meals x nutrients).
+        Meals without items are left out.
+        """
+        self.refresh()
+        items = list(MealItem.objects.filter(meal__in=meals).values_list('meal_id', 'food_id', 'number_of_servings'))
+        meal_ids, food_ids, servings = zip(*items) if items else ((), (), ())
+        return self.group_totals(meal_ids, food_ids, servings)
+
+    def scheduled_totals_array(self, scheduled_meals, group_by):
+        """
+        Sum the meal totals of `scheduled_meals` (a ScheduledMeal queryset) grouped by the
+        `group_by` column: returns (sorted group keys, groups x nutrients).
+        """
+        schedule = list(scheduled_meals.order_by().values_list(group_by, 'meal_id'))
+        if not schedule:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, len(NUTRIENT_FIELDS)))
+        meal_ids, meal_totals = self.meal_totals_array(scheduled_meals.order_by().values('meal_id'))
+
+        keys, meals = np.array(schedule, dtype=np.int64).T
+        # Meals without items have no row in meal_totals; they point at an extra row of zeros
+        meal_totals = np.vstack([meal_totals, np.zeros((1, len(NUTRIENT_FIELDS)))])
+        meal_rows = np.searchsorted(meal_ids, meals)
+        found = meal_rows < len(meal_ids)
+        found[found] = meal_ids[meal_rows[found]] == meals[found]
+        meal_rows[~found] = len(meal_ids)
+
+        # Second sparse product: (groups x scheduled meals) @ (scheduled meals x nutrients)
+        return self.group_totals_of(keys, meal_totals[meal_rows])
+
+    def plan_totals(self, meal_plans):
+        """
+        {plan id: {nutrient: total over the whole plan}} for every plan in `meal_plans` (queryset or id
+        list); plans without scheduled meals are left out.
+        """
+        keys, totals = self.scheduled_totals_array(ScheduledMeal.objects.filter(meal_plan__in=meal_plans), 'meal_plan_id')
+        return {key: dict(zip(NUTRIENT_FIELDS, row)) for key, row in zip(keys.tolist(), totals.tolist())}
+
+
+nutrient_matrix = NutrientMatrix()
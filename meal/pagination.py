@@ -0,0 +1,110 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class OptInCursorPagination(PageNumberPagination):
+    """
+    PageNumberPagination by default, keyset (cursor) pagination when the client opts in with
+    `?pagination=cursor` (the `next` links carry it along with `cursor=`).
+
+    Cursor pages are ordered by the view's `cursor_ordering` (a unique ordering ending in `id`) and
+    fetched with `WHERE (a, id) > (last a, last id) ... LIMIT page_size + 1`: no COUNT(*) and no
+    OFFSET, so a deep page costs the same as the first one. Pages only go forward (`previous` is null).
+    """
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    cursor_page_size_query_param = 'page_size'
+    max_cursor_page_size = 100
+    default_cursor_ordering = ('-created_at', 'id')
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def get_cursor_ordering(self, view):
+        return tuple(getattr(view, 'cursor_ordering', self.default_cursor_ordering))
+
+    def get_cursor_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.cursor_page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_cursor_page_size)
+
+    def encode_cursor(self, values):
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor, model, ordering):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(name.lstrip('-')).to_python(value)
+                for name, value in zip(ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound('Invalid cursor.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.use_cursor(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        ordering = self.get_cursor_ordering(view)
+        page_size = self.get_cursor_page_size(request)
+        queryset = queryset.order_by(*ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            values = self.decode_cursor(cursor, queryset.model, ordering)
+            # (a > x) OR (a = x AND b > y) OR ... honouring each field's direction
+            position = Q()
+            for index, name in enumerate(ordering):
+                field = name.lstrip('-')
+                lookup = 'lt' if name.startswith('-') else 'gt'
+                condition = Q(**{f'{field}__{lookup}': values[index]})
+                for previous_name, previous_value in zip(ordering[:index], values[:index]):
+                    condition &= Q(**{previous_name.lstrip('-'): previous_value})
+                position |= condition
+            queryset = queryset.filter(position)
+
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = None
+        if self.has_next:
+            last = page[-1]
+            if isinstance(last, dict): # .values() rows
+                last = queryset.model(**{name.lstrip('-'): last[name.lstrip('-')] for name in ordering})
+            self.next_cursor = self.encode_cursor([
+                last._meta.get_field(name.lstrip('-')).value_to_string(last) for name in ordering
+            ])
+        return page
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_cursor_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+    def get_cursor_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        url = replace_query_param(url, self.mode_query_param, 'cursor')
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
@@ -0,0 +1,73 @@
+import datetime
+
+from django.db import transaction
+
+from .models import MealPlan, PlanCalendarEntry, ScheduledMeal
+
+
+# PlanCalendarEntry holds the dated schedule of the active plans, so "what is due on this day" is one
+# (user, date) index range scan instead of date arithmetic over every active plan.
+# sync_plan_calendar() rebuilds the entries of whole plans; it runs from meal.signals when a plan is
+# saved, and bulk paths (bulk_create of ScheduledMeals) call it themselves. A single scheduled meal
+# save only rewrites its own entry (sync_scheduled_meal_entry()).
+# Deleted scheduled meals and plans take their entries with them (CASCADE).
+
+
+def calendar_plans(meal_plan_ids):
+    """The plans among `meal_plan_ids` that belong in the calendar."""
+    return MealPlan.objects.filter(pk__in=meal_plan_ids, is_active=True, is_template=False, start_date__isnull=False)
+
+
+def build_entries(meal_plans):
+    """Unsaved PlanCalendarEntry rows of the given plans' scheduled meals."""
+    plans = {plan_id: (user_id, start_date) for plan_id, user_id, start_date in meal_plans.values_list('id', 'user_id', 'start_date')}
+    schedule = ScheduledMeal.objects.filter(meal_plan__in=list(plans)).order_by().values_list('id', 'meal_plan_id', 'day_of_plan')
+    entries = []
+    for scheduled_meal_id, meal_plan_id, day_of_plan in schedule:
+        user_id, start_date = plans[meal_plan_id]
+        entries.append(PlanCalendarEntry(
+            user_id=user_id,
+            date=start_date + datetime.timedelta(days=day_of_plan - 1),
+            meal_plan_id=meal_plan_id,
+            scheduled_meal_id=scheduled_meal_id,
+        ))
+    return entries
+
+
+def sync_plan_calendar(meal_plan_ids):
+    """Rebuild the calendar entries of these plans (none for inactive, unstarted or template plans)."""
+    meal_plan_ids = list(meal_plan_ids)
+    if not meal_plan_ids:
+        return
+    with transaction.atomic():
+        PlanCalendarEntry.objects.filter(meal_plan__in=meal_plan_ids).delete()
+        PlanCalendarEntry.objects.bulk_create(build_entries(calendar_plans(meal_plan_ids)), batch_size=2000)
+
+
+def sync_scheduled_meal_entry(scheduled_meal):
+    """Upsert (or drop) the calendar entry of one scheduled meal: two queries whatever the plan length."""
+    plan = calendar_plans([scheduled_meal.meal_plan_id]).values_list('user_id', 'start_date').first()
+    if plan is None:
+        PlanCalendarEntry.objects.filter(scheduled_meal=scheduled_meal).delete()
+        return
+    user_id, start_date = plan
+    PlanCalendarEntry.objects.bulk_create(
+        [PlanCalendarEntry(
+            user_id=user_id,
+            date=start_date + datetime.timedelta(days=scheduled_meal.day_of_plan - 1),
+            meal_plan_id=scheduled_meal.meal_plan_id,
+            scheduled_meal_id=scheduled_meal.pk,
+        )],
+        update_conflicts=True,
+        unique_fields=['scheduled_meal'],
+        update_fields=['user', 'date', 'meal_plan'],
+    )
+
+
+def get_plan_day(user, date):
+    """The user's calendar entries on `date`, with their scheduled meal and meal (one range scan)."""
+    return (
+        PlanCalendarEntry.objects.filter(user=user, date=date)
+        .select_related('scheduled_meal__meal', 'meal_plan')
+        .order_by('meal_plan_id', 'scheduled_meal_id')
+    )
@@ -1,22 +1,190 @@
 from rest_framework import serializers
-from .models import Food, Meal, MealItem, MealPlan, ScheduledMeal
+from rest_framework import ISO_8601
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from .models import DENSITY_FIELDS, Food, Meal, MealItem, MealPlan, MealPlanCopyJob, MealPlanGoal, MealTimeCategory, PlanCalendarEntry, ScheduledMeal, SyncModel
+from .cache import bump_template_cache_version
+from .signals import meal_totals_deferred, schedule_signals_deferred
+from .barcodes import normalize_gtin
+from .plan_calendar import sync_plan_calendar
+from .sync import batched_changes, track_changes
 from users.serializers import CustomSerializer
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django.utils.encoding import is_protected_type
 
 User = get_user_model()
 
 
-class FoodSerializer(serializers.ModelSerializer):
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that first looks the pk up in objects preloaded by BulkListSerializer,
+    so validating N nested items costs one query instead of one queryset.get() per item.
+    """
+    preloaded = None
+
+    def to_internal_value(self, data):
+        if self.preloaded is not None and not isinstance(data, bool):
+            try:
+                instance = self.preloaded.get(int(data))
+            except (TypeError, ValueError):
+                instance = None
+            if instance is not None:
+                return instance
+        return super().to_internal_value(data)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer that loads every PreloadedPrimaryKeyRelatedField target of the payload with one
+    in_bulk() query per field before the items are validated, or takes them from
+    context['preloaded'] ({field name: {pk: object}}) when they are all there.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            for field_name, field in self.child.fields.items():
+                if isinstance(field, PreloadedPrimaryKeyRelatedField) and not field.read_only:
+                    pks = set()
+                    for item in data:
+                        try:
+                            pks.add(int(item.get(field_name)))
+                        except (AttributeError, TypeError, ValueError):
+                            continue  # Reported by the field itself
+                    # Objects already loaded for a whole batch of payloads (see MealBatchSerializer)
+                    preloaded = self.context.get('preloaded', {}).get(field_name)
+                    if preloaded is not None and pks <= preloaded.keys():
+                        field.preloaded = preloaded
+                    else:
+                        field.preloaded = field.get_queryset().in_bulk(pks)
+        return super().to_internal_value(data)
+
+
+def get_sparse_options(request):
+    """
+    (fields, expand) requested with ?fields=a,b and ?expand=c,d on a read request, else (None, None).
+    Each is a set of names, or None when the parameter was not sent.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, None
+    options = []
+    for param in ('fields', 'expand'):
+        value = request.query_params.get(param)
+        options.append(None if value is None else {name.strip() for name in value.split(',') if name.strip()})
+    return tuple(options)
+
+
+def is_expanded(request, name, top_level=True, expand_only=False, options=None):
+    """
+    Whether the nested field `name` should be built for this request.
+    Without ?fields= / ?expand= every nested field is built (the full representation),
+    except `expand_only` ones which are only built when asked for.
+    """
+    fields, expand = options or get_sparse_options(request)
+    if fields is None and expand is None:
+        return not expand_only
+    return name in (expand or set()) or bool(top_level and fields and name in fields)
+
+
+class ExpandableFieldsMixin:
+    """
+    Sparse fieldsets and opt-in expansion for read requests:
+    - ?fields=id,name,...  keeps only these fields of the top-level serializer
+    - ?expand=user_detail,meal_items,...  builds only these nested serializers (at any depth)
+    Nested fields listed in Meta.expandable_fields ({name: flat id key or None}) that are not expanded
+    are removed before they are bound, so they are never built, and the flat id is returned instead.
+    Without either parameter the full representation is returned as before.
+    """
+
+    def _sparse_options(self):
+        root = self.root
+        if not hasattr(root, '_sparse_options_cache'):
+            root._sparse_options_cache = get_sparse_options(self.context.get('request'))
+        return root._sparse_options_cache
+
+    def is_sparse(self):
+        return self._sparse_options() != (None, None)
+
+    def is_top_level(self):
+        if self.context.get('nested'):
+            return False # Built by hand inside a parent's to_representation
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def is_expanded(self, name):
+        return is_expanded(
+            None, name,
+            top_level=self.is_top_level(),
+            expand_only=name in getattr(self.Meta, 'expand_only_fields', ()),
+            options=self._sparse_options(),
+        )
+
+    def is_wanted(self, name):
+        fields, _ = self._sparse_options()
+        return not (fields and self.is_top_level()) or name in fields
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expandable_fields = getattr(self.Meta, 'expandable_fields', {})
+        for name in list(fields):
+            if fields[name].write_only:
+                continue # Needed to validate input
+            if (name in expandable_fields and not self.is_expanded(name)) or not self.is_wanted(name):
+                del fields[name]
+        return fields
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        if self.is_sparse():
+            for name, flat_key in getattr(self.Meta, 'expandable_fields', {}).items():
+                if flat_key and name not in representation and flat_key not in representation and self.is_wanted(flat_key):
+                    representation[flat_key] = getattr(instance, f'{flat_key}_id')
+        return representation
+
+
+class FoodSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     user_added_detail = CustomSerializer(source='user_added', read_only=True)
 
     class Meta:
         model = Food
         fields = [
             'id', 'name', 'description', 'serving_quantity', 'serving_unit', 'calories','protein', 'carbohydrates', 'fat', 'fiber', 'sugar', 'sodium', 'food_category','user_added_detail', # Use user_added for write, user_added_detail for read
-            'is_public',
+            'is_public', 'barcode',
+            *DENSITY_FIELDS, # Computed by the database
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'user_added_detail', 'created_at', 'updated_at', 'user_added']
+        read_only_fields = ['id', 'user_added_detail', 'created_at', 'updated_at', 'user_added', *DENSITY_FIELDS]
+        # Scans may contain spaces / dashes, normalized by validate_barcode(); uniqueness is checked in validate()
+        extra_kwargs = {'barcode': {'max_length': 32, 'validators': []}}
+        expandable_fields = {'user_added_detail': 'user_added'}
+    def validate_barcode(self, value):
+        if not value:
+            return None
+        try:
+            value = normalize_gtin(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+    def validate(self, attrs):
+        # Barcodes are unique among public foods and among each user's private foods (Food.Meta.constraints)
+        barcode = attrs.get('barcode', self.instance.barcode if self.instance else None)
+        if not barcode or not ({'barcode', 'is_public'} & set(attrs)):
+            return attrs
+        request = self.context.get('request')
+        if self.instance is not None:
+            is_public, owner = attrs.get('is_public', self.instance.is_public), self.instance.user_added_id
+        else:
+            # FoodViewSet.perform_create only keeps is_public for staff
+            is_public = bool(attrs.get('is_public') and request and request.user.is_staff)
+            owner = request.user.pk if request and request.user.is_authenticated else None
+        duplicates = Food.objects.filter(barcode=barcode, **({'is_public': True} if is_public else {'is_public': False, 'user_added': owner}))
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError({'barcode': ["A food with this barcode already exists."]})
+        return attrs
+
     def create(self, validated_data):
         request = self.context.get('request')
         user = request.user if request else None
@@ -27,87 +195,220 @@ class FoodSerializer(serializers.ModelSerializer):
             validated_data['user_added'] = None
         return super().create(validated_data)
 
-class MealItemSerializer(serializers.ModelSerializer):
+class ValuesSerializer:
+    """
+    Read-only fast path of a flat ModelSerializer (one level of nested serializers over foreign keys):
+    the field list is resolved once from a bound serializer (so ?fields= / ?expand= apply), then every
+    `.values()` row is turned into the same dict the serializer would build, without per-row field
+    lookups or serializer instances.
+    """
+    # Fields whose to_representation() is a plain conversion of the database value
+    CONVERTERS = {
+        serializers.IntegerField: int,
+        serializers.FloatField: float,
+        serializers.BooleanField: bool,
+        serializers.CharField: None, # str already
+        serializers.EmailField: None,
+    }
+
+    def __init__(self, serializer):
+        self.columns = []
+        self.entries = self.build_entries(serializer)
+        if getattr(serializer, 'is_sparse', lambda: False)():
+            # ExpandableFieldsMixin returns the flat id of an unexpanded nested field
+            fields = serializer.fields
+            for name, flat_key in getattr(serializer.Meta, 'expandable_fields', {}).items():
+                if flat_key and name not in fields and flat_key not in fields and serializer.is_wanted(flat_key):
+                    self.entries.append((flat_key, self.add_column(flat_key), None, None))
+
+    def add_column(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+        return column
+
+    def build_entries(self, serializer, prefix=''):
+        """
+        [(key, column, converter or None, nested entries or None)] in the serializer's field order.
+        """
+        entries = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or getattr(field, 'many', False):
+                raise TypeError(f"{name}: only model fields and foreign key serializers are supported.")
+            column = prefix + '__'.join(field.source_attrs)
+            if isinstance(field, serializers.BaseSerializer):
+                # None when the foreign key is empty, else the nested dict
+                entries.append((name, self.add_column(column), None, self.build_entries(field, column + '__')))
+            elif isinstance(field, serializers.ChoiceField):
+                choices = field.choice_strings_to_values
+                entries.append((name, self.add_column(column), lambda value, choices=choices: choices.get(str(value), value), None))
+            elif type(field) is serializers.DateTimeField:
+                entries.append((name, self.add_column(column), self.datetime_converter(field), None))
+            elif type(field) in self.CONVERTERS:
+                entries.append((name, self.add_column(column), self.CONVERTERS[type(field)], None))
+            elif type(field) is serializers.ModelField:
+                entries.append((name, self.add_column(column), self.model_field_converter(field), None))
+            else:
+                entries.append((name, self.add_column(column), field.to_representation, None))
+        return entries
+
+    @staticmethod
+    def datetime_converter(field):
+        # DateTimeField.to_representation() looks the current time zone up on every call; resolve it once
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+            return field.to_representation
+
+        def convert(value):
+            if not value or timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+
+    @staticmethod
+    def model_field_converter(field):
+        # Model fields DRF has no mapping for (e.g. GeneratedField): ModelField.to_representation() returns
+        # numbers, dates... unchanged and anything else through value_to_string() of an instance
+        model_field = field.model_field
+
+        def convert(value):
+            if is_protected_type(value):
+                return value
+            instance = model_field.model()
+            instance.__dict__[model_field.attname] = value
+            return model_field.value_to_string(instance)
+        return convert
+
+    def represent(self, row, entries):
+        item = {}
+        for key, column, convert, nested in entries:
+            value = row[column]
+            if value is None:
+                item[key] = None
+            elif nested is not None:
+                item[key] = self.represent(row, nested)
+            else:
+                item[key] = value if convert is None else convert(value)
+        return item
+
+    def to_representation(self, rows):
+        entries = self.entries
+        return [self.represent(row, entries) for row in rows]
+
+
+class MealItemSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     food_detail = FoodSerializer(source='food', read_only=True)
-    food = serializers.PrimaryKeyRelatedField(queryset=Food.objects.all(), write_only=True)
+    food = PreloadedPrimaryKeyRelatedField(queryset=Food.objects.all(), write_only=True)
 
     class Meta:
         model = MealItem
+        list_serializer_class = BulkListSerializer
         fields = [ 'id', 'meal', 'food', 'food_detail', 'number_of_servings',
             'calculated_calories', 'calculated_protein', 'calculated_carbohydrates', 'calculated_fat']
         read_only_fields = ['id', 'meal', 'food_detail', 'calculated_calories', 'calculated_protein', 'calculated_carbohydrates', 'calculated_fat']    
+        expandable_fields = {'food_detail': 'food'}
 
-class MealSerializer(serializers.ModelSerializer):
+class MealSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
 
     user_detail = CustomSerializer(source='user', read_only = True)
     meal_items = MealItemSerializer(many=True, required=False, write_only=True)
 
     class Meta:
         model = Meal 
-        fields = ['id', 'user', 'user_detail', 'name', 'meal_time_category', 'description', 'is_template',
+        fields = ['id', 'user', 'user_detail', 'name', 'meal_time_category', 'description', 'is_template', 'is_planned',
             'meal_items', 
             'total_calories', 'total_protein', 'total_carbohydrates', 'total_fat',
             'created_at', 'updated_at']
         read_only_fields = [
-            'id', 'user', 'user_detail', 'created_at', 'updated_at',
+            'id', 'user', 'user_detail', 'is_planned', 'created_at', 'updated_at',
             'total_calories', 'total_protein', 'total_carbohydrates', 'total_fat'
         ]
+        expandable_fields = {'user_detail': 'user', 'meal_items': None}
     def _handle_meal_items(self, meal_instance, meal_items_payload):
+        """
+        Apply the payload as a set-based diff: one filtered delete, one bulk_update and one bulk_create.
+        Items are matched on their food, which is unique per meal, so a food listed twice adds up its
+        servings instead of breaking the (meal, food) constraint. Call inside a transaction.
+        """
         if meal_items_payload is not None:
-            existing_items = {item.id: item for item in meal_instance.mealitem_set.all()}
-            # print(meal_items_payload)
-            incoming_ids = set()
+            servings_by_food = {}
             for item_data in meal_items_payload:
-                item_id = item_data.get('id', None)
                 food_instance = item_data.get('food')
                 number_of_servings = item_data.get('number_of_servings')
-                if item_id is not None and item_id in existing_items:
-                    meal_item = existing_items[item_id]
-                    meal_item.food = food_instance
+                if food_instance and number_of_servings is not None:
+                    servings_by_food[food_instance.pk] = servings_by_food.get(food_instance.pk, 0) + number_of_servings
+
+            existing_items = {item.food_id: item for item in meal_instance.mealitem_set.all()}
+            items_to_update, items_to_create = [], []
+            for food_id, number_of_servings in servings_by_food.items():
+                meal_item = existing_items.pop(food_id, None)
+                if meal_item is None:
+                    items_to_create.append(MealItem(meal=meal_instance, food_id=food_id, number_of_servings=number_of_servings))
+                elif meal_item.number_of_servings != number_of_servings:
                     meal_item.number_of_servings = number_of_servings
-                    meal_item.save()
-                    incoming_ids.add(item_id)
-                elif food_instance and number_of_servings is not None:
-                    # create new Item
-                    new_item = MealItem.objects.create(meal=meal_instance, food= food_instance, number_of_servings=number_of_servings)
-                    incoming_ids.add(new_item.id)
-            for item_id in existing_items:
-                if item_id not in incoming_ids:
-                    existing_items[item_id].delete()
+                    items_to_update.append(meal_item)
+
+            with meal_totals_deferred():
+                if existing_items: # Whatever is left was not in the payload
+                    MealItem.objects.filter(pk__in=[item.pk for item in existing_items.values()]).delete()
+                if items_to_update:
+                    MealItem.objects.bulk_update(items_to_update, ['number_of_servings'])
+                if items_to_create:
+                    # A concurrent request may have added the same food meanwhile: the payload's servings win
+                    MealItem.objects.bulk_create(
+                        items_to_create, update_conflicts=True, unique_fields=['meal', 'food'], update_fields=['number_of_servings'],
+                    )
+                # bulk_update / bulk_create send no signals (the delete above does)
+                track_changes(SyncModel.MEAL_ITEM, [(item.pk, meal_instance.pk) for item in items_to_update + items_to_create])
+            meal_instance.refresh_totals()
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['meal_items'] = MealItemSerializer(instance.mealitem_set.all(), many=True).data 
+        if not (self.is_expanded('meal_items') and self.is_wanted('meal_items')):
+            return representation
+        if 'mealitem_set' in getattr(instance, '_prefetched_objects_cache', {}):
+            meal_items = instance.mealitem_set.all()
+        else:
+            meal_items = instance.mealitem_set.select_related('food__user_added')
+        representation['meal_items'] = MealItemSerializer(meal_items, many=True, context={**self.context, 'nested': True}).data 
         return representation
         
     def create(self, validated_data):
         meal_items_payload = validated_data.pop('meal_items', [])
-        meal = Meal.objects.create(**validated_data)
-        self._handle_meal_items(meal, meal_items_payload)
+        with transaction.atomic(), batched_changes():
+            meal = Meal.objects.create(**validated_data)
+            self._handle_meal_items(meal, meal_items_payload)
         return meal 
     
     def update(self, instance, validated_data):
         meal_items_payload = validated_data.pop('meal_items', None)
 
-        instance = super().update(instance, validated_data)
+        with transaction.atomic(), batched_changes():
+            instance = super().update(instance, validated_data)
 
-        if meal_items_payload is not None:
-            self._handle_meal_items(instance, meal_items_payload)
+            if meal_items_payload is not None:
+                self._handle_meal_items(instance, meal_items_payload)
         return instance
 
-class ScheduledMealSerializer(serializers.ModelSerializer):
+class ScheduledMealSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     meal_detail = MealSerializer(source='meal', read_only=True)    
-    meal = serializers.PrimaryKeyRelatedField(queryset=Meal.objects.all(), write_only=True)
+    meal = PreloadedPrimaryKeyRelatedField(queryset=Meal.objects.all(), write_only=True)
 
     class Meta:
         model = ScheduledMeal
+        list_serializer_class = BulkListSerializer
         fields = ['id', 'meal_plan', 'meal', 'meal_detail', 'day_of_plan']
 
         read_only_fields = ['id', 'meal_plan', 'meal_detail']
+        expandable_fields = {'meal_detail': 'meal'}
 
 
-class MealPlanSerializer(serializers.ModelSerializer):
+class MealPlanSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     user_detail = CustomSerializer(source='user', read_only=True)
-    scheduled_meals = ScheduledMealSerializer(many=True, read_only=True, required=False)
+    scheduled_meals = ScheduledMealSerializer(source='scheduledmeal_set', many=True, read_only=True, required=False) # Only with ?expand=scheduled_meals
     is_template = serializers.BooleanField(required=False, default=False)
     scheduled_meals_payload = ScheduledMealSerializer(many=True, write_only=True, required=False)
 
@@ -122,41 +423,147 @@ class MealPlanSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'user', 'user_detail', 'scheduled_meals', 'created_at', 'updated_at']
+        expandable_fields = {'user_detail': 'user', 'scheduled_meals': None}
+        expand_only_fields = ('scheduled_meals',)
 
     def _handle_scheduled_meals(self, meal_plan_instance, scheduled_meals_payload):
+        """
+        Apply the payload as a set-based diff keyed on (meal, day_of_plan), the plan's unique key:
+        duplicates are dropped up front, then one delete by id set and one bulk_create.
+        Call inside a transaction.
+        """
         if scheduled_meals_payload is not None:
-            existing_meals = {sm.id:sm for sm in meal_plan_instance.scheduledmeal_set.all()}
-            incoming_item_ids = set()
-
+            incoming_keys = {}
             for item_data in scheduled_meals_payload:
-                item_id = item_data.get('id', None)
-                if item_id and item_id in existing_meals:
-                    scheduled_meal = existing_meals[item_id]
-                    scheduled_meal.day_of_plan = item_data.get('day_of_plan', scheduled_meal.day_of_plan)
-                    scheduled_meal.save()
-                    incoming_item_ids.add(item_id)
-                else:
-                    scheduled_meal = ScheduledMeal.objects.create(meal_plan= meal_plan_instance, meal=item_data['meal'], day_of_plan=item_data['day_of_plan'] )
-                    incoming_item_ids.add(scheduled_meal.id)
-            
-            for meal_id, meal_instance in existing_meals.items():
-                if meal_id not in incoming_item_ids:
-                    meal_instance.delete()
+                key = (item_data['meal'].pk, item_data['day_of_plan'])
+                incoming_keys.setdefault(key, item_data)
+
+            existing_meals = {
+                (meal_id, day_of_plan): sm_id
+                for sm_id, meal_id, day_of_plan in meal_plan_instance.scheduledmeal_set.order_by().values_list('id', 'meal_id', 'day_of_plan')
+            }
+            ids_to_delete = [sm_id for key, sm_id in existing_meals.items() if key not in incoming_keys]
+            meals_to_create = [
+                ScheduledMeal(meal_plan=meal_plan_instance, meal=item_data['meal'], day_of_plan=item_data['day_of_plan'])
+                for key, item_data in incoming_keys.items() if key not in existing_meals
+            ]
+
+            if ids_to_delete:
+                # One round of side effects for the plan instead of the per-row post_delete receivers
+                with schedule_signals_deferred():
+                    ScheduledMeal.objects.filter(pk__in=ids_to_delete).delete()
+                track_changes(SyncModel.SCHEDULED_MEAL, [(sm_id, meal_plan_instance.pk) for sm_id in ids_to_delete], deleted=True)
+                if meal_plan_instance.is_template:
+                    bump_template_cache_version()
+            if meals_to_create:
+                ScheduledMeal.objects.bulk_create(meals_to_create)
+                # bulk_create sends no signals
+                sync_plan_calendar([meal_plan_instance.pk])
+                track_changes(SyncModel.SCHEDULED_MEAL, [(scheduled.pk, meal_plan_instance.pk) for scheduled in meals_to_create])
 
     def create(self, validated_data):
         scheduled_meals_payload = validated_data.pop('scheduled_meals_payload', [])
 
-        meal_plan = MealPlan.objects.create(**validated_data)
+        with transaction.atomic(), batched_changes():
+            meal_plan = MealPlan.objects.create(**validated_data)
 
-        self._handle_scheduled_meals(meal_plan, scheduled_meals_payload)
+            self._handle_scheduled_meals(meal_plan, scheduled_meals_payload)
 
         return meal_plan
     def update(self, instance, validated_data):
 
         scheduled_meals_payload = validated_data.pop('scheduled_meals_payload', None)
 
-        instance = super().update(instance, validated_data)
+        with transaction.atomic(), batched_changes():
+            instance = super().update(instance, validated_data)
 
+            if scheduled_meals_payload is not None:
+                self._handle_scheduled_meals(instance, scheduled_meals_payload)
         if scheduled_meals_payload is not None:
-            self._handle_scheduled_meals(instance, scheduled_meals_payload)
+            # Annotated daily totals from the view queryset are stale now
+            instance.refresh_daily_totals()
         return instance
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        # daily_calories, daily_protein, ... (computed in SQL by MealPlan.objects.with_daily_totals())
+        representation.update({key: value for key, value in instance.get_daily_totals().items() if self.is_wanted(key)})
+        return representation
+
+
+class PlanCalendarEntrySerializer(serializers.ModelSerializer):
+    meal_plan_name = serializers.CharField(source='meal_plan.name', read_only=True)
+    day_of_plan = serializers.IntegerField(source='scheduled_meal.day_of_plan', read_only=True)
+    meal = MealSerializer(source='scheduled_meal.meal', read_only=True)
+
+    class Meta:
+        model = PlanCalendarEntry
+        fields = ['date', 'meal_plan', 'meal_plan_name', 'scheduled_meal', 'day_of_plan', 'meal']
+        read_only_fields = fields
+
+
+class MealPlanCopyJobSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = MealPlanCopyJob
+        fields = ['id', 'source_plan', 'result_plan', 'deep', 'status', 'error', 'started_at', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class MealPlanGenerateSerializer(serializers.Serializer):
+    """
+    Input of POST /meal-plans/generate/. Only the calorie target is required; missing macro targets
+    are derived from the goal.
+    """
+    name = serializers.CharField(max_length=150, required=False)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    goal = serializers.ChoiceField(choices=MealPlanGoal.choices, default=MealPlanGoal.GENERAL_HEALTH)
+    duration_days = serializers.IntegerField(min_value=1, max_value=366, default=7)
+    start_date = serializers.DateField(required=False, allow_null=True)
+    target_daily_calories = serializers.FloatField(min_value=500, max_value=10000)
+    target_daily_protein = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    target_daily_carbohydrates = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    target_daily_fat = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    meal_slots = serializers.ListField(
+        child=serializers.ChoiceField(choices=MealTimeCategory.choices), min_length=1, required=False,
+    )
+    tolerance = serializers.FloatField(min_value=0.01, max_value=0.5, default=0.1)
+    seed = serializers.IntegerField(required=False, allow_null=True)
+
+
+class MealBatchSerializer(serializers.Serializer):
+    """
+    Input of POST /meals/batch/: `meals`, a list of MealSerializer payloads (with their meal_items).
+    validate_entries() validates every entry on its own, loading the foods of the whole batch with
+    one query, and returns the valid ones and the errors of the others.
+    """
+    max_meals = 500
+
+    # Entries are checked one by one in validate_entries(), so one malformed entry fails alone
+    meals = serializers.ListField(min_length=1, max_length=max_meals)
+
+    def get_food_ids(self, entries):
+        food_ids = set()
+        for entry in entries:
+            meal_items = entry.get('meal_items') if isinstance(entry, dict) else None
+            for item in meal_items if isinstance(meal_items, list) else []:
+                try:
+                    food_ids.add(int(item.get('food')))
+                except (AttributeError, TypeError, ValueError):
+                    continue  # Reported by the entry's own validation
+        return food_ids
+
+    def validate_entries(self):
+        """
+        ([(index, validated data)], {index: errors}) of the entries in `meals`.
+        """
+        entries = self.validated_data['meals']
+        context = {**self.context, 'preloaded': {'food': Food.objects.in_bulk(self.get_food_ids(entries))}}
+        valid, errors = [], {}
+        for index, entry in enumerate(entries):
+            serializer = MealSerializer(data=entry, context=context)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors[index] = serializer.errors
+        return valid, errors
@@ -0,0 +1,197 @@
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import bump_template_cache_version
+from .managers import NUTRIENT_FIELDS
+from .models import CopyJobStatus, Meal, MealItem, MealPlan, MealPlanCopyJob, ScheduledMeal, SyncModel
+from .signals import meal_in_template
+from .summaries import refresh_daily_summaries
+from .sync import batched_changes, track_changes
+
+
+logger = logging.getLogger(__name__)
+
+
+def async_copy_threshold_days():
+    """Deep copies of plans longer than this run as a background MealPlanCopyJob."""
+    return getattr(settings, 'MEAL_PLAN_ASYNC_COPY_DAYS', 60)
+
+
+def copy_job_timeout():
+    """Seconds after which a job still pending / running is reported as failed (its thread died)."""
+    return getattr(settings, 'MEAL_PLAN_COPY_JOB_TIMEOUT', 15 * 60)
+
+
+def copy_meal_plan(original_plan, user, deep=False):
+    """
+    Copies `original_plan` (with its targets and schedule) for `user`.
+    deep=False: the copied ScheduledMeals point at the original meals.
+    deep=True: every referenced Meal and its MealItems are cloned for `user` too.
+    Uses a fixed number of queries (bulk_create per table) whatever the plan length.
+    """
+    with transaction.atomic(), batched_changes():
+        new_plan = MealPlan.objects.create(
+            user=user,
+            name=f"{original_plan.name} (Copy)",
+            description=original_plan.description,
+            duration_days=original_plan.duration_days,
+            is_active=True,
+            is_template=False,
+            start_date=None,
+            goal=original_plan.goal,
+            target_daily_calories=original_plan.target_daily_calories,
+            target_daily_protein=original_plan.target_daily_protein,
+            target_daily_carbohydrates=original_plan.target_daily_carbohydrates,
+            target_daily_fat=original_plan.target_daily_fat,
+        )
+
+        schedule = list(original_plan.scheduledmeal_set.order_by().values_list('meal_id', 'day_of_plan'))
+        meal_map = {meal_id: meal_id for meal_id, _ in schedule}  # original meal id -> meal id to schedule
+
+        if deep and meal_map:
+            original_meals = list(Meal.objects.filter(pk__in=meal_map).order_by('pk'))
+            new_meals = Meal.objects.bulk_create([
+                Meal(
+                    user=user,
+                    name=meal.name,
+                    meal_time_category=meal.meal_time_category,
+                    description=meal.description,
+                    is_template=False,
+                    is_planned=True, # Not intake: left out of the daily summaries
+                    # The items are cloned as-is, so the stored totals stay valid
+                    **{field: getattr(meal, field) for field in Meal.TOTAL_FIELDS},
+                )
+                for meal in original_meals
+            ])
+            meal_map = {original.pk: new.pk for original, new in zip(original_meals, new_meals)}
+            track_changes(SyncModel.MEAL, [(meal.pk, user.pk) for meal in new_meals])
+
+            new_items = MealItem.objects.bulk_create([
+                MealItem(meal_id=meal_map[meal_id], food_id=food_id, number_of_servings=number_of_servings)
+                for meal_id, food_id, number_of_servings in MealItem.objects.filter(meal_id__in=meal_map)
+                .values_list('meal_id', 'food_id', 'number_of_servings')
+            ])
+            track_changes(SyncModel.MEAL_ITEM, [(item.pk, item.meal_id) for item in new_items])
+
+        new_scheduled_meals = ScheduledMeal.objects.bulk_create([
+            ScheduledMeal(meal_plan=new_plan, meal_id=meal_map[meal_id], day_of_plan=day_of_plan)
+            for meal_id, day_of_plan in schedule
+        ])
+        track_changes(SyncModel.SCHEDULED_MEAL, [(scheduled.pk, new_plan.pk) for scheduled in new_scheduled_meals])
+    return new_plan
+
+
+def create_meals(user, meals_data):
+    """
+    Saves validated MealSerializer data (with its `meal_items`) as meals of `user`: one bulk insert
+    for the meals, one for their items and one UPDATE for the totals (and daily summaries), whatever
+    the number of meals. Returns the meals in the order given.
+    """
+    with transaction.atomic(), batched_changes():
+        meals = Meal.objects.bulk_create([
+            Meal(user=user, **{key: value for key, value in data.items() if key != 'meal_items'})
+            for data in meals_data
+        ])
+        meal_items = []
+        for meal, data in zip(meals, meals_data):
+            # A food listed twice adds up its servings, as in MealSerializer
+            servings_by_food = {}
+            for item_data in data.get('meal_items') or []:
+                food_instance = item_data.get('food')
+                number_of_servings = item_data.get('number_of_servings')
+                if food_instance and number_of_servings is not None:
+                    servings_by_food[food_instance.pk] = servings_by_food.get(food_instance.pk, 0) + number_of_servings
+            meal_items.extend(
+                MealItem(meal=meal, food_id=food_id, number_of_servings=number_of_servings)
+                for food_id, number_of_servings in servings_by_food.items()
+            )
+        MealItem.objects.bulk_create(meal_items)
+        track_changes(SyncModel.MEAL_ITEM, [(item.pk, item.meal_id) for item in meal_items])
+        Meal.objects.filter(pk__in=[meal.pk for meal in meals]).refresh_totals()
+    return meals
+
+
+def add_meal_servings(meal, food, number_of_servings):
+    """
+    Adds `number_of_servings` of `food` to `meal` (a new item, or more servings of the existing one)
+    with MealItem.objects.add_servings(), then adds the food's nutrients to the meal totals with
+    F() increments. Both are single statements whose increments commute, so concurrent adds from
+    several devices are all kept. Returns the item id.
+    """
+    with transaction.atomic(), batched_changes():
+        item_id, _ = MealItem.objects.add_servings(meal.pk, food.pk, number_of_servings)
+        # Missing nutrients count as 0, like the stored totals
+        Meal.objects.filter(pk=meal.pk).update(updated_at=timezone.now(), **{
+            f'total_{nutrient}': F(f'total_{nutrient}') + (getattr(food, nutrient) or 0) * number_of_servings
+            for nutrient in NUTRIENT_FIELDS
+        })
+        refresh_daily_summaries([(meal.user_id, meal.created_at)])
+        track_changes(SyncModel.MEAL, [(meal.pk, meal.user_id)])
+        track_changes(SyncModel.MEAL_ITEM, [(item_id, meal.pk)])
+        # The raw upsert sends no MealItem signals
+        if meal.is_template or meal_in_template(meal.pk):
+            bump_template_cache_version()
+    return item_id
+
+
+def run_meal_plan_copy_job(job_id):
+    """
+    Runs a MealPlanCopyJob and records the outcome on it.
+    """
+    job = MealPlanCopyJob.objects.select_related('source_plan', 'user').get(pk=job_id)
+    job.status = CopyJobStatus.RUNNING
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at', 'updated_at'])
+    try:
+        if job.source_plan is None:
+            raise MealPlan.DoesNotExist("The source meal plan was deleted.")
+        job.result_plan = copy_meal_plan(job.source_plan, job.user, deep=job.deep)
+        job.status = CopyJobStatus.SUCCEEDED
+    except Exception as e:
+        logger.exception("Error copying meal plan (job %s)", job.pk)
+        job.status = CopyJobStatus.FAILED
+        job.error = str(e)
+    job.save(update_fields=['status', 'result_plan', 'error', 'updated_at'])
+    return job
+
+
+def expire_stale_copy_job(job):
+    """
+    Mark `job` as failed when it has been pending or running for longer than copy_job_timeout():
+    its daemon thread was lost, e.g. to a worker restart. Returns the job.
+    """
+    if job.status not in (CopyJobStatus.PENDING, CopyJobStatus.RUNNING):
+        return job
+    if (job.started_at or job.created_at) > timezone.now() - datetime.timedelta(seconds=copy_job_timeout()):
+        return job
+    error = "The copy was interrupted. Please try again."
+    # Only if it is still in the same state (the thread may have finished meanwhile)
+    if MealPlanCopyJob.objects.filter(pk=job.pk, status=job.status, started_at=job.started_at).update(
+        status=CopyJobStatus.FAILED, error=error, updated_at=timezone.now(),
+    ):
+        job.status, job.error = CopyJobStatus.FAILED, error
+    else:
+        job.refresh_from_db()
+    return job
+
+
+def start_meal_plan_copy_job(original_plan, user, deep=False):
+    """
+    Creates a MealPlanCopyJob and runs it in a background thread once the current transaction commits.
+    """
+    job = MealPlanCopyJob.objects.create(user=user, source_plan=original_plan, deep=deep)
+
+    def run():
+        try:
+            run_meal_plan_copy_job(job.pk)
+        finally:
+            connections.close_all() # The thread got its own connections
+
+    transaction.on_commit(lambda: threading.Thread(target=run, daemon=True).start())
+    return job
@@ -0,0 +1,254 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .managers import NUTRIENT_FIELDS
+from .models import Food, Meal, MealItem, MealPlan, ScheduledMeal, SyncModel
+from .autocomplete import food_prefix_index
+from .barcodes import food_barcode_cache, normalize_gtin
+from .nutrition import nutrient_matrix
+from .cache import bump_template_cache_version
+from .summaries import rebuild_daily_summaries, refresh_daily_summaries
+from .plan_calendar import sync_plan_calendar, sync_scheduled_meal_entry
+from .sync import track_changes, track_deletion
+from users.models import CustomUser, UsersProfile
+
+
+# Keep the stored Meal.total_* columns in sync with their items.
+# Bulk operations (bulk_create / bulk_update / queryset.update) skip these signals,
+# so code using them must call Meal.objects.filter(...).refresh_totals() itself.
+
+_state = threading.local()
+
+
+def deleted_with(origin, models):
+    # The instance (or queryset) whose delete() cascaded here is one of `models`
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
+
+
+@contextmanager
+def meal_totals_deferred():
+    """
+    Skip the per-item totals refresh inside the block (e.g. a filtered MealItem delete, which still
+    sends post_delete for every row). The caller refreshes the affected meals once afterwards.
+    """
+    previous = getattr(_state, 'deferred', False)
+    _state.deferred = True
+    try:
+        yield
+    finally:
+        _state.deferred = previous
+
+
+@contextmanager
+def schedule_signals_deferred():
+    """
+    Skip the per-row ScheduledMeal receivers (template cache, plan calendar, sync log) inside the block,
+    e.g. a filtered delete of a plan's schedule. The caller bumps the template version, syncs the
+    calendar and tracks the rows once afterwards.
+    """
+    previous = getattr(_state, 'schedule_deferred', False)
+    _state.schedule_deferred = True
+    try:
+        yield
+    finally:
+        _state.schedule_deferred = previous
+
+
+@receiver(post_save, sender=MealItem)
+@receiver(post_delete, sender=MealItem)
+def refresh_meal_totals_on_item_change(sender, instance, **kwargs):
+    if getattr(_state, 'deferred', False):
+        return
+    if kwargs['signal'] is post_delete and deleted_with(kwargs.get('origin'), (CustomUser, Meal)):
+        return  # Cascade from deleting the meal itself, or its user (whose summaries are already gone)
+    Meal.objects.filter(pk=instance.meal_id).refresh_totals()
+
+
+@receiver(pre_save, sender=Food)
+def detect_food_changes(sender, instance, update_fields=None, **kwargs):
+    # What the post_save receivers below need to know about the stored row
+    if instance._state.adding:
+        instance._nutrients_changed, instance._was_public = False, False
+        return
+    if update_fields is not None and not set(update_fields) & {*NUTRIENT_FIELDS, 'is_public'}:
+        instance._nutrients_changed, instance._was_public = False, instance.is_public
+        return
+    previous = Food.objects.filter(pk=instance.pk).values_list('is_public', *NUTRIENT_FIELDS).first()
+    if previous is None:
+        instance._nutrients_changed, instance._was_public = True, False
+        return
+    instance._was_public = previous[0]
+    instance._nutrients_changed = previous[1:] != tuple(getattr(instance, nutrient) for nutrient in NUTRIENT_FIELDS)
+
+
+@receiver(post_save, sender=Food)
+def refresh_meal_totals_on_food_change(sender, instance, created, **kwargs):
+    if created:
+        return  # A new food is not part of any meal yet
+    if not getattr(instance, '_nutrients_changed', True):
+        return  # Name / description / category edits leave the totals as they are
+    Meal.objects.filter(mealitem__food=instance).refresh_totals()
+
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+def invalidate_food_prefix_index(sender, instance, **kwargs):
+    # Rebuilt lazily on the next autocomplete request of this worker; private foods are not indexed
+    if instance.is_public or getattr(instance, '_was_public', True):
+        food_prefix_index.invalidate()
+
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+def invalidate_food_barcode_cache(sender, instance, **kwargs):
+    # The food's old barcode entry and a negative entry of its new barcode
+    try:
+        barcode = normalize_gtin(instance.barcode) if instance.barcode else None
+    except ValueError:
+        barcode = None
+    food_barcode_cache.invalidate(instance.pk, barcode)
+
+
+@receiver(post_delete, sender=Food)
+def discard_deleted_food(sender, instance, **kwargs):
+    # Saves reach the nutrient matrix through updated_at; deletes have to be reported
+    food_id = instance.pk
+    transaction.on_commit(lambda: nutrient_matrix.discard(food_id))
+
+
+# Invalidate the cached /meal-plans/templates/ pages when template content changes.
+# Bulk paths (import_foods) bump the version themselves.
+
+def meal_in_template(meal_id):
+    return ScheduledMeal.objects.filter(meal_id=meal_id, meal_plan__is_template=True).exists()
+
+
+@receiver(pre_save, sender=MealPlan)
+def invalidate_templates_on_unmark(sender, instance, **kwargs):
+    # A plan that stops being a template has to leave the cached pages too
+    if instance.pk and not instance.is_template and MealPlan.objects.filter(pk=instance.pk, is_template=True).exists():
+        bump_template_cache_version()
+
+
+@receiver(post_save, sender=MealPlan)
+@receiver(post_delete, sender=MealPlan)
+def invalidate_templates_on_plan_change(sender, instance, **kwargs):
+    if instance.is_template:
+        bump_template_cache_version()
+
+
+@receiver(post_save, sender=ScheduledMeal)
+@receiver(post_delete, sender=ScheduledMeal)
+def invalidate_templates_on_schedule_change(sender, instance, **kwargs):
+    if getattr(_state, 'schedule_deferred', False):
+        return
+    if MealPlan.objects.filter(pk=instance.meal_plan_id, is_template=True).exists():
+        bump_template_cache_version()
+
+
+@receiver(post_save, sender=Meal)
+@receiver(post_delete, sender=Meal)
+def invalidate_templates_on_meal_change(sender, instance, **kwargs):
+    if instance.is_template or meal_in_template(instance.pk):
+        bump_template_cache_version()
+
+
+@receiver(post_save, sender=MealItem)
+@receiver(post_delete, sender=MealItem)
+def invalidate_templates_on_item_change(sender, instance, **kwargs):
+    if getattr(_state, 'deferred', False):
+        return  # Bulk item diff: the meal save around it bumps the version
+    if meal_in_template(instance.meal_id):
+        bump_template_cache_version()
+
+
+@receiver(post_save, sender=Food)
+def invalidate_templates_on_food_change(sender, instance, created, **kwargs):
+    if created:
+        return  # Deletes cascade to MealItem, whose receiver covers them
+    if ScheduledMeal.objects.filter(meal__mealitem__food=instance, meal_plan__is_template=True).exists():
+        bump_template_cache_version()
+
+
+# Daily nutrition summaries: total changes go through MealQuerySet.refresh_totals(); these cover
+# meals created, deleted or (un)marked as template, and profile time zone changes.
+
+@receiver(post_save, sender=Meal)
+@receiver(post_delete, sender=Meal)
+def refresh_daily_summary_on_meal_change(sender, instance, **kwargs):
+    if deleted_with(kwargs.get('origin'), (CustomUser,)):
+        return  # The user's summaries are deleted with them
+    refresh_daily_summaries([(instance.user_id, instance.created_at)])
+
+
+@receiver(pre_save, sender=UsersProfile)
+def detect_timezone_change(sender, instance, **kwargs):
+    if instance.pk:
+        previous = UsersProfile.objects.filter(pk=instance.pk).values_list('timezone', flat=True).first()
+        instance._timezone_changed = (previous or None) != (instance.timezone or None)
+
+
+@receiver(post_save, sender=UsersProfile)
+def rebuild_daily_summaries_on_timezone_change(sender, instance, **kwargs):
+    if getattr(instance, '_timezone_changed', False):
+        # Every meal falls into a new local day
+        rebuild_daily_summaries([instance.user_id])
+        instance._timezone_changed = False
+
+
+# Plan calendar: starting, editing or cancelling a plan (is_active, start_date, is_template) rebuilds
+# the plan's entries, a single scheduled meal save rewrites its own entry; deletes cascade.
+
+@receiver(post_save, sender=MealPlan)
+def sync_plan_calendar_on_plan_change(sender, instance, **kwargs):
+    sync_plan_calendar([instance.pk])
+
+
+@receiver(post_save, sender=ScheduledMeal)
+def sync_plan_calendar_on_schedule_change(sender, instance, **kwargs):
+    if getattr(_state, 'schedule_deferred', False):
+        return
+    sync_scheduled_meal_entry(instance)
+
+
+# Delta sync change log (meal.sync): single saves and deletes. A deleted meal / plan writes the
+# tombstones of its items / scheduled meals too (pre_delete, while they can still be listed).
+# Bulk paths track their rows themselves.
+
+@receiver(post_save, sender=Meal)
+@receiver(post_save, sender=MealPlan)
+def track_sync_change(sender, instance, **kwargs):
+    label = SyncModel.MEAL if sender is Meal else SyncModel.MEAL_PLAN
+    track_changes(label, [(instance.pk, instance.user_id)])
+
+
+@receiver(pre_delete, sender=Meal)
+@receiver(pre_delete, sender=MealPlan)
+def track_sync_deletion(sender, instance, **kwargs):
+    if deleted_with(kwargs.get('origin'), (CustomUser,)):
+        return  # The user's change log is deleted with them
+    label = SyncModel.MEAL if sender is Meal else SyncModel.MEAL_PLAN
+    track_deletion(label, instance.pk, instance.user_id)
+
+
+@receiver(post_save, sender=MealItem)
+@receiver(post_delete, sender=MealItem)
+def track_sync_item_change(sender, instance, **kwargs):
+    deleted = kwargs['signal'] is post_delete
+    if not (deleted and deleted_with(kwargs.get('origin'), (CustomUser, Meal))):
+        track_changes(SyncModel.MEAL_ITEM, [(instance.pk, instance.meal_id)], deleted=deleted)
+
+
+@receiver(post_save, sender=ScheduledMeal)
+@receiver(post_delete, sender=ScheduledMeal)
+def track_sync_schedule_change(sender, instance, **kwargs):
+    deleted = kwargs['signal'] is post_delete
+    if getattr(_state, 'schedule_deferred', False):
+        return
+    if not (deleted and deleted_with(kwargs.get('origin'), (CustomUser, MealPlan))):
+        track_changes(SyncModel.SCHEDULED_MEAL, [(instance.pk, instance.meal_plan_id)], deleted=deleted)
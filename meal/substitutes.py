@@ -0,0 +1,119 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .managers import NUTRIENT_FIELDS
+from .nutrition import nutrient_matrix
+
+
+CALORIES, PROTEIN, CARBOHYDRATES, FAT = (NUTRIENT_FIELDS.index(name) for name in ('calories', 'protein', 'carbohydrates', 'fat'))
+
+# kcal: share of the energy from protein / carbohydrates / fat (the macros per 100 kcal, normalised to 0..1)
+# gram: protein / carbohydrates / fat per gram plus the energy density / 9 (all 0..1), foods served in grams only
+BASES = ('kcal', 'gram')
+
+# A tree with the rows it was built from and the catalog generation it reflects
+TreeState = namedtuple('TreeState', ['tree', 'rows', 'generation'])
+
+
+def macro_features(snapshot, basis, rows=None):
+    """
+    (features, valid) of the given matrix rows (all rows when None) in the `basis` space.
+    """
+    matrix = snapshot.matrix if rows is None else snapshot.matrix[rows]
+    calories = matrix[:, CALORIES]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if basis == 'kcal':
+            features = np.column_stack([matrix[:, PROTEIN] * 4, matrix[:, CARBOHYDRATES] * 4, matrix[:, FAT] * 9]) / calories[:, None]
+            valid = calories > 0
+        else:
+            grams = snapshot.grams if rows is None else snapshot.grams[rows]
+            features = np.column_stack([matrix[:, PROTEIN], matrix[:, CARBOHYDRATES], matrix[:, FAT], calories / 9]) / grams[:, None]
+            valid = grams > 0
+    return features, valid & np.isfinite(features).all(axis=1)
+
+
+class FoodSubstituteIndex:
+    """
+    Nearest public foods in normalised macro space ("what can I swap for X").
+
+    One KD-tree per (basis, food category or all) over the public foods of the nutrient matrix, built on
+    first use. Foods changed since a tree was built (their NutrientMatrix generation is newer) are
+    skipped in the tree results and compared directly instead, so edits are visible immediately; the
+    tree is rebuilt once the changed rows exceed `rebuild_ratio` of it.
+    """
+
+    def __init__(self, rebuild_ratio=0.05, min_rebuild=500):
+        self.rebuild_ratio = rebuild_ratio
+        self.min_rebuild = min_rebuild
+        self._lock = threading.Lock()
+        self._trees = {}
+
+    def eligible(self, snapshot, basis, category, rows=None):
+        features, valid = macro_features(snapshot, basis, rows)
+        public = snapshot.public if rows is None else snapshot.public[rows]
+        valid &= public
+        if category is not None:
+            valid &= (snapshot.categories if rows is None else snapshot.categories[rows]) == category
+        return features, valid
+
+    def get_tree(self, snapshot, basis, category):
+        key = (basis, category)
+        state = self._trees.get(key)
+        if state is not None:
+            changed = np.count_nonzero(snapshot.versions > state.generation)
+            if changed <= max(self.min_rebuild, self.rebuild_ratio * len(state.rows)):
+                return state
+        with self._lock:
+            state = self._trees.get(key)
+            if state is None or state.generation < snapshot.generation:
+                features, valid = self.eligible(snapshot, basis, category)
+                rows = np.flatnonzero(valid)
+                state = TreeState(cKDTree(features[rows]) if len(rows) else None, rows, snapshot.generation)
+                self._trees[key] = state
+        return state
+
+    def substitutes(self, food_id, k=10, basis='kcal', same_category=False):
+        """
+        [(food id, distance)] of the `k` nearest public foods to `food_id`, closest first.
+        Raises ValueError when the food has no position in this basis (no calories / not served in grams).
+        """
+        snapshot = nutrient_matrix.snapshot()
+        row = snapshot.index.get(food_id)
+        if row is None:
+            raise ValueError("Unknown food.")
+        point, valid = macro_features(snapshot, basis, [row])
+        if not valid[0]:
+            raise ValueError(
+                "This food has no calories." if basis == 'kcal' else "This food is not measured in grams."
+            )
+        point = point[0]
+        category = snapshot.categories[row] if same_category else None
+
+        state = self.get_tree(snapshot, basis, category)
+        changed = np.flatnonzero(snapshot.versions > state.generation)
+        candidates = {}
+        if state.tree is not None:
+            # Enough neighbours to still have k after dropping the food itself and the stale rows
+            count = min(k + 1 + len(changed), len(state.rows))
+            distances, positions = state.tree.query(point, k=count)
+            distances, positions = np.atleast_1d(distances), np.atleast_1d(positions)
+            stale = set(changed.tolist())
+            for distance, position in zip(distances.tolist(), positions.tolist()):
+                if position < len(state.rows) and state.rows[position] not in stale:
+                    candidates[int(state.rows[position])] = distance
+        if len(changed):
+            features, valid = self.eligible(snapshot, basis, category, changed)
+            distances = np.linalg.norm(features - point, axis=1)
+            for changed_row, distance, is_valid in zip(changed.tolist(), distances.tolist(), valid.tolist()):
+                if is_valid:
+                    candidates[changed_row] = distance
+        candidates.pop(row, None)
+
+        nearest = sorted(candidates.items(), key=lambda item: (item[1], item[0]))[:k]
+        return [(int(snapshot.food_ids[candidate_row]), distance) for candidate_row, distance in nearest]
+
+
+food_substitute_index = FoodSubstituteIndex()
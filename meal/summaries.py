@@ -0,0 +1,161 @@
+import datetime
+import operator
+import zoneinfo
+from collections import defaultdict
+from functools import reduce
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from users.models import UsersProfile
+
+from .managers import NUTRIENT_FIELDS
+from .models import DailyNutritionSummary, Meal
+
+
+# DailyNutritionSummary is the only source of the intake history: each (user, local day) row holds the
+# summed stored totals of the meals the user logged that day (not templates, not the planned meals of
+# generated / deep-copied plans). refresh_daily_summaries() recomputes just the days it is given and
+# is called wherever meal totals change (see MealQuerySet.refresh_totals and meal.signals);
+# rebuild_daily_summaries() redoes whole users. Both run one grouped query per time zone of the
+# users involved and one upsert.
+
+TOTAL_FIELDS = [f'total_{nutrient}' for nutrient in NUTRIENT_FIELDS]
+PERIODS = {'week': TruncWeek, 'month': TruncMonth}
+
+
+def get_timezone(name):
+    try:
+        return zoneinfo.ZoneInfo(name or settings.TIME_ZONE)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        return zoneinfo.ZoneInfo(settings.TIME_ZONE)
+
+
+def get_user_timezones(user_ids):
+    """{user id: ZoneInfo} from the users' profiles (TIME_ZONE when not set)."""
+    names = dict(UsersProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'timezone'))
+    return {user_id: get_timezone(names.get(user_id)) for user_id in user_ids}
+
+
+def local_today(user):
+    return timezone.now().astimezone(get_user_timezones([user.pk])[user.pk]).date()
+
+
+def day_bounds(first_day, last_day, tz):
+    """Aware [start, end) covering the local days first_day..last_day."""
+    start = datetime.datetime.combine(first_day, datetime.time.min, tzinfo=tz)
+    end = datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+    return start, end
+
+
+def summarize_meals(meals, tz):
+    """{(user id, local date): {'meal_count', 'total_<nutrient>'...}} of a Meal queryset, grouped in SQL."""
+    rows = (
+        meals.filter(is_template=False, is_planned=False)
+        .annotate(day=TruncDate('created_at', tzinfo=tz))
+        .order_by()
+        .values('user_id', 'day')
+        .annotate(meal_count=Count('pk'), **{field: Sum(field) for field in TOTAL_FIELDS})
+    )
+    return {(row.pop('user_id'), row.pop('day')): row for row in rows}
+
+
+def users_by_timezone(user_ids):
+    """{time zone name: (ZoneInfo, [user id])}: users sharing a time zone are summarized in one query."""
+    groups = {}
+    for user_id, tz in get_user_timezones(list(user_ids)).items():
+        groups.setdefault(tz.key, (tz, []))[1].append(user_id)
+    return groups
+
+
+def save_summaries(days, summaries):
+    """Upsert the summaries of the (user id, date) pairs in `days` and delete the ones left without meals."""
+    DailyNutritionSummary.objects.bulk_create(
+        [DailyNutritionSummary(user_id=user_id, date=day, **summaries[(user_id, day)]) for user_id, day in days if (user_id, day) in summaries],
+        update_conflicts=True,
+        unique_fields=['user', 'date'],
+        update_fields=['meal_count', *TOTAL_FIELDS, 'updated_at'],
+    )
+    empty_days = defaultdict(list)
+    for user_id, day in days:
+        if (user_id, day) not in summaries:
+            empty_days[user_id].append(day)
+    if empty_days:
+        DailyNutritionSummary.objects.filter(
+            reduce(operator.or_, (Q(user_id=user_id, date__in=dates) for user_id, dates in empty_days.items()))
+        ).delete()
+
+
+def refresh_daily_summaries(meals):
+    """
+    Recompute the summaries of the (user id, created_at) pairs in `meals`: one grouped query per time
+    zone over the affected local days of its users, then one upsert for all of them.
+    """
+    created_at_by_user = defaultdict(set)
+    for user_id, created_at in meals:
+        created_at_by_user[user_id].add(created_at)
+    if not created_at_by_user:
+        return
+
+    days, summaries = [], {}
+    for tz, user_ids in users_by_timezone(created_at_by_user).values():
+        ranges = []
+        for user_id in user_ids:
+            user_days = sorted({created_at.astimezone(tz).date() for created_at in created_at_by_user[user_id]})
+            days.extend((user_id, day) for day in user_days)
+            start, end = day_bounds(user_days[0], user_days[-1], tz)
+            ranges.append(Q(user_id=user_id, created_at__gte=start, created_at__lt=end))
+        summaries.update(summarize_meals(Meal.objects.filter(reduce(operator.or_, ranges)), tz))
+
+    with transaction.atomic():
+        save_summaries(days, summaries)
+
+
+def rebuild_daily_summaries(user_ids):
+    """Recompute every summary of these users (backfill, or after a time zone change)."""
+    summaries = {}
+    for tz, group in users_by_timezone(user_ids).values():
+        summaries.update(summarize_meals(Meal.objects.filter(user_id__in=group), tz))
+    with transaction.atomic():
+        stored = DailyNutritionSummary.objects.filter(user_id__in=list(user_ids)).values_list('user_id', 'date')
+        save_summaries({*stored, *summaries}, summaries)
+
+
+def summary_values(row):
+    return {
+        'meal_count': row['meal_count'],
+        **{nutrient: row[f'total_{nutrient}'] for nutrient in NUTRIENT_FIELDS},
+    }
+
+
+def get_daily_history(user, start, end):
+    """Every day from start to end (inclusive) with its totals; days without meals are zeros."""
+    rows = {
+        row['date']: row for row in DailyNutritionSummary.objects.filter(user=user, date__range=(start, end))
+        .values('date', 'meal_count', *TOTAL_FIELDS)
+    }
+    empty_day = {'meal_count': 0, **{field: 0.0 for field in TOTAL_FIELDS}}
+    days = []
+    day = start
+    while day <= end:
+        days.append({'date': day, **summary_values(rows.get(day, empty_day))})
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def get_period_history(user, start, end, period):
+    """Weekly (from Monday) or monthly sums of the daily summaries, plus the number of days logged."""
+    rows = (
+        DailyNutritionSummary.objects.filter(user=user, date__range=(start, end))
+        .annotate(period_start=PERIODS[period]('date'))
+        .order_by('period_start')
+        .values('period_start')
+        .annotate(days_logged=Count('pk'), meal_count=Sum('meal_count'), **{field: Sum(field) for field in TOTAL_FIELDS})
+    )
+    return [
+        {'period_start': row['period_start'], 'days_logged': row['days_logged'], **summary_values(row)}
+        for row in rows
+    ]
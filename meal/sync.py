@@ -0,0 +1,198 @@
+import base64
+import json
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Max
+
+from .managers import NUTRIENT_FIELDS, DAILY_TARGET_FIELDS
+from .models import Meal, MealItem, MealPlan, ScheduledMeal, SyncChange, SyncModel, SyncVersion
+
+
+# Delta sync of a user's meals and meal plans (GET /sync/?since=<token>).
+#
+# SyncChange keeps one row per synced object of a user with the user's sync version of its latest
+# change (a tombstone when it was deleted), so "what changed since version v" is one (user, version)
+# index range scan. track_changes() (called by meal.signals and by the bulk paths) writes the change
+# log inside the transaction of the data change: the versions are allocated for all users at once and
+# their counter rows stay locked until that transaction commits, so the log commits, or rolls back,
+# with the data. Code saving many rows wraps itself in batched_changes() to write them in one go.
+
+# label -> (model, response key, parent label: the owner is the parent's user / None: the row's own user, fields)
+SYNC_MODELS = {
+    SyncModel.MEAL: (Meal, 'meals', None, [
+        'id', 'name', 'meal_time_category', 'description', 'is_template', 'is_planned',
+        *(f'total_{nutrient}' for nutrient in NUTRIENT_FIELDS), 'created_at', 'updated_at',
+    ]),
+    SyncModel.MEAL_ITEM: (MealItem, 'meal_items', SyncModel.MEAL, ['id', 'meal', 'food', 'number_of_servings']),
+    SyncModel.MEAL_PLAN: (MealPlan, 'meal_plans', None, [
+        'id', 'name', 'description', 'goal', 'duration_days', 'start_date',
+        *(f'target_daily_{nutrient}' for nutrient in DAILY_TARGET_FIELDS),
+        'is_active', 'is_ai_generated', 'is_template', 'created_at', 'updated_at',
+    ]),
+    SyncModel.SCHEDULED_MEAL: (ScheduledMeal, 'scheduled_meals', SyncModel.MEAL_PLAN, ['id', 'meal_plan', 'meal', 'day_of_plan']),
+}
+# label -> foreign key to the parent, for the rows whose owner is their parent
+PARENT_FIELDS = {SyncModel.MEAL_ITEM: 'meal', SyncModel.SCHEDULED_MEAL: 'meal_plan'}
+
+_local = threading.local()
+
+
+def resolve_users(changes, owners):
+    """
+    {(label, id): (user id, deleted)} from {(label, id): (owner id, deleted)}, `owners` giving the user
+    of parents deleted meanwhile ({(label, id): user id}); rows whose owner is gone are left out.
+    """
+    owners = dict(owners)
+    parent_ids = defaultdict(set)
+    for (label, _), (owner_id, _) in changes.items():
+        parent_label = SYNC_MODELS[label][2]
+        if parent_label is not None and (parent_label, owner_id) not in owners:
+            parent_ids[parent_label].add(owner_id)
+    for parent_label, ids in parent_ids.items():
+        model = SYNC_MODELS[parent_label][0]
+        owners.update(((parent_label, pk), user_id) for pk, user_id in model.objects.filter(pk__in=ids).values_list('pk', 'user_id'))
+
+    users = {}
+    for (label, object_id), (owner_id, deleted) in changes.items():
+        parent_label = SYNC_MODELS[label][2]
+        if parent_label is None:
+            users[(label, object_id)] = (owner_id, deleted)
+        elif (parent_label, owner_id) in owners:
+            users[(label, object_id)] = (owners[(parent_label, owner_id)], deleted)
+    return users
+
+
+def write_changes(changes):
+    """Stamp {(label, id): (user id, deleted)} with new versions of their users and upsert them."""
+    keys_by_user = defaultdict(list)
+    for key, (user_id, _) in changes.items():
+        keys_by_user[user_id].append(key)
+    if not keys_by_user:
+        return
+    with transaction.atomic(savepoint=False):
+        last_versions = SyncVersion.objects.allocate({user_id: len(keys) for user_id, keys in keys_by_user.items()})
+        SyncChange.objects.bulk_create(
+            [
+                SyncChange(user_id=user_id, model=label, object_id=object_id, version=version, deleted=changes[(label, object_id)][1])
+                for user_id, keys in keys_by_user.items()
+                for version, (label, object_id) in enumerate(sorted(keys), start=last_versions[user_id] - len(keys) + 1)
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'model', 'object_id'],
+            update_fields=['version', 'deleted', 'changed_at'],
+        )
+
+
+def record_changes(changes, owners=None):
+    # Into the open batch, else written right away
+    batch = getattr(_local, 'batch', None)
+    if batch is not None:
+        batch[0].update(changes)
+        batch[1].update(owners or {})
+    elif changes:
+        write_changes(resolve_users(changes, owners or {}))
+
+
+def track_changes(label, rows, deleted=False):
+    """
+    Record that these rows were saved (or deleted): `rows` is [(object id, owner id)], the owner being
+    the user for meals and meal plans and the meal / meal plan for items and scheduled meals.
+    Written right away, unless inside batched_changes().
+    """
+    record_changes({(label, object_id): (owner_id, deleted) for object_id, owner_id in rows})
+
+
+def track_deletion(label, object_id, user_id):
+    """
+    Tombstones for a meal / meal plan about to be deleted and for the items / scheduled meals deleted
+    with it (their own post_delete leaves them to this). Call from pre_delete, inside the delete's transaction.
+    """
+    changes = {(label, object_id): (user_id, True)}
+    for child_label, parent_field in PARENT_FIELDS.items():
+        if SYNC_MODELS[child_label][2] == label:
+            child_ids = SYNC_MODELS[child_label][0].objects.filter(**{parent_field: object_id}).values_list('pk', flat=True)
+            changes.update(((child_label, child_id), (object_id, True)) for child_id in child_ids)
+    record_changes(changes, {(label, object_id): user_id})
+
+
+@contextmanager
+def batched_changes():
+    """Collect the changes tracked inside the block and write them once at its end (inside the transaction)."""
+    if getattr(_local, 'batch', None) is not None:
+        yield  # Part of the enclosing batch
+        return
+    _local.batch = ({}, {})  # changes, owners of deleted parents
+    try:
+        yield
+        (changes, owners), _local.batch = _local.batch, None
+        if changes:
+            write_changes(resolve_users(changes, owners))
+    finally:
+        _local.batch = None
+
+
+def encode_token(version):
+    return base64.urlsafe_b64encode(json.dumps({'v': version}).encode()).decode()
+
+
+def decode_token(token):
+    """The version of a sync token; raises ValueError when it is not one."""
+    try:
+        version = json.loads(base64.urlsafe_b64decode(token.encode()))['v']
+    except (TypeError, KeyError, ValueError, UnicodeError):
+        raise ValueError("Invalid sync token.")
+    if not isinstance(version, int) or version < 0:
+        raise ValueError("Invalid sync token.")
+    return version
+
+
+class SyncTokenExpired(Exception):
+    pass
+
+
+def get_changes(user, since=0, limit=1000):
+    """
+    The user's changes after version `since`, oldest first, at most `limit` rows:
+    {'changes': {response key: [row]}, 'deleted': {response key: [id]}, 'version', 'has_more'}.
+    Rows are read in their current state. Raises SyncTokenExpired when tombstones newer than `since`
+    were pruned (the client has to sync from scratch).
+    """
+    pruned_version = SyncVersion.objects.filter(user=user).values_list('pruned_version', flat=True).first() or 0
+    if since and since < pruned_version:
+        raise SyncTokenExpired
+    log = list(
+        SyncChange.objects.filter(user=user, version__gt=since)
+        .order_by('version')
+        .values_list('model', 'object_id', 'deleted', 'version')[:limit + 1]
+    )
+    has_more = len(log) > limit
+    log = log[:limit]
+
+    changed, deleted = defaultdict(list), defaultdict(list)
+    for label, object_id, is_deleted, _ in log:
+        # A first sync has nothing to delete
+        if not is_deleted:
+            changed[label].append(object_id)
+        elif since:
+            deleted[label].append(object_id)
+
+    result = {'changes': {}, 'deleted': {}}
+    for label, (model, key, _, fields) in SYNC_MODELS.items():
+        # A row deleted since its change is left out: its tombstone follows in a later version
+        rows = list(model.objects.filter(pk__in=changed[label]).order_by('pk').values(*fields)) if changed[label] else []
+        result['changes'][key] = rows
+        result['deleted'][key] = deleted[label]
+    result['version'] = log[-1][3] if log else since
+    result['has_more'] = has_more
+    return result
+
+
+def prune_tombstones(before):
+    """Delete the tombstones last changed before `before`; returns how many were deleted."""
+    tombstones = SyncChange.objects.filter(deleted=True, changed_at__lt=before)
+    for user_id, version in tombstones.order_by().values('user_id').annotate(version=Max('version')).values_list('user_id', 'version'):
+        SyncVersion.objects.filter(user_id=user_id, pruned_version__lt=version).update(pruned_version=version)
+    return tombstones.delete()[0]
@@ -1,3 +1,810 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from users.models import UsersProfile
+
+from .autocomplete import food_prefix_index
+from .barcodes import food_barcode_cache
+from .catalog_snapshot import MANIFEST_CACHE_KEY, build_food_snapshot
+from .managers import NUTRIENT_FIELDS
+from .models import CopyJobStatus, DailyNutritionSummary, Food, Meal, MealItem, MealPlan, MealPlanCopyJob, PlanCalendarEntry, ScheduledMeal, SyncChange, SyncModel, SyncVersion
+from .generator import DEFAULT_SLOTS, generate_meal_plan
+from .nutrition import NutrientMatrix, nutrient_matrix
+from .serializers import FoodSerializer, ValuesSerializer
+from .summaries import rebuild_daily_summaries
+from .sync import get_changes
+from .services import copy_meal_plan, run_meal_plan_copy_job
+
+
+User = get_user_model()
+
+
+def make_food(user=None, **kwargs):
+    values = {'name': 'Oats', 'calories': 100, 'protein': 10, 'carbohydrates': 20, 'fat': 5, 'user_added': user}
+    values.update(kwargs)
+    return Food.objects.create(**values)
+
+
+class FoodChangeTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        self.food = make_food()
+        self.meal = Meal.objects.create(user=self.user, name='Breakfast', meal_time_category='BF')
+        MealItem.objects.create(meal=self.meal, food=self.food, number_of_servings=2)
+
+    def test_nutrient_change_refreshes_meal_totals(self):
+        self.food.calories = 150
+        self.food.save()
+        self.meal.refresh_from_db()
+        self.assertEqual(self.meal.total_calories, 300)
+
+    def test_description_change_does_not_touch_meals(self):
+        updated_at = Meal.objects.get(pk=self.meal.pk).updated_at
+        self.food.description = 'Rolled'
+        with CaptureQueriesContext(connection) as queries:
+            self.food.save()
+        self.assertFalse([query for query in queries.captured_queries if 'UPDATE "meal_meal"' in query['sql']])
+        self.assertEqual(Meal.objects.get(pk=self.meal.pk).updated_at, updated_at)
+
+
+class DailySummaryRefreshTests(TestCase):
+
+    def setUp(self):
+        self.food = make_food()
+
+    def add_users(self, count, timezone_name):
+        for _ in range(count):
+            user = User.objects.create_user(email=f'user{User.objects.count()}@example.com', password='x')
+            UsersProfile.objects.update_or_create(user=user, defaults={'timezone': timezone_name})
+            for category in ('BF', 'DN'):
+                meal = Meal.objects.create(user=user, name='Meal', meal_time_category=category)
+                MealItem.objects.create(meal=meal, food=self.food, number_of_servings=1)
+                # Spread over two local days
+                Meal.objects.filter(pk=meal.pk).update(created_at=F('created_at') - datetime.timedelta(days=category == 'DN'))
+
+    def count_refresh_queries(self):
+        self.food.calories += 10
+        with CaptureQueriesContext(connection) as queries:
+            self.food.save()
+        return len(queries.captured_queries)
+
+    def test_deleting_a_user_with_logged_meals(self):
+        self.add_users(1, 'Europe/Berlin')
+        user = User.objects.get()
+        self.assertTrue(DailyNutritionSummary.objects.filter(user=user).exists())
+        user.delete()
+        self.assertFalse(Meal.objects.exists())
+        self.assertFalse(DailyNutritionSummary.objects.exists())
+
+    def test_query_count_does_not_grow_with_the_users(self):
+        self.add_users(2, 'Europe/Berlin')
+        self.add_users(1, 'Asia/Dhaka')
+        few = self.count_refresh_queries()
+        self.add_users(8, 'Europe/Berlin')
+        self.add_users(4, 'Asia/Dhaka')
+        self.assertEqual(self.count_refresh_queries(), few)
+
+        rebuilt = list(DailyNutritionSummary.objects.order_by('user_id', 'date').values_list('user_id', 'date', 'meal_count', 'total_calories'))
+        rebuild_daily_summaries(list(User.objects.values_list('pk', flat=True)))
+        self.assertEqual(len(rebuilt), 2 * 15)
+        self.assertEqual(list(DailyNutritionSummary.objects.order_by('user_id', 'date').values_list('user_id', 'date', 'meal_count', 'total_calories')), rebuilt)
+        self.assertEqual({row[3] for row in rebuilt}, {120})
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.food = make_food()
+        self.meal = Meal.objects.create(user=self.user, name='Breakfast', meal_time_category='BF')
+        MealItem.objects.create(meal=self.meal, food=self.food, number_of_servings=1)
+        plan = MealPlan.objects.create(user=self.user, name='Plan', duration_days=7)
+        ScheduledMeal.objects.create(meal_plan=plan, meal=self.meal, day_of_plan=1)
+
+    def test_food_rename_changes_the_validators(self):
+        urls = [
+            '/api/v1/nutrition/meals/',
+            f'/api/v1/nutrition/meals/{self.meal.pk}/',
+            '/api/v1/nutrition/meal-plans/?expand=scheduled_meals,meal_detail,meal_items,food_detail',
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        for url in urls:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 304)
+
+        self.food.name = 'Rolled oats'
+        self.food.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(b'Rolled oats', response.content)
+
+
+class MealPlanListTests(TestCase):
+
+    def test_plans_with_daily_totals_keep_the_default_ordering(self):
+        user = User.objects.create_user(email='user@example.com', password='x')
+        first = MealPlan.objects.create(user=user, name='First', duration_days=7)
+        second = MealPlan.objects.create(user=user, name='Second', duration_days=7)
+        plans = MealPlan.objects.filter(user=user).with_daily_totals()
+        self.assertTrue(plans.ordered)
+        self.assertEqual([plan.pk for plan in plans], [second.pk, first.pk])
+
+
+class FoodPrefixIndexInvalidationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        food_prefix_index.ensure_fresh()
+
+    def test_private_food_keeps_the_index(self):
+        food = make_food(self.user, is_public=False)
+        food.name = 'Secret oats'
+        food.save()
+        food.delete()
+        self.assertFalse(food_prefix_index._stale)
+
+    def test_public_food_changes_invalidate_the_index(self):
+        food = make_food(self.user, is_public=False)
+        food.is_public = True
+        food.save()
+        self.assertTrue(food_prefix_index._stale)
+
+        food_prefix_index.ensure_fresh()
+        food.is_public = False # Leaves the index
+        food.save()
+        self.assertTrue(food_prefix_index._stale)
+
+
+class FoodDensityTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.bar = make_food(name='Bar', serving_quantity=50, serving_unit=' Grams ', calories=200, protein=10, carbohydrates=25, fat=8, sugar=12)
+        self.water = make_food(name='Water', serving_quantity=250, serving_unit='g', calories=0, protein=0, carbohydrates=0, fat=0)
+        self.egg = make_food(name='Egg', serving_quantity=1, serving_unit='piece', calories=70, protein=6, carbohydrates=0.5, fat=5)
+
+    def densities(self, food, *fields):
+        return Food.objects.values_list(*fields).get(pk=food.pk)
+
+    def test_generated_values(self):
+        self.assertEqual(self.densities(self.bar, 'calories_per_100g', 'protein_per_100g', 'sugar_per_100g', 'protein_per_100kcal'), (400, 20, 24, 5))
+        self.assertEqual(self.densities(self.bar, 'fiber_per_100g', 'fiber_per_100kcal'), (None, None)) # No fiber value
+        # Zero calories: per 100 g is 0, per 100 kcal is undefined
+        self.assertEqual(self.densities(self.water, 'calories_per_100g', 'protein_per_100g', 'protein_per_100kcal'), (0, 0, None))
+        # Not measured in grams
+        self.assertEqual(self.densities(self.egg, 'calories_per_100g', 'protein_per_100kcal'), (None, 6 * 100 / 70))
+
+        # Recomputed by the database on bulk updates too
+        Food.objects.filter(pk=self.bar.pk).update(serving_quantity=100)
+        self.assertEqual(self.densities(self.bar, 'calories_per_100g'), (200,))
+
+    def names(self, **params):
+        response = self.client.get('/api/v1/nutrition/foods/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(food['name'] for food in response.json()['results'])
+
+    def test_range_filters(self):
+        self.assertEqual(self.names(calories_per_100g__gte=400), ['Bar'])  # Bounds are inclusive
+        self.assertEqual(self.names(calories_per_100g__lte=0), ['Water'])
+        self.assertEqual(self.names(calories_per_100g__gte=0, calories_per_100g__lte=400), ['Bar', 'Water'])  # NULL (Egg) never matches
+        self.assertEqual(self.names(protein_per_100kcal__gte=5), ['Bar', 'Egg'])  # Water has no per-kcal value
+        self.assertEqual(self.names(protein_per_100kcal__gte=5.01), ['Egg'])
+        self.assertEqual(self.client.get('/api/v1/nutrition/foods/', {'sugar_per_100g__lte': 'lots'}).status_code, 400)
+
+    def test_ordering(self):
+        response = self.client.get('/api/v1/nutrition/foods/', {'ordering': '-protein_per_100kcal', 'protein_per_100kcal__gte': 0})
+        self.assertEqual([food['name'] for food in response.json()['results']], ['Egg', 'Bar'])
+
+
+class FoodBarcodeTests(TestCase):
+
+    barcode = '00036000291452'
+
+    def setUp(self):
+        food_barcode_cache.clear()
+        self.addCleanup(food_barcode_cache.clear)
+        self.admin = User.objects.create_user(email='admin@example.com', password='x', is_staff=True)
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        self.other = User.objects.create_user(email='other@example.com', password='x')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def create_food(self, user, **kwargs):
+        payload = {'name': 'Cereal', 'calories': 100, 'protein': 2, 'carbohydrates': 20, 'fat': 1, 'barcode': self.barcode, **kwargs}
+        return self.client_for(user).post('/api/v1/nutrition/foods/', payload, format='json')
+
+    def lookup(self, user):
+        return self.client_for(user).get(f'/api/v1/nutrition/foods/by-barcode/{self.barcode}/')
+
+    def test_private_food_does_not_claim_the_barcode(self):
+        self.assertEqual(self.create_food(self.user, name='My cereal').status_code, 201)
+        self.assertEqual(self.lookup(self.user).json()['name'], 'My cereal')
+        self.assertEqual(self.lookup(self.other).status_code, 404)
+
+        # The product can still be added to the catalog, and is found first
+        self.assertEqual(self.create_food(self.admin, is_public=True).status_code, 201)
+        self.assertEqual(self.lookup(self.other).json()['name'], 'Cereal')
+        self.assertEqual(self.lookup(self.user).json()['name'], 'Cereal')
+        self.assertEqual(self.create_food(self.other, name='Their cereal').status_code, 201)
+
+    def test_duplicates_in_the_same_scope_are_rejected(self):
+        self.assertEqual(self.create_food(self.admin, is_public=True).status_code, 201)
+        response = self.create_food(self.admin, is_public=True, barcode='36000291452') # Same GTIN as UPC-A
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('barcode', response.json())
+
+        response = self.create_food(self.user)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.create_food(self.user).status_code, 400)
+
+
+class FoodSnapshotTests(TestCase):
+
+    url = '/api/v1/nutrition/foods/snapshot/'
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.delete(MANIFEST_CACHE_KEY)
+        self.addCleanup(cache.delete, MANIFEST_CACHE_KEY)
+        self.client = APIClient()
+        self.food = make_food(name='Apple')
+        make_food(name='Secret', is_public=False)
+
+    def read_snapshot(self, manifest):
+        with default_storage.open(manifest['name']) as file:
+            return [json.loads(line) for line in gzip.decompress(file.read()).splitlines()]
+
+    def test_not_built_yet(self):
+        self.assertEqual(self.client.get(self.url).status_code, 503)
+
+    def test_build_and_serve(self):
+        manifest, created = build_food_snapshot()
+        self.assertTrue(created)
+        self.assertEqual(manifest['count'], 1)
+        foods = self.read_snapshot(manifest)
+        self.assertEqual([food['name'] for food in foods], ['Apple'])  # Public foods only
+        self.assertEqual(hashlib.sha256(b''.join(
+            json.dumps(food, ensure_ascii=False, separators=(',', ':')).encode() + b'\n' for food in foods
+        )).hexdigest(), manifest['sha256'])
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].endswith(manifest['name']))
+        self.assertEqual(response['ETag'], f'"{manifest["version"]}"')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_rebuild_after_a_food_change(self):
+        first, _ = build_food_snapshot()
+        self.assertEqual(build_food_snapshot(), (first, False))  # Unchanged catalog
+
+        self.food.calories = 52
+        self.food.save()
+        second, created = build_food_snapshot()
+        self.assertTrue(created)
+        self.assertNotEqual(second['version'], first['version'])
+        self.assertEqual(self.read_snapshot(second)[0]['calories'], 52)
+        self.assertEqual(second['history'], [second['name'], first['name']])
+        # The manifest cache was dropped: the endpoint moves to the new file at once
+        self.assertEqual(self.client.get(self.url)['ETag'], f'"{second["version"]}"')
+
+        make_food(name='Banana')
+        third, _ = build_food_snapshot(keep=2)
+        self.assertEqual(third['count'], 2)
+        self.assertFalse(default_storage.exists(first['name']))  # Older than `keep`
+        self.assertTrue(default_storage.exists(second['name']))
+
+
+class ImportFoodsTests(TestCase):
+
+    def test_rows_longer_than_their_columns_are_skipped(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            writer = csv.writer(file)
+            writer.writerow(['name', 'serving_unit', 'calories', 'protein', 'carbohydrates', 'fat', 'external_id'])
+            writer.writerow(['Apple', 'g', 52, 0.3, 14, 0.2, 'a'])
+            writer.writerow(['x' * 201, 'g', 52, 0.3, 14, 0.2, 'b'])
+            writer.writerow(['Pear', 'u' * 51, 57, 0.4, 15, 0.1, 'c'])
+            writer.writerow(['Plum', 'g', 46, 0.7, 11, 0.3, 'd' * 256])
+        self.addCleanup(os.remove, file.name)
+        output = io.StringIO()
+        call_command('import_foods', file.name, stdout=output, stderr=io.StringIO())
+        self.assertIn('1 imported, 3 skipped', output.getvalue())
+        self.assertEqual(list(Food.objects.values_list('name', flat=True)), ['Apple'])
+
+
+class MealItemQueryCountTests(TestCase):
+    """Creating or updating a meal costs the same number of queries whatever its number of items."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.foods = [make_food(name=f'Food {number}', calories=100 + number) for number in range(60)]
+
+    def payload(self, foods, servings=1):
+        return {
+            'name': 'Lunch',
+            'meal_time_category': 'LN',
+            'meal_items': [{'food': food.pk, 'number_of_servings': servings} for food in foods],
+        }
+
+    def count_queries(self, method, url, payload, status):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, payload, format='json')
+        self.assertEqual(response.status_code, status, response.content)
+        return len(queries.captured_queries), response
+
+    def create_meal(self, item_count):
+        return self.count_queries('post', '/api/v1/nutrition/meals/', self.payload(self.foods[:item_count]), 201)
+
+    def test_create_is_flat(self):
+        small, _ = self.create_meal(5)
+        large, response = self.create_meal(30)
+        self.assertEqual(small, large)
+        self.assertEqual(MealItem.objects.filter(meal_id=response.json()['id']).count(), 30)
+
+    def test_update_is_flat(self):
+        counts = []
+        for item_count in (5, 30):
+            _, response = self.create_meal(item_count)
+            url = f"/api/v1/nutrition/meals/{response.json()['id']}/"
+            # Changes the servings of the first half, drops the rest and adds as many new foods
+            foods = self.foods[:item_count // 2] + self.foods[30:30 + item_count - item_count // 2]
+            count, _ = self.count_queries('put', url, self.payload(foods, servings=2), 200)
+            counts.append(count)
+        self.assertEqual(counts[0], counts[1])
+
+
+class ScheduledMealQueryCountTests(TestCase):
+    """Editing a plan's schedule costs the same number of queries whatever the plan length."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.meals = [Meal.objects.create(user=self.user, name=f'Meal {number}', meal_time_category='LN') for number in range(4)]
+
+    def edit_schedule(self, days, is_template=False):
+        plan = MealPlan.objects.create(user=self.user, name='Plan', duration_days=days, is_template=is_template, start_date=datetime.date(2026, 1, 1))
+        ScheduledMeal.objects.bulk_create([ScheduledMeal(meal_plan=plan, meal=self.meals[0], day_of_plan=day) for day in range(1, days + 1)])
+        # Keeps the first half of the days, drops the rest and schedules as many other meals
+        payload = [{'meal': self.meals[0].pk, 'day_of_plan': day} for day in range(1, days // 2 + 1)]
+        payload += [{'meal': self.meals[1].pk, 'day_of_plan': day} for day in range(days // 2 + 1, days + 1)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/api/v1/nutrition/meal-plans/{plan.pk}/', {'scheduled_meals_payload': payload}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(sorted(plan.scheduledmeal_set.values_list('day_of_plan', 'meal_id')), sorted((row['day_of_plan'], row['meal']) for row in payload))
+        return len(queries.captured_queries)
+
+    def test_update_is_flat(self):
+        self.assertEqual(self.edit_schedule(2), self.edit_schedule(40))
+        self.assertEqual(self.edit_schedule(2, is_template=True), self.edit_schedule(40, is_template=True))
+
+    def test_dropped_rows_leave_tombstones_and_calendar_entries(self):
+        self.edit_schedule(6)
+        plan = MealPlan.objects.get()
+        # The rows set up with bulk_create were never logged: only the new ones and the tombstones are
+        self.assertEqual(len(get_changes(self.user)['changes']['scheduled_meals']), 3)
+        self.assertEqual(PlanCalendarEntry.objects.filter(meal_plan=plan).count(), 6)
+        self.assertEqual(SyncChange.objects.filter(model=SyncModel.SCHEDULED_MEAL, deleted=True).count(), 3)
+
+
+class PlanCalendarTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.meal = Meal.objects.create(user=self.user, name='Breakfast', meal_time_category='BF')
+        self.other_meal = Meal.objects.create(user=self.user, name='Dinner', meal_time_category='DN')
+        self.plan = MealPlan.objects.create(user=self.user, name='Plan', duration_days=30)
+        self.schedule = [ScheduledMeal.objects.create(meal_plan=self.plan, meal=self.meal, day_of_plan=day) for day in range(1, 31)]
+
+    def calendar(self):
+        return sorted(PlanCalendarEntry.objects.filter(meal_plan=self.plan).values_list('scheduled_meal_id', 'date'))
+
+    def start(self, start_date=datetime.date(2026, 3, 1)):
+        response = self.client.patch(f'/api/v1/nutrition/meal-plans/{self.plan.pk}/', {'start_date': start_date.isoformat()}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_starting_a_plan_fills_the_calendar(self):
+        self.assertEqual(self.calendar(), [])
+        self.start()
+        self.assertEqual(self.calendar(), [(scheduled.pk, datetime.date(2026, 3, scheduled.day_of_plan)) for scheduled in self.schedule])
+        today = self.client.get('/api/v1/nutrition/meal-plans/today/', {'date': '2026-03-02'}).json()
+        self.assertEqual(len(today['meals']), 1)
+
+    def test_rescheduling(self):
+        self.start()
+        self.start(datetime.date(2026, 4, 1))
+        self.assertEqual(self.calendar()[0], (self.schedule[0].pk, datetime.date(2026, 4, 1)))
+
+        scheduled = self.schedule[0]
+        scheduled.meal, scheduled.day_of_plan = self.other_meal, 10
+        with CaptureQueriesContext(connection) as queries:
+            scheduled.save()
+        # Only this slot's entry is rewritten, not the plan's 30
+        self.assertFalse([query for query in queries.captured_queries if 'DELETE' in query['sql']])
+        self.assertEqual(PlanCalendarEntry.objects.get(scheduled_meal=scheduled).date, datetime.date(2026, 4, 10))
+        self.assertEqual(len(self.calendar()), 30)
+
+    def test_cancelling_a_plan_clears_the_calendar(self):
+        self.start()
+        response = self.client.patch(f'/api/v1/nutrition/meal-plans/{self.plan.pk}/cancel/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.calendar(), [])
+
+        # A slot saved while the plan is cancelled stays out of the calendar
+        self.schedule[0].save()
+        self.assertEqual(self.calendar(), [])
+
+
+class AddServingsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.oats = make_food()
+        self.milk = make_food(name='Milk', calories=60, protein=3, carbohydrates=5, fat=3)
+        self.meal = Meal.objects.create(user=self.user, name='Breakfast', meal_time_category='BF')
+        MealItem.objects.create(meal=self.meal, food=self.oats, number_of_servings=1)
+
+    def add(self, food, number_of_servings):
+        response = self.client.post(
+            f'/api/v1/nutrition/meals/{self.meal.pk}/add-servings/', {'food': food.pk, 'number_of_servings': number_of_servings}, format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_new_food_inserts_an_item(self):
+        data = self.add(self.milk, 2)
+        self.assertEqual(dict(self.meal.mealitem_set.values_list('food_id', 'number_of_servings')), {self.oats.pk: 1, self.milk.pk: 2})
+        self.assertEqual(data['total_calories'], 220)
+
+    def test_existing_food_adds_to_its_servings(self):
+        item_id, number_of_servings = MealItem.objects.add_servings(self.meal.pk, self.oats.pk, 1.5)
+        self.assertEqual((item_id, number_of_servings), (MealItem.objects.get().pk, 2.5))
+        self.meal.refresh_totals()
+        self.assertEqual(self.add(self.oats, 0.5)['total_calories'], 300)
+        self.assertEqual(MealItem.objects.get().number_of_servings, 3)
+
+    def test_totals_summaries_and_sync_follow(self):
+        since = get_changes(self.user)['version']
+        self.add(self.milk, 1)
+        self.add(self.oats, 1)
+        meal = Meal.objects.with_totals().get()
+        for nutrient in NUTRIENT_FIELDS:
+            self.assertAlmostEqual(getattr(meal, f'total_{nutrient}'), getattr(meal, f'items_total_{nutrient}'))
+        self.assertEqual(DailyNutritionSummary.objects.get(user=self.user).total_calories, 260)
+        changes = get_changes(self.user, since)['changes']
+        self.assertEqual([row['id'] for row in changes['meals']], [self.meal.pk])
+        self.assertEqual(sorted(row['food'] for row in changes['meal_items']), sorted([self.oats.pk, self.milk.pk]))
+
+
+class MealBatchTests(TestCase):
+
+    url = '/api/v1/nutrition/meals/batch/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.food = make_food()
+
+    def entry(self, name='Lunch', food=None, servings=2):
+        return {'name': name, 'meal_time_category': 'LN', 'meal_items': [{'food': food or self.food.pk, 'number_of_servings': servings}]}
+
+    def post(self, meals):
+        return self.client.post(self.url, {'meals': meals}, format='json')
+
+    def test_all_valid(self):
+        response = self.post([self.entry('First'), self.entry('Second')])
+        self.assertEqual(response.status_code, 201, response.content)
+        data = response.json()
+        self.assertEqual((data['created'], data['failed']), (2, 0))
+        self.assertEqual([result['meal']['name'] for result in data['results']], ['First', 'Second'])
+        self.assertEqual([result['meal']['total_calories'] for result in data['results']], [200, 200])
+        self.assertEqual(DailyNutritionSummary.objects.get(user=self.user).meal_count, 2)
+
+    def test_some_invalid(self):
+        response = self.post([self.entry('First'), self.entry('Unknown food', food=self.food.pk + 100), 'not a meal', self.entry('Last')])
+        self.assertEqual(response.status_code, 207, response.content)
+        data = response.json()
+        self.assertEqual((data['created'], data['failed']), (2, 2))
+        self.assertEqual([result['status'] for result in data['results']], [201, 400, 400, 201])
+        self.assertEqual([result['index'] for result in data['results']], [0, 1, 2, 3])
+        self.assertIn('meal_items', data['results'][1]['errors'])
+        self.assertEqual(sorted(Meal.objects.values_list('name', flat=True)), ['First', 'Last'])
+
+    def test_all_invalid(self):
+        response = self.post([self.entry(servings=-1), {'meal_time_category': 'LN'}])
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(response.json()['created'], 0)
+        self.assertEqual([result['status'] for result in response.json()['results']], [400, 400])
+        self.assertFalse(Meal.objects.exists())
+        self.assertEqual(self.post([]).status_code, 400)
+
+    def test_valid_meals_are_saved_together(self):
+        # A failure while saving rolls back the meals already inserted for the batch
+        with mock.patch('meal.services.MealItem.objects.bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.post([self.entry('First'), self.entry('Second')])
+        self.assertFalse(Meal.objects.exists())
+
+
+class MealPlanCopyJobTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.plan = MealPlan.objects.create(user=self.user, name='Plan', duration_days=90)
+
+    def job_status(self, job):
+        return self.client.get(f'/api/v1/nutrition/meal-plans/copy-jobs/{job.pk}/').json()
+
+    @override_settings(MEAL_PLAN_COPY_JOB_TIMEOUT=60)
+    def test_lost_running_job_is_reported_as_failed(self):
+        job = MealPlanCopyJob.objects.create(
+            user=self.user, source_plan=self.plan, status=CopyJobStatus.RUNNING,
+            started_at=timezone.now() - datetime.timedelta(minutes=5),
+        )
+        self.assertEqual(self.job_status(job)['status'], CopyJobStatus.FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CopyJobStatus.FAILED)
+
+    @override_settings(MEAL_PLAN_COPY_JOB_TIMEOUT=60)
+    def test_recent_running_job_keeps_running(self):
+        job = MealPlanCopyJob.objects.create(
+            user=self.user, source_plan=self.plan, status=CopyJobStatus.RUNNING, started_at=timezone.now(),
+        )
+        self.assertEqual(self.job_status(job)['status'], CopyJobStatus.RUNNING)
+
+    def test_synchronous_copy_failure_is_logged(self):
+        template = MealPlan.objects.create(user=self.user, name='Template', duration_days=7, is_template=True)
+        with mock.patch('meal.views.copy_meal_plan', side_effect=DatabaseError('deadlock')):
+            with self.assertLogs('meal.views', level='ERROR') as logs:
+                response = self.client.post(f'/api/v1/nutrition/meal-plans/{template.pk}/copy/')
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('deadlock', logs.output[0])
+
+    def test_failure_is_logged(self):
+        job = MealPlanCopyJob.objects.create(user=self.user, source_plan=None)
+        with self.assertLogs('meal.services', level='ERROR'):
+            job = run_meal_plan_copy_job(job.pk)
+        self.assertEqual(job.status, CopyJobStatus.FAILED)
+        self.assertIsNotNone(job.started_at)
+
+
+class TemplateListCacheTests(TestCase):
+    """The default backend is LocMemCache: the version comes from the template rows, not from bumps."""
+
+    url = '/api/v1/nutrition/meal-plans/templates/?expand=scheduled_meals,meal_detail,meal_items,food_detail'
+
+    def setUp(self):
+        self.client = APIClient()
+        user = User.objects.create_user(email='user@example.com', password='x')
+        self.food = make_food()
+        meal = Meal.objects.create(user=user, name='Breakfast', meal_time_category='BF', is_template=True)
+        MealItem.objects.create(meal=meal, food=self.food, number_of_servings=1)
+        plan = MealPlan.objects.create(user=user, name='Template', duration_days=7, is_template=True)
+        ScheduledMeal.objects.create(meal_plan=plan, meal=meal, day_of_plan=1)
+
+    def test_etag_follows_the_template_content(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"other", {etag}').status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"x{etag[1:]}').status_code, 200)
+
+        # Saved without the bump reaching this process' cache
+        Food.objects.filter(pk=self.food.pk).update(name='Rolled oats', updated_at=timezone.now())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Rolled oats', response.content)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class FoodValuesSerializerTests(TestCase):
+    """The .values() fast path of the food list renders exactly what FoodSerializer renders."""
+
+    def setUp(self):
+        user = User.objects.create_user(email='user@example.com', password='x', first_name='Ann', last_name='Lee')
+        make_food(user, name='Custom bar', description='Homemade', fiber=2.5, food_category='OT', barcode='00036000291452')
+        make_food(name='Apple', serving_quantity=182, serving_unit='g', sugar=19) # No user_added
+
+    def render_both(self, params):
+        request = Request(APIRequestFactory().get('/api/v1/nutrition/foods/', params))
+        context = {'request': request}
+        foods = Food.objects.order_by('id')
+        expected = FoodSerializer(foods.select_related('user_added'), many=True, context=context).data
+        values_serializer = ValuesSerializer(FoodSerializer(context=context))
+        output = values_serializer.to_representation(foods.values(*values_serializer.columns))
+        return JSONRenderer().render(output), JSONRenderer().render(expected)
+
+    def test_identical_output(self):
+        for params in [
+            {},
+            {'fields': 'id,name,calories,barcode,protein_per_100g'},
+            {'fields': 'id,name,user_added_detail'},
+            {'expand': 'user_added_detail'},
+            {'fields': 'id,name', 'expand': 'user_added_detail'},
+        ]:
+            with self.subTest(params=params):
+                output, expected = self.render_both(params)
+                self.assertEqual(output, expected)
+
+
+class NutrientMatrixTests(TestCase):
+
+    def test_food_behind_the_watermark_is_loaded_by_id(self):
+        user = User.objects.create_user(email='user@example.com', password='x')
+        matrix = NutrientMatrix()
+        make_food(name='Loaded')
+        matrix.refresh()
+        # A later updated_at was loaded before this food's transaction committed
+        matrix._watermark = timezone.now() + datetime.timedelta(hours=1)
+        food = make_food(name='Late', calories=250)
+        meal = Meal.objects.create(user=user, name='Dinner', meal_time_category='DN')
+        MealItem.objects.create(meal=meal, food=food, number_of_servings=2)
+        meal_ids, totals = matrix.meal_totals_array([meal.pk])
+        self.assertEqual(meal_ids.tolist(), [meal.pk])
+        self.assertEqual(totals[0, NUTRIENT_FIELDS.index('calories')], 500)
+
+    def test_deleted_food_counts_as_zero(self):
+        matrix = NutrientMatrix()
+        food = make_food()
+        self.assertEqual(matrix.item_totals([food.pk, food.pk + 1000], [1, 1]).tolist()[1], [0.0] * len(NUTRIENT_FIELDS))
+
+    def test_admin_plan_list_shows_the_plan_totals(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='x')
+        food = make_food(calories=150)
+        for number in range(3):
+            meal_plan = MealPlan.objects.create(user=admin, name=f'Plan {number}', duration_days=7)
+            meal = Meal.objects.create(user=admin, name='Lunch', meal_time_category='LN')
+            MealItem.objects.create(meal=meal, food=food, number_of_servings=number + 1)
+            for day in range(1, number + 2):
+                ScheduledMeal.objects.create(meal_plan=meal_plan, meal=meal, day_of_plan=day)
+        MealPlan.objects.create(user=admin, name='Empty', duration_days=7)
+
+        self.client.force_login(admin)
+        response = self.client.get('/admin/meal/mealplan/')
+        self.assertEqual(response.status_code, 200)
+        plans = {plan.name: plan for plan in response.context['cl'].result_list}
+        self.assertEqual({name: plan.plan_totals.get('calories') for name, plan in plans.items()}, {
+            'Plan 0': 150, 'Plan 1': 600, 'Plan 2': 1350, 'Empty': None,
+        })
+        self.assertContains(response, '1350.0')
+
+
+class MealPlanGeneratorTests(TestCase):
+
+    def setUp(self):
+        nutrient_matrix.reset()
+        self.addCleanup(nutrient_matrix.reset)
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        categories = ['GR', 'PR', 'VG', 'FR', 'DR', 'FO']
+        for number in range(24):
+            make_food(name=f'Food {number}', calories=80 + 10 * number, protein=5 + number % 7, food_category=categories[number % 6])
+
+    def test_stored_totals_come_from_the_foods(self):
+        nutrient_matrix.refresh()
+        # Changed without moving updated_at, so the in-process matrix still has the old values
+        Food.objects.update(calories=F('calories') + 1)
+        meal_plan = generate_meal_plan(self.user, 'Plan', 3, {'calories': 2000}, seed=1)
+        meals = Meal.objects.filter(scheduledmeal__meal_plan=meal_plan).with_totals()
+        self.assertEqual(meals.count(), 3 * len(DEFAULT_SLOTS))
+        for meal in meals:
+            self.assertAlmostEqual(meal.total_calories, meal.items_total_calories)
+
+    def test_plan_meals_are_not_intake(self):
+        meal_plan = generate_meal_plan(self.user, 'Plan', 3, {'calories': 2000}, seed=1)
+        copy = copy_meal_plan(meal_plan, self.user, deep=True)
+        self.assertTrue(Meal.objects.filter(scheduledmeal__meal_plan=copy).exists())
+        self.assertFalse(Meal.objects.filter(is_planned=False).exists())
+        self.assertFalse(DailyNutritionSummary.objects.filter(user=self.user).exists())
+
+        logged = Meal.objects.create(user=self.user, name='Breakfast', meal_time_category='BF')
+        MealItem.objects.create(meal=logged, food=Food.objects.first(), number_of_servings=1)
+        self.assertEqual(DailyNutritionSummary.objects.get(user=self.user).meal_count, 1)
+
+    def test_backfill_flags_only_generated_plan_meals(self):
+        flag_planned_meals = import_module('meal.migrations.0015_meal_is_planned').flag_planned_meals
+        meal_plan = generate_meal_plan(self.user, 'Plan', 2, {'calories': 2000}, seed=1)
+        # Logged meals scheduled right after a plan was created, in a plan of their own and in the generated one
+        own_plan = MealPlan.objects.create(user=self.user, name='Mine', duration_days=7)
+        logged = Meal.objects.create(user=self.user, name='Breakfast', meal_time_category='BF')
+        ScheduledMeal.objects.create(meal_plan=own_plan, meal=logged, day_of_plan=1)
+        shared = Meal.objects.get(pk=ScheduledMeal.objects.filter(meal_plan=meal_plan).values('meal')[:1])
+        ScheduledMeal.objects.create(meal_plan=own_plan, meal=shared, day_of_plan=2)
+        Meal.objects.update(is_planned=False)
+
+        flag_planned_meals(django_apps, connection.schema_editor())
+        generated = Meal.objects.filter(scheduledmeal__meal_plan=meal_plan).exclude(pk=shared.pk)
+        self.assertEqual(set(Meal.objects.filter(is_planned=True)), set(generated))
+        self.assertEqual(generated.count(), 2 * len(DEFAULT_SLOTS) - 1)
+
+
+class SyncChangeLogTests(TestCase):
+    """The change log is written inside the data transaction (TestCase never runs on_commit callbacks)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.foods = [make_food(name=f'Food {number}') for number in range(3)]
+
+    def create_meal(self):
+        response = self.client.post('/api/v1/nutrition/meals/', {
+            'name': 'Lunch', 'meal_time_category': 'LN',
+            'meal_items': [{'food': food.pk, 'number_of_servings': 1} for food in self.foods],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return Meal.objects.get(pk=response.json()['id'])
+
+    def test_saved_meal_is_in_the_changes(self):
+        meal = self.create_meal()
+        changes = get_changes(self.user)
+        self.assertEqual([row['id'] for row in changes['changes']['meals']], [meal.pk])
+        self.assertEqual(len(changes['changes']['meal_items']), 3)
+        self.assertEqual(changes['version'], SyncVersion.objects.get(user=self.user).version)
+
+    def test_deleted_meal_leaves_tombstones(self):
+        meal = self.create_meal()
+        item_ids = sorted(meal.mealitem_set.values_list('pk', flat=True))
+        plan = MealPlan.objects.create(user=self.user, name='Plan', duration_days=7)
+        scheduled = ScheduledMeal.objects.create(meal_plan=plan, meal=meal, day_of_plan=1)
+        since = get_changes(self.user)['version']
+
+        self.assertEqual(self.client.delete(f'/api/v1/nutrition/meals/{meal.pk}/').status_code, 204)
+        deleted = get_changes(self.user, since)['deleted']
+        self.assertEqual(deleted['meals'], [meal.pk])
+        self.assertEqual(sorted(deleted['meal_items']), item_ids)
+        self.assertEqual(deleted['scheduled_meals'], [scheduled.pk])
+
+        since, plan_id = get_changes(self.user)['version'], plan.pk
+        plan.delete()
+        self.assertEqual(get_changes(self.user, since)['deleted']['meal_plans'], [plan_id])
+
+    def test_deleted_user_leaves_no_change_log(self):
+        self.create_meal()
+        self.assertTrue(SyncChange.objects.filter(user=self.user).exists())
+        self.user.delete()
+        self.assertFalse(SyncChange.objects.exists())
+        self.assertFalse(SyncVersion.objects.exists())
+
+    def test_versions_are_allocated_for_many_users_at_once(self):
+        other = User.objects.create_user(email='other@example.com', password='x')
+        SyncVersion.objects.allocate({self.user.pk: 3})
+        self.assertEqual(SyncVersion.objects.allocate({other.pk: 2, self.user.pk: 4}), {self.user.pk: 7, other.pk: 2})
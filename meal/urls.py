@@ -1,11 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MealViewSet, FoodViewSet, MealPlanViewSet
+from .views import MealViewSet, FoodViewSet, MealPlanViewSet, NutritionHistoryViewSet, SyncViewSet
 
 router = DefaultRouter()
 router.register(r'foods', FoodViewSet, basename='food' )
 router.register(r'meals', MealViewSet, basename='meal')
 router.register(r'meal-plans', MealPlanViewSet, basename='mealplan' )
+router.register(r'history', NutritionHistoryViewSet, basename='nutrition-history')
+router.register(r'sync', SyncViewSet, basename='nutrition-sync')
 
 
 urlpatterns = [
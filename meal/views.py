@@ -2,17 +2,40 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
+from django.db import DatabaseError
 from django.db.models import Q
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.utils import timezone 
+from django.utils.dateparse import parse_date
+import datetime
 
-from .models import Food, Meal, MealPlan, ScheduledMeal
-from .serializers import FoodSerializer, MealSerializer, MealPlanSerializer
+from .models import DENSITY_FIELDS, Food, Meal, MealItem, MealPlan, MealPlanCopyJob
+from .serializers import FoodSerializer, MealSerializer, MealPlanSerializer, MealPlanCopyJobSerializer, MealPlanGenerateSerializer, MealBatchSerializer, MealItemSerializer, PlanCalendarEntrySerializer, ValuesSerializer, is_expanded
+from .services import add_meal_servings, async_copy_threshold_days, copy_meal_plan, create_meals, expire_stale_copy_job, start_meal_plan_copy_job
+from .generator import DEFAULT_SLOTS, MealPlanGenerationError, generate_meal_plan
+from .summaries import get_daily_history, get_period_history, local_today
+from .plan_calendar import get_plan_day
+from .sync import SyncTokenExpired, decode_token, encode_token, get_changes
 from .permission import IsOwner, IsOwnerOrAdmin, IsFoodOwnerOrPublic
-from django.db import transaction
+from .filters import FoodDensityFilterSet, FoodSearchFilter
+from .pagination import OptInCursorPagination
+from .conditional import ConditionalGetMixin
+from .autocomplete import food_prefix_index
+from .barcodes import food_barcode_cache, normalize_gtin
+from .catalog_snapshot import get_manifest
+from .substitutes import BASES, food_substitute_index
+from .cache import get_template_cache_version, get_template_page_cache_key, template_cache_timeout
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.http import HttpResponseNotModified, HttpResponseRedirect
+from django_filters.rest_framework import DjangoFilterBackend
+import logging
 
 
-class FoodViewSet(viewsets.ModelViewSet):
+logger = logging.getLogger(__name__)
+
+
+class FoodViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing Food items.
     Functionality:
@@ -21,20 +44,31 @@ class FoodViewSet(viewsets.ModelViewSet):
     - Create private food (or public if admin).
     - Update/Delete user's private food (or any if admin).
     - Search foods database.
+    - Look a food up by its barcode (GET /foods/by-barcode/{code}/).
+    - Download the whole public catalog (GET /foods/snapshot/).
     """
     serializer_class = FoodSerializer 
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    # FoodSearchFilter runs last so relevance ordering applies when no ?ordering= is given
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FoodSearchFilter]
+    filterset_class = FoodDensityFilterSet # ?protein_per_100kcal__gte=, ?sugar_per_100g__lte=, ...
 
     search_fields = ['name', 'description', 'food_category__iexact']
-    ordering_fields = ['name', 'calories', 'protein', 'created_at']
+    ordering_fields = ['name', 'calories', 'protein', 'created_at', *DENSITY_FIELDS]
     ordering = ['name']
+    pagination_class = OptInCursorPagination
+    cursor_ordering = ['name', 'id'] # ?pagination=cursor, backed by the (name, id) index
 
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated:
-            return Food.objects.filter(Q(is_public=True)|Q(user_added=user)).distinct()
-        return Food.objects.filter(is_public=True)
+            # Both conditions are on the food row itself, so no .distinct() is needed
+            queryset = Food.objects.filter(Q(is_public=True)|Q(user_added=user))
+        else:
+            queryset = Food.objects.filter(is_public=True)
+        if is_expanded(self.request, 'user_added_detail'):
+            queryset = queryset.select_related('user_added')
+        return queryset
     
     def get_permissions(self):
         if self.action in ['update', 'partial_update', 'destroy']:
@@ -44,6 +78,115 @@ class FoodViewSet(viewsets.ModelViewSet):
         else: 
             return super().get_permissions()
         
+    def list_response(self, request, *args, **kwargs):
+        # Read-only fast path: rows come straight from .values() and are mapped by ValuesSerializer,
+        # producing the same JSON as FoodSerializer without a model instance or serializer per row
+        values_serializer = ValuesSerializer(self.get_serializer())
+        columns = values_serializer.columns + [name.lstrip('-') for name in self.cursor_ordering]
+        queryset = self.filter_queryset(self.get_queryset()).values(*columns)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.to_representation(page))
+        return Response(values_serializer.to_representation(queryset))
+
+    @action(detail=False, methods=['get'], url_path=r'by-barcode/(?P<code>[^/]+)')
+    def by_barcode(self, request, code=None):
+        """
+        The food with this barcode (GET /foods/by-barcode/<GTIN-8/12/13/14>/), e.g. after a scan.
+        Public foods come first and are served from the in-process barcode cache (see meal.barcodes);
+        a miss is one query on the barcode index, and unknown barcodes are cached briefly too. Without a
+        public match, the requester's own private food with this barcode is looked up.
+        """
+        try:
+            barcode = normalize_gtin(code)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        food = food_barcode_cache.get(barcode)
+        if food is None and request.user.is_authenticated:
+            # Private foods are only visible to the user who added them
+            food = Food.objects.select_related('user_added').filter(barcode=barcode, is_public=False, user_added=request.user).first()
+        if food is None:
+            return Response({'detail': 'No food with this barcode.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.get_serializer(food).data)
+
+    @action(detail=False, methods=['get'])
+    def snapshot(self, request):
+        """
+        Redirect to the prebuilt gzip NDJSON file of the whole public catalog (see meal.catalog_snapshot),
+        with its version in the ETag / X-Catalog-Version headers. Send the version back in If-None-Match
+        to get 304 while it is still current.
+        """
+        manifest = get_manifest()
+        if manifest is None:
+            return Response({'detail': 'The food catalog snapshot has not been built yet.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        etag = f'"{manifest["version"]}"'
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponseRedirect(request.build_absolute_uri(default_storage.url(manifest['name'])))
+        response['ETag'] = etag
+        response['X-Catalog-Version'] = manifest['version']
+        response['X-Catalog-Count'] = manifest['count']
+        response['Cache-Control'] = 'no-cache' # The snapshot files themselves never change
+        return response
+
+    @action(detail=False, methods=['get'], url_path='autocomplete')
+    def autocomplete(self, request):
+        """
+        Food name autocomplete (GET /foods/autocomplete/?q=<prefix>&limit=<n>).
+        Public foods come from the in-process prefix index (no database query);
+        the user's private foods are merged in with one indexed query.
+        """
+        prefix = request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        if not prefix:
+            return Response([])
+
+        results = food_prefix_index.lookup(prefix, limit=limit)
+        if request.user.is_authenticated:
+            private_foods = list(
+                Food.objects.filter(user_added=request.user, is_public=False, name__istartswith=prefix)
+                .order_by('name').values('id', 'name', 'calories')[:limit]
+            )
+            if private_foods:
+                results = sorted(private_foods + results, key=lambda food: food['name'].lower())[:limit]
+        return Response(results)
+
+    @action(detail=True, methods=['get'], url_path='substitutes')
+    def substitutes(self, request, pk=None):
+        """
+        Public foods closest to this one in macro space (GET /foods/{id}/substitutes/).
+        ?basis=kcal (default: macros per 100 kcal) or gram (per gram, foods served in grams),
+        ?same_category=true to stay in the food's category, ?k=<n> results (1-50, default 10).
+        Served from an in-process KD-tree (meal.substitutes), not a distance query over the catalog.
+        """
+        food = self.get_object()
+        basis = request.query_params.get('basis', 'kcal')
+        if basis not in BASES:
+            return Response({'detail': f"basis must be one of: {', '.join(BASES)}."}, status=status.HTTP_400_BAD_REQUEST)
+        same_category = request.query_params.get('same_category', '').lower() in ('1', 'true', 'yes')
+        try:
+            k = min(max(int(request.query_params.get('k', 10)), 1), 50)
+        except ValueError:
+            k = 10
+
+        try:
+            # A few spare neighbours in case foods were deleted by another worker since its last reload
+            nearest = food_substitute_index.substitutes(food.pk, k=k + 5, basis=basis, same_category=same_category)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        foods = Food.objects.filter(is_public=True).in_bulk([food_id for food_id, _ in nearest])
+        results = []
+        for food_id, distance in nearest:
+            if food_id in foods: # Deleted since the index was loaded
+                results.append({**self.get_serializer(foods[food_id]).data, 'distance': round(distance, 6)})
+        return Response(results[:k])
+
     def perform_create(self, serializer):
         
         is_public = serializer.validated_data.get('is_public', False)
@@ -55,23 +198,86 @@ class FoodViewSet(viewsets.ModelViewSet):
             serializer.save(user_added = self.request.user, is_public=False) 
 
 
-class MealViewSet(viewsets.ModelViewSet):
+class MealViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing user's Meals.
     Meals are private to the user.
     """
     serializer_class = MealSerializer
     permission_classes = [IsAuthenticated, IsOwner]  # Ensures only owner can access/modify
+    pagination_class = OptInCursorPagination
+    cursor_ordering = ['-created_at', 'id'] # ?pagination=cursor, backed by the (user, -created_at, id) index
+
+    def get_conditional_timestamp_fields(self):
+        # meal_items embeds food_detail, and food edits outside the nutrients leave Meal.updated_at alone
+        if is_expanded(self.request, 'meal_items'):
+            return (*self.conditional_timestamp_fields, 'mealitem__food__updated_at')
+        return self.conditional_timestamp_fields
 
     def get_queryset(self):
          # Users can only see and manage their own meals
-        return Meal.objects.filter(user = self.request.user).prefetch_related('mealitem_set__food')
+        # Only load what the requested representation (?fields= / ?expand=) will serialize
+        queryset = Meal.objects.filter(user = self.request.user)
+        if is_expanded(self.request, 'user_detail'):
+            queryset = queryset.select_related('user')
+        if is_expanded(self.request, 'meal_items'):
+            queryset = queryset.prefetch_related('mealitem_set__food__user_added')
+        return queryset
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=True, methods=['post'], url_path='add-servings')
+    def add_servings(self, request, pk=None):
+        """
+        Adds servings of a food to the meal: {"food": <id>, "number_of_servings": 1.5}.
+        Creates the item, or increases the servings of the meal's existing item for that food, in one
+        atomic upsert (concurrent adds from several devices all count). Returns the updated meal.
+        """
+        meal = self.get_object()
+        input_serializer = MealItemSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+        data = input_serializer.validated_data
+        add_meal_servings(meal, data['food'], data.get('number_of_servings', MealItem._meta.get_field('number_of_servings').default))
+
+        serializer = self.get_serializer(self.get_queryset().get(pk=meal.pk))
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-class MealPlanViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Logs many meals at once (e.g. an offline queue): {"meals": [<meal payload>, ...]}.
+        Every entry is validated on its own; the valid ones are saved together in one transaction
+        and the invalid ones are reported. `results` has one entry per meal, in the order sent:
+        {"index", "status": 201, "meal"} or {"index", "status": 400, "errors"}.
+        Responds 201 when every meal was saved, 207 when only some were and 400 when none were.
+        """
+        input_serializer = MealBatchSerializer(data=request.data, context=self.get_serializer_context())
+        input_serializer.is_valid(raise_exception=True)
+        valid, errors = input_serializer.validate_entries()
+
+        results = {index: {'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': entry_errors}
+                   for index, entry_errors in errors.items()}
+        if valid:
+            meals = create_meals(request.user, [data for _, data in valid])
+            saved = {meal.pk: meal for meal in self.get_queryset().filter(pk__in=[meal.pk for meal in meals])}
+            for (index, _), meal in zip(valid, meals):
+                results[index] = {'index': index, 'status': status.HTTP_201_CREATED, 'meal': self.get_serializer(saved[meal.pk]).data}
+
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif valid:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            'created': len(valid),
+            'failed': len(errors),
+            'results': [results[index] for index in sorted(results)],
+        }, status=response_status)
+
+
+class MealPlanViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing user's Meal Plans.
     Provides functionalities:
@@ -82,11 +288,16 @@ class MealPlanViewSet(viewsets.ModelViewSet):
     - Get a specific meal plan by ID (GET /{id}/)
     - Delete a meal plan (DELETE /{id}/)
     - Get available meal plan templates (GET /templates/)
-    - Copy an existing meal plan (POST /{id}/copy/)
+    - Copy an existing meal plan (POST /{id}/copy/, ?deep=true to clone its meals too)
+    - Get the status of a background copy (GET /copy-jobs/{job_id}/)
+    - Get per-day nutrition totals against the daily targets (GET /{id}/daily-summary/)
+    - Get the meals due today across the user's active plans (GET /today/)
     """
 
     serializer_class = MealPlanSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OptInCursorPagination
+    cursor_ordering = ['-created_at', 'id'] # ?pagination=cursor, backed by the (user, -created_at, id) index
 
     def get_queryset(self):
         user = self.request.user
@@ -95,10 +306,36 @@ class MealPlanViewSet(viewsets.ModelViewSet):
             # Templates are MealPlan instances marked as 'is_template'
             # Or define templates differently, e.g., user=None or owned by admin
             # Assuming 'is_template' field exists on MealPlan model:
-            return MealPlan.objects.filter(is_template=True, is_active=True).prefetch_related('scheduledmeal_set__meal__mealitem_set__food')
+            return self.with_expansions(MealPlan.objects.filter(is_template=True, is_active=True).with_daily_totals())
+        if self.action in ['copy_meal_plan', 'daily_summary']:
+            # Templates can be copied / summarised by anyone, other plans only by their owner
+            return MealPlan.objects.filter(Q(user=user) | Q(is_template=True, is_active=True))
         
         # For standard list, retrieve, update, delete -> user's own meal plans
-        return MealPlan.objects.filter(user=user).prefetch_related('scheduledmeal_set__meal__mealitem_set__food')
+        # Daily nutrition is aggregated in SQL instead of prefetching every meal, item and food
+        return self.with_expansions(MealPlan.objects.filter(user=user).with_daily_totals())
+
+    # The plan rows plus the meals scheduled in them (daily totals, ?expand=scheduled_meals)
+    conditional_count_fields = ('pk', 'scheduledmeal')
+    conditional_timestamp_fields = ('updated_at', 'scheduledmeal__meal__updated_at')
+
+    def get_conditional_queryset(self):
+        # Validators need neither the daily totals nor the prefetches of get_queryset()
+        return self.filter_queryset(MealPlan.objects.filter(user=self.request.user))
+
+    def get_conditional_timestamp_fields(self):
+        # ?expand=scheduled_meals embeds the meals' items with their food details
+        if is_expanded(self.request, 'scheduled_meals', expand_only=True):
+            return (*self.conditional_timestamp_fields, 'scheduledmeal__meal__mealitem__food__updated_at')
+        return self.conditional_timestamp_fields
+
+    def with_expansions(self, queryset):
+        # Load the nested rows only when ?expand= asks for them
+        if is_expanded(self.request, 'user_detail'):
+            queryset = queryset.select_related('user')
+        if is_expanded(self.request, 'scheduled_meals', expand_only=True):
+            queryset = queryset.prefetch_related('scheduledmeal_set__meal__user', 'scheduledmeal_set__meal__mealitem_set__food__user_added')
+        return queryset
     
     def get_permissions(self):
         if self.action in ['update', 'partial_update', 'destroy', 'cancel_user_meal_plan']:
@@ -132,71 +369,217 @@ class MealPlanViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(meal_plan)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['get'])
+    def today(self, request):
+        """
+        The meals due today (the user's local day, or ?date=YYYY-MM-DD) across all active plans,
+        read from the plan calendar (meal.plan_calendar) with one (user, date) index range scan.
+        """
+        if 'date' in request.query_params:
+            try:
+                day = parse_date(request.query_params['date'])
+            except ValueError:
+                day = None
+            if day is None:
+                return Response({'detail': 'date must be a valid date (YYYY-MM-DD).'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            day = local_today(request.user)
+
+        entries = get_plan_day(request.user, day)
+        if is_expanded(request, 'user_detail'):
+            entries = entries.select_related('scheduled_meal__meal__user')
+        if is_expanded(request, 'meal_items'):
+            entries = entries.prefetch_related('scheduled_meal__meal__mealitem_set__food__user_added')
+        serializer = PlanCalendarEntrySerializer(entries, many=True, context=self.get_serializer_context())
+        return Response({'date': day, 'meals': serializer.data}, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'], url_path='templates', permission_classes=[IsAuthenticatedOrReadOnly])
     def list_templates(self, request):
         """
         Get available meal plan templates.
         (Requires 'is_template' field on MealPlan model or adjust filter in get_queryset)
+        Pages are served from the cache (see meal.cache) with an ETag; a matching If-None-Match gets
+        a 304 without loading the plans.
         """
+        version = get_template_cache_version()
+        cache_key, etag = get_template_page_cache_key(request, version)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-        queryset = self.get_queryset()
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        data = cache.get(cache_key)
+        if data is None:
+            queryset = self.get_queryset()
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                data = self.get_paginated_response(serializer.data).data
+            else:
+                serializer = self.get_serializer(queryset, many=True)
+                data = serializer.data
+            cache.set(cache_key, data, template_cache_timeout())
+        return Response(data, headers=headers)
+
+    @action(detail=True, methods=['get'], url_path='daily-summary')
+    def daily_summary(self, request, pk=None):
+        """
+        Summed calories / protein / carbohydrates / fat per day_of_plan next to the target_daily_* values,
+        computed with one GROUP BY query instead of serializing the nested plan.
+        """
+        meal_plan = self.get_object()
+        return Response(meal_plan.get_daily_summary())
 
     @action(detail=True, methods=['post'], url_path='copy')
     def copy_meal_plan(self, request, pk=None):
         """
         Copies an existing meal plan for the current authenticated user.
-        The original plan can be a template or another user's plan (if visible).
+        The original plan can be a template or one of the user's own plans.
         The new plan will be owned by the request.user.
+        ?deep=true also clones the referenced meals and their items for the user, instead of
+        pointing at the original meals. Deep copies of long plans run in the background:
+        the response is 202 with a copy job to poll at /copy-jobs/{job_id}/.
         """
 
         original_plan = self.get_object()
         user = request.user
+        deep = request.query_params.get('deep', '').lower() in ('1', 'true', 'yes')
 
         if original_plan.user == user and not original_plan.is_template:
             return Response({'detail': 'You already own this meal plan.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        if deep and original_plan.duration_days > async_copy_threshold_days():
+            job = start_meal_plan_copy_job(original_plan, user, deep=True)
+            return Response(MealPlanCopyJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
         try:
-            with transaction.atomic(): # Ensure atomicity: all or nothing
-                new_plan = MealPlan.objects.create(
-                    user=user,
-                    name=f"{original_plan.name} (Copy)",
-                    description=original_plan.description,
-                    duration_days=original_plan.duration_days,
-                    is_active=True,
-                    is_template=False,
-                    start_date=None,
-                    goal=original_plan.goal,
-                    target_daily_calories=original_plan.target_daily_calories,
-                )
-
-                original_scheduled_meals = original_plan.scheduledmeal_set.all()
-                new_scheduled_meals_to_create = []
-                for original_sm in original_scheduled_meals:
-                    new_scheduled_meals_to_create.append(
-                        ScheduledMeal(
-                            meal_plan=new_plan,
-                            meal=original_sm.meal,  # Reference the same Meal object
-                            day_of_plan=original_sm.day_of_plan
-                        )
-                    )
-                if new_scheduled_meals_to_create:
-                    ScheduledMeal.objects.bulk_create(new_scheduled_meals_to_create)
-                
-                serializer = self.get_serializer(new_plan)
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            
-
-        except Exception as e:
-            print(f"Error copying meal plan: {e}") # Basic logging
+            new_plan = copy_meal_plan(original_plan, user, deep=deep)
+        except DatabaseError:
+            # The copy ran in one transaction, so nothing of it was saved
+            logger.exception("Error copying meal plan %s for user %s", original_plan.pk, user.pk)
             return Response(
                 {"detail": "An error occurred while copying the meal plan."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-        
\ No newline at end of file
+        serializer = self.get_serializer(new_plan)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='generate')
+    def generate_meal_plan(self, request):
+        """
+        Generates a meal plan for the current user from the public food catalog
+        (see meal.generator): one meal per day and slot (meal_slots, default breakfast, lunch,
+        dinner and snack) meeting the daily calorie / macro targets within `tolerance`.
+        """
+        input_serializer = MealPlanGenerateSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+        data = input_serializer.validated_data
+
+        try:
+            meal_plan = generate_meal_plan(
+                request.user,
+                name=data.get('name') or f"Generated plan ({data['duration_days']} days)",
+                description=data.get('description'),
+                goal=data['goal'],
+                duration_days=data['duration_days'],
+                start_date=data.get('start_date'),
+                targets={nutrient: data.get(f'target_daily_{nutrient}') for nutrient in ('calories', 'protein', 'carbohydrates', 'fat')},
+                slots=data.get('meal_slots') or DEFAULT_SLOTS,
+                tolerance=data['tolerance'],
+                seed=data.get('seed'),
+            )
+        except MealPlanGenerationError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        meal_plan = self.with_expansions(MealPlan.objects.filter(pk=meal_plan.pk).with_daily_totals()).get()
+        serializer = self.get_serializer(meal_plan)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], url_path=r'copy-jobs/(?P<job_id>\d+)')
+    def copy_job_status(self, request, job_id=None):
+        """
+        Status of a background meal plan copy; `result_plan` is set once it succeeded. A job pending or
+        running for longer than MEAL_PLAN_COPY_JOB_TIMEOUT is reported as failed.
+        """
+        try:
+            job = MealPlanCopyJob.objects.get(pk=job_id, user=request.user)
+        except MealPlanCopyJob.DoesNotExist:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(MealPlanCopyJobSerializer(expire_stale_copy_job(job)).data)
+
+
+class NutritionHistoryViewSet(viewsets.ViewSet):
+    """
+    The user's intake history, read only from the daily summaries (DailyNutritionSummary),
+    in the user's local days (profile time zone):
+    - GET /history/?start=&end=          one entry per day (default: the last 90 days)
+    - GET /history/weekly/?start=&end=   sums per week from Monday (default: the last 26 weeks)
+    - GET /history/monthly/?start=&end=  sums per month (default: the last 12 months)
+    Dates are YYYY-MM-DD and inclusive.
+    """
+    permission_classes = [IsAuthenticated]
+    max_daily_days = 366
+
+    def get_range(self, request, default_days):
+        try:
+            end = parse_date(request.query_params['end']) if 'end' in request.query_params else local_today(request.user)
+            start = parse_date(request.query_params['start']) if 'start' in request.query_params else end - datetime.timedelta(days=default_days - 1)
+        except ValueError:
+            start = end = None
+        if start is None or end is None:
+            raise ValidationError({'detail': 'start and end must be valid dates (YYYY-MM-DD).'})
+        if start > end:
+            raise ValidationError({'detail': 'start must not be after end.'})
+        return start, end
+
+    def list(self, request):
+        start, end = self.get_range(request, 90)
+        if (end - start).days >= self.max_daily_days:
+            return Response({'detail': f'At most {self.max_daily_days} days per request.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'start': start, 'end': end, 'days': get_daily_history(request.user, start, end)})
+
+    @action(detail=False, methods=['get'])
+    def weekly(self, request):
+        start, end = self.get_range(request, 26 * 7)
+        start -= datetime.timedelta(days=start.weekday()) # Whole weeks
+        return Response({'start': start, 'end': end, 'weeks': get_period_history(request.user, start, end, 'week')})
+
+    @action(detail=False, methods=['get'])
+    def monthly(self, request):
+        start, end = self.get_range(request, 365)
+        start = start.replace(day=1) # Whole months
+        return Response({'start': start, 'end': end, 'months': get_period_history(request.user, start, end, 'month')})
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """
+    Delta sync of the user's meals, meal items, meal plans and scheduled meals:
+    GET /sync/?since=<token>&limit=  the rows created or changed since the token (current state) and
+    the ids deleted since, oldest change first. Start without `since`; pass `next` back until
+    `has_more` is false, then keep it for the next sync. 410 when the token is too old (sync from scratch).
+    """
+    permission_classes = [IsAuthenticated]
+    default_limit = 1000
+    max_limit = 5000
+
+    def list(self, request):
+        try:
+            since = decode_token(request.query_params['since']) if request.query_params.get('since') else 0
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response({'detail': 'limit must be a positive integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = get_changes(request.user, since, limit)
+        except SyncTokenExpired:
+            return Response({'detail': 'This sync token has expired. Sync again without `since`.'}, status=status.HTTP_410_GONE)
+        return Response({
+            'changes': result['changes'],
+            'deleted': result['deleted'],
+            'next': encode_token(result['version']),
+            'has_more': result['has_more'],
+        })
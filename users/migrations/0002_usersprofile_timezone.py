@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersprofile',
+            name='timezone',
+            field=models.CharField(blank=True, help_text='IANA time zone, e.g. Europe/Berlin (default: TIME_ZONE)', max_length=64, null=True),
+        ),
+    ]
@@ -30,6 +30,7 @@ class UsersProfile(models.Model):
     height = models.FloatField(help_text="Height in cm" , blank=True,null=True)
     gender = models.CharField(max_length=10,choices=Choices, blank=True,null=True)
     fitness_goal = models.CharField(max_length=200 , blank=True,null=True)
+    timezone = models.CharField(max_length=64, blank=True, null=True, help_text="IANA time zone, e.g. Europe/Berlin (default: TIME_ZONE)")
 
     def __str__(self):
         return f'{self.user.email} - {self.fitness_goal}'
@@ -1,3 +1,5 @@
+import zoneinfo
+
 from rest_framework import serializers
 from dj_rest_auth.registration.serializers import RegisterSerializer
 from rest_framework.exceptions import ValidationError
@@ -38,9 +40,18 @@ class UsersProfileSerializer(serializers.ModelSerializer):
      
     class Meta:
         model = UsersProfile
-        fields = ['id', 'user', 'img', 'age', 'weight', 'height', 'gender', 'fitness_goal']
+        fields = ['id', 'user', 'img', 'age', 'weight', 'height', 'gender', 'fitness_goal', 'timezone']
         read_only_fields = ['user']
 
+    def validate_timezone(self, value):
+        if not value:
+            return None
+        try:
+            zoneinfo.ZoneInfo(value)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise ValidationError('Unknown time zone.')
+        return value
+
     def create(self, validated_data):
         request = self.context.get('request')
         user = request.user if request else None